@@ -3,14 +3,20 @@ set -euo pipefail
 
 # Start worker and MCP server in one container
 python3 -m worker.main &
-WORKER_PID=$!
+WORKER_PIDS=($!)
+
+# BCS_MARKET_PROCESSES>1: extra worker processes, each with its share of market shards
+for ((i = 1; i < ${BCS_MARKET_PROCESSES:-1}; i++)); do
+  BCS_MARKET_PROCESS_INDEX=$i python3 -m worker.main &
+  WORKER_PIDS+=($!)
+done
 
 node /app/server/dist/index.js &
 SERVER_PID=$!
 
-# If one dies — stop the other
-wait -n $WORKER_PID $SERVER_PID
+# If one dies — stop the others
+wait -n "${WORKER_PIDS[@]}" $SERVER_PID
 EXIT_CODE=$?
 
-kill $WORKER_PID $SERVER_PID 2>/dev/null || true
+kill "${WORKER_PIDS[@]}" $SERVER_PID 2>/dev/null || true
 exit $EXIT_CODE
@@ -32,9 +32,23 @@ CREATE TABLE IF NOT EXISTS candles (
 CREATE TABLE IF NOT EXISTS candles_default PARTITION OF candles DEFAULT;
 CREATE INDEX IF NOT EXISTS candles_ts_idx ON candles (ts DESC);
 
+-- Инкрементальное состояние индикаторов по закрытым свечам (ведёт воркер, читает signals.run)
+CREATE TABLE IF NOT EXISTS indicator_state (
+  ticker TEXT NOT NULL,
+  class_code TEXT NOT NULL,
+  time_frame TEXT NOT NULL,
+  lookback INTEGER NOT NULL,
+  bars INTEGER NOT NULL,
+  bar_ts TIMESTAMPTZ NOT NULL,
+  features JSONB,
+  state JSONB NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (ticker, class_code, time_frame)
+);
+
 -- Котировки (лучшие цены, last, OHLC)
 CREATE TABLE IF NOT EXISTS quotes (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   ticker TEXT NOT NULL,
   class_code TEXT NOT NULL,
   ts TIMESTAMPTZ NOT NULL,
@@ -49,30 +63,50 @@ CREATE TABLE IF NOT EXISTS quotes (
   change_rate NUMERIC,
   currency TEXT,
   security_trading_status INTEGER,
-  data JSONB
+  data JSONB,
+  -- транзакция записи: по ней воркер досчитывает ohlcv_rollups
+  xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS quotes_default PARTITION OF quotes DEFAULT;
 CREATE INDEX IF NOT EXISTS quotes_ticker_ts_idx ON quotes (ticker, class_code, ts DESC);
+-- для баз, созданных до появления xid: старые строки получают 0 без перезаписи таблицы
+ALTER TABLE quotes ADD COLUMN IF NOT EXISTS xid XID8 NOT NULL DEFAULT '0';
+ALTER TABLE quotes ALTER COLUMN xid SET DEFAULT pg_current_xact_id();
+CREATE INDEX IF NOT EXISTS quotes_xid_idx ON quotes (xid, id);
 
 -- Стакан котировок (снимки)
 CREATE TABLE IF NOT EXISTS order_book_snapshots (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   ticker TEXT NOT NULL,
   class_code TEXT NOT NULL,
   ts TIMESTAMPTZ NOT NULL,
   depth INTEGER,
   bid_volume NUMERIC,
   ask_volume NUMERIC,
+  -- уровни стакана: параллельные массивы цен и объёмов, лучший уровень первым
+  bid_prices FLOAT8[],
+  bid_qty FLOAT8[],
+  ask_prices FLOAT8[],
+  ask_qty FLOAT8[],
+  -- уровни в JSONB — только у строк, записанных до перехода на массивы
   bids JSONB,
   asks JSONB,
-  data JSONB
+  -- исходное сообщение, если order_book_snapshots есть в BCS_STORE_RAW
+  data JSONB,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS order_book_snapshots_default PARTITION OF order_book_snapshots DEFAULT;
 CREATE INDEX IF NOT EXISTS order_book_ticker_ts_idx ON order_book_snapshots (ticker, class_code, ts DESC);
+-- для баз, созданных до перехода на массивы
+ALTER TABLE order_book_snapshots ADD COLUMN IF NOT EXISTS bid_prices FLOAT8[];
+ALTER TABLE order_book_snapshots ADD COLUMN IF NOT EXISTS bid_qty FLOAT8[];
+ALTER TABLE order_book_snapshots ADD COLUMN IF NOT EXISTS ask_prices FLOAT8[];
+ALTER TABLE order_book_snapshots ADD COLUMN IF NOT EXISTS ask_qty FLOAT8[];
 
 -- Обезличенные сделки
 CREATE TABLE IF NOT EXISTS last_trades (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   ticker TEXT NOT NULL,
   class_code TEXT NOT NULL,
   ts TIMESTAMPTZ NOT NULL,
@@ -80,40 +114,165 @@ CREATE TABLE IF NOT EXISTS last_trades (
   price NUMERIC,
   quantity NUMERIC,
   volume NUMERIC,
-  data JSONB
+  data JSONB,
+  -- транзакция записи: по ней воркер досчитывает ohlcv_rollups
+  xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS last_trades_default PARTITION OF last_trades DEFAULT;
 CREATE INDEX IF NOT EXISTS last_trades_ticker_ts_idx ON last_trades (ticker, class_code, ts DESC);
+ALTER TABLE last_trades ADD COLUMN IF NOT EXISTS xid XID8 NOT NULL DEFAULT '0';
+ALTER TABLE last_trades ALTER COLUMN xid SET DEFAULT pg_current_xact_id();
+CREATE INDEX IF NOT EXISTS last_trades_xid_idx ON last_trades (xid, id);
+
+-- Последнее состояние по инструменту: котировка, сделка и стакан.
+-- Обновляется воркером на месте (UNLOGGED: после сбоя пустеет и заполняется заново).
+CREATE UNLOGGED TABLE IF NOT EXISTS market_latest (
+  ticker TEXT NOT NULL,
+  class_code TEXT NOT NULL,
+  quote_ts TIMESTAMPTZ,
+  bid NUMERIC,
+  offer NUMERIC,
+  last NUMERIC,
+  open NUMERIC,
+  close NUMERIC,
+  high NUMERIC,
+  low NUMERIC,
+  change NUMERIC,
+  change_rate NUMERIC,
+  currency TEXT,
+  security_trading_status INTEGER,
+  trade_ts TIMESTAMPTZ,
+  trade_side TEXT,
+  trade_price NUMERIC,
+  trade_quantity NUMERIC,
+  trade_volume NUMERIC,
+  book_ts TIMESTAMPTZ,
+  book_depth INTEGER,
+  bid_volume NUMERIC,
+  ask_volume NUMERIC,
+  bid_prices FLOAT8[],
+  bid_qty FLOAT8[],
+  ask_prices FLOAT8[],
+  ask_qty FLOAT8[],
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (ticker, class_code)
+) WITH (fillfactor = 70);
+-- market_latest — кэш, старый формат стакана просто заменяется
+ALTER TABLE market_latest DROP COLUMN IF EXISTS bids;
+ALTER TABLE market_latest DROP COLUMN IF EXISTS asks;
+ALTER TABLE market_latest ADD COLUMN IF NOT EXISTS bid_prices FLOAT8[];
+ALTER TABLE market_latest ADD COLUMN IF NOT EXISTS bid_qty FLOAT8[];
+ALTER TABLE market_latest ADD COLUMN IF NOT EXISTS ask_prices FLOAT8[];
+ALTER TABLE market_latest ADD COLUMN IF NOT EXISTS ask_qty FLOAT8[];
+
+-- OHLCV-свёртки сделок (source = 'last_trades', цена price) и котировок
+-- (source = 'quotes', цена last) по бакетам 1s/1m/5m/1h. Воркер досчитывает их
+-- из строк с (xid, id) больше водяного знака в rollup_watermarks; market.aggregate
+-- читает свёртку вместо сырых строк.
+CREATE TABLE IF NOT EXISTS ohlcv_rollups (
+  source TEXT NOT NULL,
+  ticker TEXT NOT NULL,
+  class_code TEXT NOT NULL,
+  bucket_sec INTEGER NOT NULL,
+  ts TIMESTAMPTZ NOT NULL,
+  open NUMERIC,
+  high NUMERIC,
+  low NUMERIC,
+  close NUMERIC,
+  open_ts TIMESTAMPTZ,
+  close_ts TIMESTAMPTZ,
+  -- все строки бакета / строки с ценой
+  count BIGINT NOT NULL,
+  value_count BIGINT NOT NULL,
+  value_sum NUMERIC NOT NULL,
+  volume NUMERIC NOT NULL,
+  turnover NUMERIC NOT NULL,
+  vwap NUMERIC GENERATED ALWAYS AS (turnover / NULLIF(volume, 0)) STORED,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (source, ticker, class_code, bucket_sec, ts)
+) PARTITION BY RANGE (ts);
+CREATE TABLE IF NOT EXISTS ohlcv_rollups_default PARTITION OF ohlcv_rollups DEFAULT;
+
+-- До какой пары (xid, id) исходной таблицы строки уже учтены в ohlcv_rollups
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+  source TEXT PRIMARY KEY,
+  last_xid XID8 NOT NULL DEFAULT '0',
+  last_id BIGINT NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+ALTER TABLE rollup_watermarks ADD COLUMN IF NOT EXISTS last_xid XID8 NOT NULL DEFAULT '0';
+
+-- Задания догрузки исторических свечей (bcs.candles.backfill): диапазон режется
+-- на куски по BCS_BACKFILL_CHUNK_BARS баров, каждый кусок — отдельный запрос к брокеру
+CREATE TABLE IF NOT EXISTS backfill_jobs (
+  id BIGSERIAL PRIMARY KEY,
+  class_code TEXT NOT NULL,
+  tickers TEXT[] NOT NULL,
+  time_frame TEXT NOT NULL,
+  start_ts TIMESTAMPTZ NOT NULL,
+  end_ts TIMESTAMPTZ NOT NULL,
+  -- running|done|failed; running после рестарта сервера продолжается
+  status TEXT NOT NULL DEFAULT 'running',
+  last_error TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS backfill_jobs_running_idx ON backfill_jobs (id) WHERE status = 'running';
+
+-- Куски заданий; done-куски с complete (диапазон был целиком в прошлом) служат
+-- журналом покрытия: такие же куски следующих заданий пропускаются
+CREATE TABLE IF NOT EXISTS backfill_chunks (
+  job_id BIGINT NOT NULL REFERENCES backfill_jobs (id) ON DELETE CASCADE,
+  ticker TEXT NOT NULL,
+  class_code TEXT NOT NULL,
+  time_frame TEXT NOT NULL,
+  start_ts TIMESTAMPTZ NOT NULL,
+  end_ts TIMESTAMPTZ NOT NULL,
+  -- pending|done|skipped|failed
+  status TEXT NOT NULL DEFAULT 'pending',
+  complete BOOLEAN NOT NULL DEFAULT false,
+  attempts INT NOT NULL DEFAULT 0,
+  bars INT,
+  last_error TEXT,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (job_id, ticker, start_ts)
+);
+CREATE INDEX IF NOT EXISTS backfill_chunks_coverage_idx
+  ON backfill_chunks (ticker, class_code, time_frame, start_ts) WHERE status = 'done' AND complete;
 
 -- Статусы торгов (снимки)
 CREATE TABLE IF NOT EXISTS trading_status_snapshots (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   class_code TEXT NOT NULL,
   ts TIMESTAMPTZ NOT NULL,
-  data JSONB NOT NULL
+  data JSONB NOT NULL,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS trading_status_snapshots_default PARTITION OF trading_status_snapshots DEFAULT;
 CREATE INDEX IF NOT EXISTS trading_status_ts_idx ON trading_status_snapshots (class_code, ts DESC);
 
 -- Расписание торгов (снимки)
 CREATE TABLE IF NOT EXISTS trading_schedule_snapshots (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   class_code TEXT NOT NULL,
   ticker TEXT NOT NULL,
   ts TIMESTAMPTZ NOT NULL,
-  data JSONB NOT NULL
+  data JSONB NOT NULL,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS trading_schedule_snapshots_default PARTITION OF trading_schedule_snapshots DEFAULT;
 CREATE INDEX IF NOT EXISTS trading_schedule_ts_idx ON trading_schedule_snapshots (class_code, ticker, ts DESC);
 
 -- Дисконты по инструментам (снимки)
 CREATE TABLE IF NOT EXISTS instrument_discounts (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   ticker TEXT NOT NULL,
   ts TIMESTAMPTZ NOT NULL,
   discount_long NUMERIC,
   discount_short NUMERIC,
-  data JSONB
+  data JSONB,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS instrument_discounts_default PARTITION OF instrument_discounts DEFAULT;
 CREATE INDEX IF NOT EXISTS instrument_discounts_ticker_ts_idx ON instrument_discounts (ticker, ts DESC);
@@ -30,12 +30,13 @@ CREATE INDEX IF NOT EXISTS decision_logs_ts_idx ON decision_logs (ts DESC);
 
 -- Операции по кошельку
 CREATE TABLE IF NOT EXISTS wallet_operations (
-  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  id UUID DEFAULT gen_random_uuid(),
   ts TIMESTAMPTZ NOT NULL,
   currency TEXT NOT NULL,
   amount NUMERIC NOT NULL,
   op_type TEXT NOT NULL,
-  details JSONB
+  details JSONB,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS wallet_operations_default PARTITION OF wallet_operations DEFAULT;
 CREATE INDEX IF NOT EXISTS wallet_ops_ts_idx ON wallet_operations (ts DESC);
@@ -56,10 +57,11 @@ CREATE TABLE IF NOT EXISTS holdings_current (
 
 -- Снимки портфеля
 CREATE TABLE IF NOT EXISTS holdings_snapshots (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   ts TIMESTAMPTZ NOT NULL,
   account TEXT,
-  data JSONB
+  data JSONB,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS holdings_snapshots_default PARTITION OF holdings_snapshots DEFAULT;
 CREATE INDEX IF NOT EXISTS holdings_snapshots_ts_idx ON holdings_snapshots (ts DESC);
@@ -83,7 +85,7 @@ CREATE INDEX IF NOT EXISTS orders_ticker_idx ON orders (ticker, class_code);
 
 -- События по заявкам (WS execution/transaction)
 CREATE TABLE IF NOT EXISTS order_events (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   ts TIMESTAMPTZ NOT NULL,
   original_client_order_id UUID,
   client_order_id UUID,
@@ -91,32 +93,35 @@ CREATE TABLE IF NOT EXISTS order_events (
   execution_type TEXT,
   ticker TEXT,
   class_code TEXT,
-  data JSONB
+  data JSONB,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS order_events_default PARTITION OF order_events DEFAULT;
 CREATE INDEX IF NOT EXISTS order_events_ts_idx ON order_events (ts DESC);
 
 -- Лимиты (WS)
 CREATE TABLE IF NOT EXISTS limits_snapshots (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   ts TIMESTAMPTZ NOT NULL,
-  data JSONB NOT NULL
+  data JSONB NOT NULL,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS limits_snapshots_default PARTITION OF limits_snapshots DEFAULT;
 CREATE INDEX IF NOT EXISTS limits_snapshots_ts_idx ON limits_snapshots (ts DESC);
 
 -- Маржинальные показатели (WS)
 CREATE TABLE IF NOT EXISTS marginal_indicators_snapshots (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   ts TIMESTAMPTZ NOT NULL,
-  data JSONB NOT NULL
+  data JSONB NOT NULL,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS marginal_indicators_snapshots_default PARTITION OF marginal_indicators_snapshots DEFAULT;
 CREATE INDEX IF NOT EXISTS marginal_indicators_snapshots_ts_idx ON marginal_indicators_snapshots (ts DESC);
 
 -- Сделки
 CREATE TABLE IF NOT EXISTS trades (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   execution_id TEXT,
   ts TIMESTAMPTZ NOT NULL,
   ticker TEXT,
@@ -125,7 +130,8 @@ CREATE TABLE IF NOT EXISTS trades (
   price NUMERIC,
   quantity NUMERIC,
   commission NUMERIC,
-  data JSONB
+  data JSONB,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS trades_default PARTITION OF trades DEFAULT;
 CREATE INDEX IF NOT EXISTS trades_ts_idx ON trades (ts DESC);
@@ -142,12 +148,13 @@ CREATE TABLE IF NOT EXISTS pnl_daily (
 
 -- PnL события (плюсы/минусы)
 CREATE TABLE IF NOT EXISTS pnl_events (
-  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  id UUID DEFAULT gen_random_uuid(),
   ts TIMESTAMPTZ NOT NULL,
   pnl_value NUMERIC NOT NULL,
   currency TEXT,
   source TEXT,
-  details JSONB
+  details JSONB,
+  PRIMARY KEY (id, ts)
 ) PARTITION BY RANGE (ts);
 CREATE TABLE IF NOT EXISTS pnl_events_default PARTITION OF pnl_events DEFAULT;
 CREATE INDEX IF NOT EXISTS pnl_events_ts_idx ON pnl_events (ts DESC);
@@ -174,10 +181,29 @@ CREATE TABLE IF NOT EXISTS embedding_queue (
   text TEXT NOT NULL,
   metadata JSONB,
   status TEXT NOT NULL DEFAULT 'pending',
+  -- больше — раньше: интерактивные вызовы (10) обгоняют массовую загрузку (0)
+  priority SMALLINT NOT NULL DEFAULT 0,
+  attempts INT NOT NULL DEFAULT 0,
+  -- не раньше этого момента (экспоненциальная пауза между попытками)
+  available_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  -- аренда строки в статусе processing; просроченные возвращаются в pending
+  leased_until TIMESTAMPTZ,
+  last_error TEXT,
   created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
   updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
-CREATE INDEX IF NOT EXISTS embedding_queue_status_idx ON embedding_queue (status, created_at);
+-- для баз, созданных до появления приоритетов и аренды
+ALTER TABLE embedding_queue ADD COLUMN IF NOT EXISTS priority SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE embedding_queue ADD COLUMN IF NOT EXISTS attempts INT NOT NULL DEFAULT 0;
+ALTER TABLE embedding_queue ADD COLUMN IF NOT EXISTS available_at TIMESTAMPTZ NOT NULL DEFAULT now();
+ALTER TABLE embedding_queue ADD COLUMN IF NOT EXISTS leased_until TIMESTAMPTZ;
+ALTER TABLE embedding_queue ADD COLUMN IF NOT EXISTS last_error TEXT;
+DROP INDEX IF EXISTS embedding_queue_status_idx;
+-- частичные индексы: выполненные строки в них не попадают, выборка остаётся O(log n)
+CREATE INDEX IF NOT EXISTS embedding_queue_pending_idx
+  ON embedding_queue (priority DESC, available_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS embedding_queue_lease_idx
+  ON embedding_queue (leased_until) WHERE status = 'processing';
 
 -- Эмбеддинги (pgvector)
 CREATE TABLE IF NOT EXISTS embeddings (
@@ -188,5 +214,14 @@ CREATE TABLE IF NOT EXISTS embeddings (
   metadata JSONB,
   created_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
--- Индекс для семантического поиска (создавать после наполнения)
--- CREATE INDEX embeddings_idx ON embeddings USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+-- ANN-индекс (hnsw/ivfflat) создаёт и перестраивает worker (worker/vector_index.py)
+-- после BCS_VECTOR_INDEX_MIN_ROWS строк
+
+-- Кэш эмбеддингов по содержимому: sha256(источник + нормализованный текст),
+-- model — источник векторов: backend/провайдер/модель
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  content_hash TEXT PRIMARY KEY,
+  model TEXT NOT NULL,
+  embedding vector(768) NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
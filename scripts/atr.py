@@ -1,4 +1,5 @@
-import math
+import indicators
+
 
 def run(payload):
     series = payload.get("series", {})
@@ -14,19 +15,14 @@ def run(payload):
     if len(highs) < period + 1 or len(lows) < period + 1 or len(closes) < period + 1:
         return {"error": "not enough values", "needed": period + 1}
 
-    trs = []
-    for i in range(1, len(highs)):
-        high = highs[i]
-        low = lows[i]
-        prev_close = closes[i - 1]
-        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
-        trs.append(tr)
-
-    window = trs[-period:]
-    atr = sum(window) / period
+    # from the input values themselves, so int bars give an int like before
+    # and the window sums exactly like the original list
+    window = indicators.last_true_ranges(highs, lows, closes, period)
+    atr = indicators.total(window) / period
+    last_tr = window[-1]
 
     return {
         "period": period,
         "atr": atr,
-        "last_tr": window[-1] if window else None,
+        "last_tr": last_tr,
     }
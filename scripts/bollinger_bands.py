@@ -1,4 +1,4 @@
-import math
+import indicators
 
 
 def run(payload):
@@ -11,10 +11,9 @@ def run(payload):
     if len(values) < period:
         return {"error": "not enough values", "needed": period}
 
-    window = values[-period:]
-    mean = sum(window) / period
-    var = sum((v - mean) ** 2 for v in window) / period
-    std = math.sqrt(var)
+    window = indicators.as_array(values[-period:])
+    mean = indicators.mean(window)
+    std = indicators.pstdev(window, mean)
 
     upper = mean + std_mult * std
     lower = mean - std_mult * std
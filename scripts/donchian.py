@@ -1,3 +1,5 @@
+import indicators
+
 
 def run(payload):
     series = payload.get("series", {})
@@ -13,8 +15,8 @@ def run(payload):
     if len(highs) < period or len(lows) < period:
         return {"error": "not enough values", "needed": period}
 
-    window_high = max(highs[-period:])
-    window_low = min(lows[-period:])
+    window_high = indicators.last_max(highs, period)
+    window_low = indicators.last_min(lows, period)
     mid = (window_high + window_low) / 2
     last_close = closes[-1] if closes else None
 
@@ -1,4 +1,5 @@
-import math
+import indicators
+
 
 def run(payload):
     values = payload.get("values", [])
@@ -8,12 +9,7 @@ def run(payload):
     if len(values) < period:
         return {"error": "not enough values", "needed": period, "got": len(values)}
 
-    k = 2 / (period + 1)
-    ema = sum(values[:period]) / period
-    series = [ema]
-    for v in values[period:]:
-        ema = v * k + ema * (1 - k)
-        series.append(ema)
+    series = indicators.ema_series(values, period)
 
     return {
         "period": period,
@@ -0,0 +1,450 @@
+"""Streaming versions of the ``signal_score`` indicators.
+
+Every class advances in O(1) (amortized for the rolling extremes) per new
+value and can be dumped to / restored from a JSON-friendly dict, so the
+worker can keep one ``FeatureState`` per ``(ticker, class_code, time_frame)``
+in the database and update it as candles close.
+
+Rolling windows carry their raw values, so their running sums are rebuilt
+exactly once per window length to stop floating-point drift. Values match
+``signal_score`` computed over the same window up to rounding; RSI is seeded
+at the first bar ever seen rather than at the start of the lookback window,
+so it converges to (but is not identical with) the batch value.
+"""
+
+import math
+from collections import deque
+
+import signal_score
+
+
+class Ema:
+    """EMA seeded with the mean of the first ``period`` values."""
+
+    def __init__(self, period):
+        self.period = period
+        self.k = 2 / (period + 1)
+        self.count = 0
+        self.seed_sum = 0.0
+        self.value = None
+
+    def update(self, x):
+        self.count += 1
+        if self.count < self.period:
+            self.seed_sum += x
+        elif self.count == self.period:
+            self.value = (self.seed_sum + x) / self.period
+        else:
+            self.value = x * self.k + self.value * (1 - self.k)
+        return self.value
+
+    def dump(self):
+        return {"count": self.count, "seed_sum": self.seed_sum, "value": self.value}
+
+    def load(self, state):
+        self.count = state["count"]
+        self.seed_sum = state["seed_sum"]
+        self.value = state["value"]
+
+
+class WilderRsi:
+    """RSI with Wilder smoothing, same recursion as ``signal_score.rsi``."""
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev = None
+        self.deltas = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, x):
+        if self.prev is None:
+            self.prev = x
+            return None
+        delta = x - self.prev
+        self.prev = x
+        gain = max(delta, 0.0)
+        loss = max(-delta, 0.0)
+        self.deltas += 1
+        if self.deltas <= self.period:
+            # seed: plain sums, divided once the first window is complete
+            self.avg_gain += gain
+            self.avg_loss += loss
+            if self.deltas == self.period:
+                self.avg_gain /= self.period
+                self.avg_loss /= self.period
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        return self.value
+
+    @property
+    def value(self):
+        if self.deltas < self.period:
+            return None
+        if self.avg_loss == 0:
+            return 100.0
+        rs = self.avg_gain / self.avg_loss
+        return 100 - (100 / (1 + rs))
+
+    def dump(self):
+        return {
+            "prev": self.prev,
+            "deltas": self.deltas,
+            "avg_gain": self.avg_gain,
+            "avg_loss": self.avg_loss,
+        }
+
+    def load(self, state):
+        self.prev = state["prev"]
+        self.deltas = state["deltas"]
+        self.avg_gain = state["avg_gain"]
+        self.avg_loss = state["avg_loss"]
+
+
+class RollingStats:
+    """Mean and population standard deviation over the last ``window`` values."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.shift = None
+        self.since_rebuild = 0
+
+    def update(self, x):
+        if self.shift is None:
+            # sums are kept around the first value to avoid cancellation
+            self.shift = x
+        if len(self.values) == self.window:
+            old = self.values[0] - self.shift
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(x)
+        d = x - self.shift
+        self.total += d
+        self.total_sq += d * d
+        self.since_rebuild += 1
+        if self.since_rebuild >= self.window:
+            self._rebuild()
+
+    def _rebuild(self):
+        self.shift = self.values[-1]
+        self.total = 0.0
+        self.total_sq = 0.0
+        for v in self.values:
+            d = v - self.shift
+            self.total += d
+            self.total_sq += d * d
+        self.since_rebuild = 0
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    @property
+    def mean(self):
+        if not self.values:
+            return 0.0
+        return self.shift + self.total / len(self.values)
+
+    @property
+    def std(self):
+        n = len(self.values)
+        if not n:
+            return 0.0
+        m = self.total / n
+        return math.sqrt(max(0.0, self.total_sq / n - m * m))
+
+    def dump(self):
+        return {"values": list(self.values)}
+
+    def load(self, state):
+        self.values = deque(state["values"], maxlen=self.window)
+        if self.values:
+            self._rebuild()
+
+
+class RollingSlope:
+    """Least-squares slope of the last ``window`` values against their index."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.sum_y = 0.0
+        self.sum_iy = 0.0
+        self.shift = None
+        self.since_rebuild = 0
+
+    def update(self, x):
+        if self.shift is None:
+            self.shift = x
+        y = x - self.shift
+        n = len(self.values)
+        if n == self.window:
+            old = self.values[0] - self.shift
+            # every remaining value moves one index to the left
+            self.sum_iy -= self.sum_y - old
+            self.sum_y -= old
+            n -= 1
+        self.values.append(x)
+        self.sum_iy += n * y
+        self.sum_y += y
+        self.since_rebuild += 1
+        if self.since_rebuild >= self.window:
+            self._rebuild()
+
+    def _rebuild(self):
+        self.shift = self.values[-1]
+        self.sum_y = 0.0
+        self.sum_iy = 0.0
+        for i, v in enumerate(self.values):
+            self.sum_y += v - self.shift
+            self.sum_iy += i * (v - self.shift)
+        self.since_rebuild = 0
+
+    @property
+    def value(self):
+        n = len(self.values)
+        if n < 2:
+            return 0.0
+        x_mean = (n - 1) / 2.0
+        den = n * (n * n - 1) / 12.0
+        return (self.sum_iy - x_mean * self.sum_y) / den
+
+    def dump(self):
+        return {"values": list(self.values)}
+
+    def load(self, state):
+        self.values = deque(state["values"], maxlen=self.window)
+        if self.values:
+            self._rebuild()
+
+
+class RollingExtremes:
+    """Rolling max and min over the last ``window`` values (monotonic deques)."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.index = 0
+        self._max = deque()
+        self._min = deque()
+
+    def update(self, x):
+        self.values.append(x)
+        i = self.index
+        self.index += 1
+        while self._max and self._max[-1][1] <= x:
+            self._max.pop()
+        self._max.append((i, x))
+        while self._min and self._min[-1][1] >= x:
+            self._min.pop()
+        self._min.append((i, x))
+        oldest = self.index - self.window
+        if self._max[0][0] < oldest:
+            self._max.popleft()
+        if self._min[0][0] < oldest:
+            self._min.popleft()
+
+    def max(self, last=None):
+        if last is not None and last < len(self.values):
+            return max(list(self.values)[-last:])
+        return self._max[0][1] if self._max else None
+
+    def min(self, last=None):
+        if last is not None and last < len(self.values):
+            return min(list(self.values)[-last:])
+        return self._min[0][1] if self._min else None
+
+    def dump(self):
+        return {"values": list(self.values)}
+
+    def load(self, state):
+        self.values = deque(maxlen=self.window)
+        self.index = 0
+        self._max.clear()
+        self._min.clear()
+        for v in state["values"]:
+            self.update(v)
+
+
+class RollingMean:
+    """Plain moving average; used for ATR over true ranges."""
+
+    def __init__(self, window):
+        self.stats = RollingStats(window)
+
+    def update(self, x):
+        self.stats.update(x)
+
+    @property
+    def value(self):
+        return self.stats.mean
+
+    def dump(self):
+        return self.stats.dump()
+
+    def load(self, state):
+        self.stats.load(state)
+
+
+class FeatureState:
+    """All ``signal_score`` features of one candle series, updated per bar.
+
+    ``lookback`` plays the role of the ``signals.run`` lookback: the trend,
+    mean and deviation features cover the last ``lookback`` bars.
+    """
+
+    VERSION = 1
+
+    def __init__(self, lookback=200):
+        self.lookback = lookback
+        self.bars = 0
+        self.last_ts = None
+        self.prev_close = None
+        self.closes = deque(maxlen=10)
+        self.last_volume = None
+        self.price = RollingStats(lookback)
+        self.slope = RollingSlope(lookback)
+        self.stats20 = RollingStats(20)
+        self.stats60 = RollingStats(60)
+        self.volume20 = RollingStats(20)
+        self.rsi = WilderRsi(14)
+        self.atr = RollingMean(14)
+        self.highs = RollingExtremes(20)
+        self.lows = RollingExtremes(20)
+        self.ema_fast = Ema(12)
+        self.ema_slow = Ema(26)
+
+    def _parts(self):
+        return {
+            "price": self.price,
+            "slope": self.slope,
+            "stats20": self.stats20,
+            "stats60": self.stats60,
+            "volume20": self.volume20,
+            "rsi": self.rsi,
+            "atr": self.atr,
+            "highs": self.highs,
+            "lows": self.lows,
+            "ema_fast": self.ema_fast,
+            "ema_slow": self.ema_slow,
+        }
+
+    def update(self, ts, high, low, close, volume=None):
+        """Advance by one closed bar."""
+        high = close if high is None else high
+        low = close if low is None else low
+        if self.prev_close is not None:
+            self.atr.update(
+                max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+            )
+        self.prev_close = close
+        self.closes.append(close)
+        self.price.update(close)
+        self.slope.update(close)
+        self.stats20.update(close)
+        self.stats60.update(close)
+        self.rsi.update(close)
+        self.highs.update(high)
+        self.lows.update(low)
+        self.ema_fast.update(close)
+        self.ema_slow.update(close)
+        if volume is not None:
+            self.volume20.update(volume)
+            self.last_volume = volume
+        self.bars += 1
+        self.last_ts = ts
+
+    def features(self):
+        """Same keys as ``signal_score.compute_features`` plus the EMAs."""
+        n = min(self.bars, self.lookback)
+        if n < 10:
+            return None
+        safe_div = signal_score.safe_div
+        closes = list(self.closes)
+        close = closes[-1]
+        ret1 = safe_div(close - closes[-2], closes[-2])
+        ret5 = safe_div(close - closes[-6], closes[-6])
+        ret10 = safe_div(close - closes[-10], closes[-10])
+
+        price_mean = self.price.mean
+        price_std = self.price.std
+        slope = self.slope.value
+        slope_pct = safe_div(slope, price_mean)
+        trend_strength = safe_div(abs(slope), price_std + 1e-9)
+
+        rsi_val = self.rsi.value
+        rsi_val = rsi_val if rsi_val is not None else 50.0
+        z_val = (close - price_mean) / price_std if price_std > 0 else 0.0
+
+        # with fewer bars than a window the window holds the whole series,
+        # which is what signal_score falls back to as well
+        boll_std = self.stats20.std
+        boll_pos = safe_div(close - self.stats20.mean, (boll_std * 2) if boll_std else 1.0)
+
+        atr_val = self.atr.value if self.bars > 1 else 0.0
+        short_vol = self.stats20.std if n >= 20 else price_std
+        long_vol = self.stats60.std if n >= 60 else price_std
+        vol_ratio = safe_div(short_vol, long_vol + 1e-9)
+
+        donchian_period = 20 if n >= 20 else max(5, n // 2)
+        d_high = self.highs.max(donchian_period)
+        d_low = self.lows.min(donchian_period)
+
+        vol_spike = None
+        if self.volume20.count:
+            vol_spike = safe_div(self.last_volume, self.volume20.mean + 1e-9)
+
+        return {
+            "count": n,
+            "close": close,
+            "return_1": ret1,
+            "return_5": ret5,
+            "return_10": ret10,
+            "slope": slope,
+            "slope_pct": slope_pct,
+            "trend_strength": trend_strength,
+            "rsi": rsi_val,
+            "zscore": z_val,
+            "boll_pos": boll_pos,
+            "atr": atr_val,
+            "atr_pct": safe_div(atr_val, close),
+            "vol_ratio": vol_ratio,
+            "donchian_high": d_high,
+            "donchian_low": d_low,
+            "breakout_up": close >= d_high,
+            "breakout_down": close <= d_low,
+            "volume_spike": vol_spike,
+            "ema_fast": self.ema_fast.value,
+            "ema_slow": self.ema_slow.value,
+        }
+
+    def dump(self):
+        return {
+            "version": self.VERSION,
+            "lookback": self.lookback,
+            "bars": self.bars,
+            "last_ts": self.last_ts,
+            "prev_close": self.prev_close,
+            "closes": list(self.closes),
+            "last_volume": self.last_volume,
+            **{name: part.dump() for name, part in self._parts().items()},
+        }
+
+    @classmethod
+    def restore(cls, state):
+        """Rebuild from ``dump()``; returns None for an incompatible state."""
+        if not state or state.get("version") != cls.VERSION:
+            return None
+        self = cls(state["lookback"])
+        self.bars = state["bars"]
+        self.last_ts = state["last_ts"]
+        self.prev_close = state["prev_close"]
+        self.closes = deque(state["closes"], maxlen=10)
+        self.last_volume = state["last_volume"]
+        for name, part in self._parts().items():
+            part.load(state[name])
+        return self
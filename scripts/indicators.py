@@ -0,0 +1,231 @@
+"""Vectorized building blocks shared by the indicator scripts.
+
+Everything works on contiguous float64 arrays. Element-wise steps (deltas,
+true range, rolling windows) are plain NumPy operations; sums keep the same
+left-to-right order as the original list loops, and the EMA / Wilder
+recursions stay sequential, so results match the pure-Python scripts bit for
+bit instead of only up to rounding. ``window_means`` is the one opt-in
+exception: it avoids the drift of the running window sum of ``sma_series``
+and agrees with it to rounding only. The recursions return plain lists: they
+are built element by element anyway and usually end up in JSON.
+"""
+
+import math
+from typing import List
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def as_array(values) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def _as_list(values) -> list:
+    return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+
+def total(values) -> float:
+    """Sum in the same order and precision as the built-in ``sum``."""
+    return sum(_as_list(values))
+
+
+def running_total(values: np.ndarray) -> np.ndarray:
+    """Prefix sums accumulated one element at a time, like a ``+=`` loop.
+
+    A 2-D array is accumulated along its rows.
+    """
+    return np.add.accumulate(values, axis=-1)
+
+
+# ``sum`` compensates float additions (Neumaier) since Python 3.12; checked
+# by behaviour rather than by version.
+_COMPENSATED_SUM = sum([1.0, 1e100, 1.0, -1e100]) == 2.0
+
+
+def row_totals(values: np.ndarray) -> np.ndarray:
+    """``total`` of every row of a 2-D float array, the rows summed side by side.
+
+    Walks the columns the way ``sum`` walks a list of floats, including its
+    compensation where the interpreter has it, so each row sums exactly as
+    ``total(row)`` would.
+    """
+    result = np.zeros(len(values))
+    compensation = np.zeros(len(values))
+    with np.errstate(invalid="ignore", over="ignore"):
+        for x in np.ascontiguousarray(values.T):
+            t = result + x
+            if _COMPENSATED_SUM:
+                compensation += np.where(
+                    np.abs(result) >= np.abs(x), (result - t) + x, (x - t) + result
+                )
+            result = t
+        if _COMPENSATED_SUM:
+            usable = (compensation != 0) & np.isfinite(compensation)
+            result = np.where(usable, result + compensation, result)
+    return result
+
+
+def mean(values: np.ndarray) -> float:
+    if not len(values):
+        return 0.0
+    return total(values) / len(values)
+
+
+def pstdev(values: np.ndarray, center: float = None) -> float:
+    """Population standard deviation around ``center`` (defaults to the mean)."""
+    if not len(values):
+        return 0.0
+    m = mean(values) if center is None else center
+    return math.sqrt(total((values - m) ** 2) / len(values))
+
+
+def window_sums(values: np.ndarray, period: int) -> np.ndarray:
+    """Sum of every full window of ``period`` values.
+
+    Every window is summed on its own (a ``valid`` convolution with ones), so
+    the rounding error stays that of a ``period`` element sum instead of
+    carrying over from window to window, as a running ``+= new - old`` sum or
+    a difference of prefix sums does.
+    """
+    return np.convolve(values, np.ones(period), mode="valid")
+
+
+def window_means(values: np.ndarray, period: int) -> np.ndarray:
+    """Moving average of every full window, each window summed on its own."""
+    return window_sums(values, period) / period
+
+
+def sma_series(values: np.ndarray, period: int, first_sum: float = None) -> np.ndarray:
+    """Moving average of every full window, via a running window sum.
+
+    ``first_sum`` is the sum of the first window when the caller has it from
+    the input values themselves (see ``total``).
+    """
+    steps = np.empty(len(values) - period + 1)
+    steps[0] = total(values[:period]) if first_sum is None else first_sum
+    steps[1:] = values[period:] - values[:-period]
+    return running_total(steps) / period
+
+
+def ema_series(values, period: int, seed: float = None) -> List[float]:
+    """EMA seeded with the mean of the first ``period`` values.
+
+    Accepts a list as well: nothing here is vectorizable, so converting a
+    list to an array first would only add work.
+    """
+    k = 2 / (period + 1)
+    decay = 1 - k
+    current = total(values[:period]) / period if seed is None else seed
+    out = [current]
+    append = out.append
+    for v in _as_list(values[period:]):
+        current = v * k + current * decay
+        append(current)
+    return out
+
+
+def wilder_series(seed: float, updates, period: int) -> List[float]:
+    """Wilder smoothing: ``avg = (avg * (period - 1) + x) / period`` per update."""
+    keep = period - 1
+    current = seed
+    out = [current]
+    append = out.append
+    for x in _as_list(updates):
+        current = (current * keep + x) / period
+        append(current)
+    return out
+
+
+def wilder_rows(seed: np.ndarray, updates: np.ndarray, period: int) -> np.ndarray:
+    """Last value of ``wilder_series`` for every row of ``updates``, rows smoothed side by side."""
+    keep = period - 1
+    current = seed
+    for x in np.ascontiguousarray(updates.T):
+        current = (current * keep + x) / period
+    return current
+
+
+def gains_losses(values: np.ndarray):
+    deltas = np.diff(values)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+    return gains, losses
+
+
+def rsi_from_averages(avg_gain, avg_loss) -> np.ndarray:
+    avg_gain = as_array(avg_gain)
+    avg_loss = as_array(avg_loss)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+    return np.where(avg_loss == 0, 100.0, rsi)
+
+
+def rsi_series(gains: np.ndarray, losses: np.ndarray, period: int) -> np.ndarray:
+    """RSI as computed by ``rsi.py``, one value per delta from ``period`` on.
+
+    The first smoothing step uses the delta after the seed window, so the
+    delta at index ``period`` itself is skipped (kept for compatibility).
+    """
+    if len(gains) <= period:
+        return np.empty(0)
+    avg_gain = wilder_series(total(gains[:period]) / period, gains[period + 1:], period)
+    avg_loss = wilder_series(total(losses[:period]) / period, losses[period + 1:], period)
+    return rsi_from_averages(avg_gain, avg_loss)
+
+
+def true_range(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    """True range of bars 1..n-1 (bar 0 has no previous close)."""
+    prev_close = closes[:-1]
+    high = highs[1:]
+    low = lows[1:]
+    return np.maximum(
+        np.maximum(high - low, np.abs(high - prev_close)), np.abs(low - prev_close)
+    )
+
+
+def last_true_ranges(highs, lows, closes, period: int) -> list:
+    """True range of the last ``period`` bars, from the input values themselves.
+
+    ``sum`` adds ints and floats differently (floats are compensated since
+    Python 3.12), so a window that must sum like the original list keeps
+    int bars as ints instead of going through a float array.
+    """
+    n = min(len(highs), len(lows), len(closes))
+    return [
+        max(highs[i] - lows[i], abs(highs[i] - closes[i - 1]), abs(lows[i] - closes[i - 1]))
+        for i in range(n - period, n)
+    ]
+
+
+def rolling_max(values: np.ndarray, period: int) -> np.ndarray:
+    return sliding_window_view(values, period).max(axis=1)
+
+
+def rolling_min(values: np.ndarray, period: int) -> np.ndarray:
+    return sliding_window_view(values, period).min(axis=1)
+
+
+def last_max(values, period: int):
+    """Largest of the last ``period`` values, as the element itself (an int stays an int)."""
+    window = values[-period:]
+    return window[int(np.argmax(as_array(window)))]
+
+
+def last_min(values, period: int):
+    """Smallest of the last ``period`` values, as the element itself."""
+    window = values[-period:]
+    return window[int(np.argmin(as_array(window)))]
+
+
+def linear_slope(values: np.ndarray) -> float:
+    """Least-squares slope of ``values`` against their index."""
+    n = len(values)
+    if n < 2:
+        return 0.0
+    dx = np.arange(n) - (n - 1) / 2.0
+    num = running_total(dx * (values - mean(values)))[-1]
+    den = running_total(dx * dx)[-1]
+    if den == 0:
+        return 0.0
+    return float(num / den)
@@ -0,0 +1,183 @@
+from numpy.lib.stride_tricks import sliding_window_view
+
+import indicators
+
+DEFAULT_PERIODS = {
+    "sma": 20,
+    "ema": 20,
+    "rsi": 14,
+    "atr": 14,
+    "bollinger_bands": 20,
+    "donchian": 20,
+    "zscore": 20,
+}
+
+ALIASES = {"bollinger": "bollinger_bands"}
+
+
+class _Series:
+    """One input series plus intermediates shared between indicator specs."""
+
+    def __init__(self, closes, highs, lows):
+        self.closes = indicators.as_array(closes)
+        self.highs = indicators.as_array(highs) if highs else None
+        self.lows = indicators.as_array(lows) if lows else None
+        self.count = len(self.closes)
+        self._cache = {}
+
+    def cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def closes_list(self):
+        return self.cached("closes_list", self.closes.tolist)
+
+    def gains_losses(self):
+        return self.cached("gains_losses", lambda: indicators.gains_losses(self.closes))
+
+    def true_range(self):
+        def compute():
+            n = min(self.count, len(self.highs), len(self.lows))
+            return indicators.true_range(self.highs[:n], self.lows[:n], self.closes[:n])
+
+        return self.cached("true_range", compute)
+
+    def window_stats(self, period):
+        def compute():
+            window = self.closes[-period:]
+            mean = indicators.mean(window)
+            return mean, indicators.pstdev(window, mean)
+
+        return self.cached(("window", period), compute)
+
+
+def _tail(values, tail):
+    if tail <= 0:
+        return {}
+    return {"series": list(values[-tail:])}
+
+
+def _sma(s, spec, period, tail):
+    if s.count < period:
+        return {"error": "not enough values", "needed": period}
+    series = s.cached(("sma", period), lambda: indicators.sma_series(s.closes, period).tolist())
+    return {"value": series[-1], **_tail(series, tail)}
+
+
+def _ema(s, spec, period, tail):
+    if s.count < period:
+        return {"error": "not enough values", "needed": period}
+    series = s.cached(("ema", period), lambda: indicators.ema_series(s.closes_list(), period))
+    return {"value": series[-1], **_tail(series, tail)}
+
+
+def _rsi(s, spec, period, tail):
+    if s.count <= period:
+        return {"error": "not enough values", "needed": period + 1}
+    gains, losses = s.gains_losses()
+    series = indicators.rsi_series(gains, losses, period).tolist()
+    return {"value": series[-1] if series else None, **_tail(series, tail)}
+
+
+def _atr(s, spec, period, tail):
+    if s.highs is None or s.lows is None:
+        return {"error": "highs and lows required"}
+    trs = s.true_range()
+    if len(trs) < period:
+        return {"error": "not enough values", "needed": period + 1}
+    out = {"value": indicators.total(trs[-period:]) / period, "last_tr": float(trs[-1])}
+    if tail > 0:
+        windows = sliding_window_view(trs, period)[-tail:]
+        out["series"] = [indicators.total(w) / period for w in windows]
+    return out
+
+
+def _bollinger(s, spec, period, tail):
+    if s.count < period:
+        return {"error": "not enough values", "needed": period}
+    std_mult = float(spec.get("std_mult", 2))
+    mean, std = s.window_stats(period)
+    upper = mean + std_mult * std
+    lower = mean - std_mult * std
+    last = float(s.closes[-1])
+    return {
+        "mid": mean,
+        "upper": upper,
+        "lower": lower,
+        "zscore": 0 if std == 0 else (last - mean) / std,
+        "bandwidth": 0 if mean == 0 else (upper - lower) / mean,
+    }
+
+
+def _donchian(s, spec, period, tail):
+    if s.highs is None or s.lows is None:
+        return {"error": "highs and lows required"}
+    if len(s.highs) < period or len(s.lows) < period:
+        return {"error": "not enough values", "needed": period}
+    upper = float(s.highs[-period:].max())
+    lower = float(s.lows[-period:].min())
+    last = float(s.closes[-1])
+    breakout = "up" if last > upper else "down" if last < lower else "none"
+    return {"upper": upper, "lower": lower, "mid": (upper + lower) / 2, "breakout": breakout}
+
+
+def _zscore(s, spec, period, tail):
+    if s.count < period:
+        return {"error": "not enough values", "needed": period}
+    mean, std = s.window_stats(period)
+    last = float(s.closes[-1])
+    return {"mean": mean, "std": std, "value": 0 if std == 0 else (last - mean) / std}
+
+
+COMPUTE = {
+    "sma": _sma,
+    "ema": _ema,
+    "rsi": _rsi,
+    "atr": _atr,
+    "bollinger_bands": _bollinger,
+    "donchian": _donchian,
+    "zscore": _zscore,
+}
+
+
+def run(payload):
+    series = payload.get("series", {})
+    closes = (
+        payload.get("values")
+        or payload.get("closes")
+        or series.get("close")
+        or series.get("closes")
+        or series.get("values")
+    )
+    highs = payload.get("highs") or series.get("high") or series.get("highs")
+    lows = payload.get("lows") or series.get("low") or series.get("lows")
+    specs = payload.get("indicators") or []
+    tail = max(0, int(payload.get("tail", 0)))
+
+    if not closes:
+        return {"error": "values or series.close required"}
+    if not specs:
+        return {"error": "indicators required", "supported": sorted(COMPUTE)}
+
+    data = _Series(closes, highs, lows)
+    results = {}
+    for spec in specs:
+        if isinstance(spec, str):
+            spec = {"type": spec}
+        kind = ALIASES.get(spec.get("type"), spec.get("type"))
+        compute = COMPUTE.get(kind)
+        period = int(spec.get("period", DEFAULT_PERIODS.get(kind, 0)))
+        name = spec.get("name") or f"{kind}_{period}"
+        if compute is None:
+            results[name] = {"error": "unknown indicator", "supported": sorted(COMPUTE)}
+        elif period <= 0:
+            results[name] = {"error": "period must be > 0"}
+        else:
+            results[name] = compute(data, spec, period, tail)
+
+    return {
+        "count": data.count,
+        "last": float(data.closes[-1]),
+        "indicators": results,
+    }
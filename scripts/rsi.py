@@ -1,4 +1,5 @@
-import math
+import indicators
+
 
 def run(payload):
     values = payload.get("values", [])
@@ -8,24 +9,8 @@ def run(payload):
     if len(values) <= period:
         return {"error": "not enough values", "needed": period + 1, "got": len(values)}
 
-    deltas = [values[i] - values[i - 1] for i in range(1, len(values))]
-    gains = [max(d, 0) for d in deltas]
-    losses = [abs(min(d, 0)) for d in deltas]
-
-    avg_gain = sum(gains[:period]) / period
-    avg_loss = sum(losses[:period]) / period
-
-    series = []
-    for i in range(period, len(deltas)):
-        if i > period:
-            avg_gain = (avg_gain * (period - 1) + gains[i]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i]) / period
-        if avg_loss == 0:
-            rsi = 100.0
-        else:
-            rs = avg_gain / avg_loss
-            rsi = 100 - (100 / (1 + rs))
-        series.append(rsi)
+    gains, losses = indicators.gains_losses(indicators.as_array(values))
+    series = indicators.rsi_series(gains, losses, period).tolist()
 
     return {
         "period": period,
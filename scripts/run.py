@@ -1,4 +1,5 @@
 import json
+import signal
 import sys
 from pathlib import Path
 import importlib.util
@@ -18,11 +19,132 @@ def load_script(path: Path):
     return module
 
 
+class ScriptTimeout(BaseException):
+    """Raised by the request timer. Not an ``Exception``, so a script's own
+    ``except Exception`` (per-item error handling, say) cannot swallow it."""
+
+
+class ScriptCache:
+    """Manifest and script modules loaded once per process.
+
+    Both are reloaded when the file on disk changes, so a long-lived server
+    picks up edited scripts without a restart.
+    """
+
+    def __init__(self):
+        self._manifest = None
+        self._manifest_mtime = None
+        self._modules = {}
+
+    def scripts(self):
+        mtime = MANIFEST_PATH.stat().st_mtime
+        if self._manifest is None or mtime != self._manifest_mtime:
+            manifest = load_manifest()
+            self._manifest = {s["name"]: s for s in manifest.get("scripts", [])}
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def module(self, path: Path):
+        mtime = path.stat().st_mtime
+        cached = self._modules.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, load_script(path))
+            self._modules[path] = cached
+        return cached[1]
+
+    def preload(self):
+        for name in self.scripts():
+            try:
+                resolve(self, name)
+            except Exception:
+                pass
+
+
+def resolve(cache: ScriptCache, script_name: str):
+    """Returns (module, None) or (None, error response)."""
+    scripts = cache.scripts()
+    if script_name not in scripts:
+        return None, {"error": "unknown script", "name": script_name}
+
+    script_path = Path(__file__).parent.parent / scripts[script_name]["path"]
+    if not script_path.exists():
+        return None, {"error": "script file not found", "path": str(script_path)}
+
+    module = cache.module(script_path)
+    if not hasattr(module, "run"):
+        return None, {"error": "script missing run(payload)"}
+    return module, None
+
+
+def _on_alarm(signum, frame):
+    raise ScriptTimeout()
+
+
+def serve():
+    """Line-delimited JSON server over stdin/stdout.
+
+    Each request is ``{"id", "name", "payload", "timeoutMs"}`` on one line; the
+    reply is the same envelope as the one-shot mode plus ``id``. Anything the
+    scripts print goes to stderr so it cannot break the protocol.
+    """
+    cache = ScriptCache()
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    cache.preload()
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+    def reply(response):
+        out.write(json.dumps(response, ensure_ascii=False) + "\n")
+        out.flush()
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except Exception as exc:
+            reply({"id": None, "error": "invalid json", "details": str(exc)})
+            continue
+
+        request_id = request.get("id")
+        try:
+            module, error = resolve(cache, request.get("name") or "")
+        except Exception as exc:
+            module, error = None, {"error": "script load failed", "details": str(exc)}
+        if error:
+            reply({"id": request_id, **error})
+            continue
+
+        timeout_ms = request.get("timeoutMs") or 0
+        try:
+            try:
+                if timeout_ms > 0:
+                    signal.setitimer(signal.ITIMER_REAL, timeout_ms / 1000)
+                result = module.run(request.get("payload") or {})
+            finally:
+                # disarmed before reply(), so a late alarm cannot hit the write
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            response = {"id": request_id, "ok": True, "result": result}
+        except ScriptTimeout:
+            response = {"id": request_id, "ok": False, "error": f"script timed out after {timeout_ms} ms"}
+        except Exception as exc:
+            response = {"id": request_id, "ok": False, "error": str(exc)}
+        try:
+            reply(response)
+        except (TypeError, ValueError) as exc:
+            reply({"id": request_id, "ok": False, "error": f"result is not serializable: {exc}"})
+
+
 def main():
     if len(sys.argv) < 2:
         print(json.dumps({"error": "script name required"}), flush=True)
         sys.exit(1)
 
+    if sys.argv[1] == "--serve":
+        serve()
+        return
+
     script_name = sys.argv[1]
     payload_raw = sys.stdin.read().strip() or "{}"
     try:
@@ -31,20 +153,9 @@ def main():
         print(json.dumps({"error": "invalid json", "details": str(exc)}), flush=True)
         sys.exit(1)
 
-    manifest = load_manifest()
-    scripts = {s["name"]: s for s in manifest.get("scripts", [])}
-    if script_name not in scripts:
-        print(json.dumps({"error": "unknown script", "name": script_name}), flush=True)
-        sys.exit(1)
-
-    script_path = Path(__file__).parent.parent / scripts[script_name]["path"]
-    if not script_path.exists():
-        print(json.dumps({"error": "script file not found", "path": str(script_path)}), flush=True)
-        sys.exit(1)
-
-    module = load_script(script_path)
-    if not hasattr(module, "run"):
-        print(json.dumps({"error": "script missing run(payload)"}), flush=True)
+    module, error = resolve(ScriptCache(), script_name)
+    if error:
+        print(json.dumps(error), flush=True)
         sys.exit(1)
 
     try:
@@ -1,6 +1,9 @@
 import sys
 import json
-import math
+
+import numpy as np
+
+import indicators
 
 
 def clamp(value, low=0.0, high=1.0):
@@ -8,85 +11,41 @@ def clamp(value, low=0.0, high=1.0):
 
 
 def mean(values):
-    if not values:
-        return 0.0
-    return sum(values) / len(values)
+    return indicators.mean(indicators.as_array(values))
 
 
 def stddev(values):
-    if not values:
-        return 0.0
-    m = mean(values)
-    var = sum((v - m) ** 2 for v in values) / len(values)
-    return math.sqrt(var)
+    return indicators.pstdev(indicators.as_array(values))
 
 
 def ema(values, period):
     if period <= 0 or len(values) < period:
         return None
-    k = 2 / (period + 1)
-    current = mean(values[:period])
-    for v in values[period:]:
-        current = v * k + current * (1 - k)
-    return current
+    return indicators.ema_series(values, period)[-1]
 
 
 def rsi(values, period=14):
     if period <= 0 or len(values) <= period:
         return None
-    gains = 0.0
-    losses = 0.0
-    for i in range(1, period + 1):
-        delta = values[i] - values[i - 1]
-        if delta >= 0:
-            gains += delta
-        else:
-            losses += -delta
-    avg_gain = gains / period
-    avg_loss = losses / period
-    for i in range(period + 1, len(values)):
-        delta = values[i] - values[i - 1]
-        gain = max(delta, 0.0)
-        loss = max(-delta, 0.0)
-        avg_gain = (avg_gain * (period - 1) + gain) / period
-        avg_loss = (avg_loss * (period - 1) + loss) / period
-    if avg_loss == 0:
-        return 100.0
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
+    gains, losses = indicators.gains_losses(indicators.as_array(values))
+    avg_gain = indicators.wilder_series(
+        indicators.running_total(gains[:period])[-1] / period, gains[period:], period
+    )[-1]
+    avg_loss = indicators.wilder_series(
+        indicators.running_total(losses[:period])[-1] / period, losses[period:], period
+    )[-1]
+    return float(indicators.rsi_from_averages([avg_gain], [avg_loss])[0])
 
 
 def atr(highs, lows, closes, period=14):
     if period <= 0 or len(highs) < period + 1:
         return None
-    trs = []
-    for i in range(1, len(highs)):
-        tr = max(
-            highs[i] - lows[i],
-            abs(highs[i] - closes[i - 1]),
-            abs(lows[i] - closes[i - 1]),
-        )
-        trs.append(tr)
-    if len(trs) < period:
-        return None
-    return mean(trs[-period:])
+    trs = indicators.last_true_ranges(highs, lows, closes, period)
+    return indicators.total(trs) / period
 
 
 def linear_slope(values):
-    n = len(values)
-    if n < 2:
-        return 0.0
-    x_mean = (n - 1) / 2.0
-    y_mean = mean(values)
-    num = 0.0
-    den = 0.0
-    for i, v in enumerate(values):
-        dx = i - x_mean
-        num += dx * (v - y_mean)
-        den += dx * dx
-    if den == 0:
-        return 0.0
-    return num / den
+    return indicators.linear_slope(indicators.as_array(values))
 
 
 def safe_div(a, b):
@@ -150,11 +109,130 @@ def compute_orderbook(orderbook):
     }
 
 
-def run(payload):
-    series = prepare_series(payload.get("series") or {})
-    if not series:
-        return {"error": "series is empty"}
+def series_stats(series):
+    """Whole-window statistics of a prepared series with at least 10 bars.
+
+    The part of ``compute_features`` that ``stacked_series_stats`` computes
+    for many series at once.
+    """
+    closes = series["closes"]
+    volumes = series["volumes"]
+    n = series["count"]
+
+    # whole-series helpers get the arrays, short tails stay lists
+    closes_arr = indicators.as_array(closes)
+    closes_mean = mean(closes_arr)
+    price_std = indicators.pstdev(closes_arr, closes_mean)
+    rsi_val = rsi(closes_arr, period=min(14, n - 1))
+
+    volume_mean = None
+    if volumes:
+        volume_mean = mean(volumes[-20:]) if n >= 20 else mean(volumes)
+
+    return {
+        "mean": closes_mean,
+        "std": price_std,
+        "slope": linear_slope(closes_arr),
+        "rsi": rsi_val if rsi_val is not None else 50.0,
+        "mean_20": mean(closes[-20:]) if n >= 20 else closes_mean,
+        "std_20": stddev(closes[-20:]) if n >= 20 else price_std,
+        "std_60": stddev(closes[-60:]) if n >= 60 else price_std,
+        "volume_mean": volume_mean,
+    }
+
 
+def _window_stats(values, width):
+    window = values[:, -width:]
+    means = indicators.row_totals(window) / width
+    stds = np.sqrt(indicators.row_totals((window - means[:, None]) ** 2) / width)
+    return means, stds
+
+
+def _stack(series_list):
+    """``series_stats`` of series of one length, as rows of one 2-D array."""
+    n = series_list[0]["count"]
+    closes = np.stack([indicators.as_array(s["closes"]) for s in series_list])
+
+    means = indicators.row_totals(closes) / n
+    centered = closes - means[:, None]
+    stds = np.sqrt(indicators.row_totals(centered ** 2) / n)
+
+    dx = np.arange(n) - (n - 1) / 2.0
+    slopes = indicators.running_total(dx * centered)[:, -1] / indicators.running_total(dx * dx)[-1]
+
+    period = min(14, n - 1)
+    gains, losses = indicators.gains_losses(closes)
+    avg_gain = indicators.wilder_rows(
+        indicators.running_total(gains[:, :period])[:, -1] / period, gains[:, period:], period
+    )
+    avg_loss = indicators.wilder_rows(
+        indicators.running_total(losses[:, :period])[:, -1] / period, losses[:, period:], period
+    )
+    rsis = indicators.rsi_from_averages(avg_gain, avg_loss)
+
+    means_20, stds_20 = _window_stats(closes, 20) if n >= 20 else (means, stds)
+    stds_60 = _window_stats(closes, 60)[1] if n >= 60 else stds
+
+    with_volumes = [i for i, s in enumerate(series_list) if s["volumes"]]
+    volume_means = [None] * len(series_list)
+    if with_volumes:
+        width = min(20, n)
+        volumes = np.stack([indicators.as_array(series_list[i]["volumes"][-width:]) for i in with_volumes])
+        for i, value in zip(with_volumes, (indicators.row_totals(volumes) / width).tolist()):
+            volume_means[i] = value
+
+    columns = {
+        "mean": means,
+        "std": stds,
+        "slope": slopes,
+        "rsi": rsis,
+        "mean_20": means_20,
+        "std_20": stds_20,
+        "std_60": stds_60,
+    }
+    rows = [dict(zip(columns, values)) for values in zip(*(c.tolist() for c in columns.values()))]
+    for row, volume_mean in zip(rows, volume_means):
+        row["volume_mean"] = volume_mean
+    return rows
+
+
+def stacked_series_stats(series_list):
+    """``series_stats`` of many prepared series, equally long ones computed together.
+
+    Series of the same length (usually all of them: the server loads the
+    same lookback for every instrument) are stacked into one 2-D array, so
+    the whole-window sums, the slope and the RSI recursion run across
+    instruments instead of once per instrument. Row sums follow the
+    built-in ``sum`` (see ``indicators.row_totals``), so the values are
+    identical to ``series_stats``.
+
+    An entry is None where there is nothing to stack (no series, fewer
+    than 10 bars, the only series of its length) or its group cannot be
+    stacked, e.g. a close is not a number; ``compute_features`` then works
+    it out on its own and fails the way a single call would.
+    """
+    out = [None] * len(series_list)
+    groups = {}
+    for i, series in enumerate(series_list):
+        if series is not None and series["count"] >= 10:
+            groups.setdefault(series["count"], []).append(i)
+    for indexes in groups.values():
+        if len(indexes) < 2:
+            continue
+        try:
+            rows = _stack([series_list[i] for i in indexes])
+        except (TypeError, ValueError):
+            continue
+        for i, row in zip(indexes, rows):
+            out[i] = row
+    return out
+
+
+def compute_features(series, stats=None):
+    """Price/volume features of a prepared series (see ``prepare_series``).
+
+    ``stats`` are its ``series_stats`` when the caller already has them.
+    """
     closes = series["closes"]
     highs = series["highs"] or closes
     lows = series["lows"] or closes
@@ -164,37 +242,37 @@ def run(payload):
     if n < 10:
         return {"error": "not enough bars", "got": n, "needed": 10}
 
+    if stats is None:
+        stats = series_stats(series)
+
     close = closes[-1]
     prev = closes[-2]
     ret1 = safe_div(close - prev, prev)
     ret5 = safe_div(close - closes[-6], closes[-6]) if n >= 6 else ret1
+    ret10 = safe_div(close - closes[-10], closes[-10]) if n >= 10 else ret5
 
-    slope = linear_slope(closes)
-    slope_pct = safe_div(slope, mean(closes))
-    price_std = stddev(closes)
+    closes_mean = stats["mean"]
+    slope = stats["slope"]
+    slope_pct = safe_div(slope, closes_mean)
+    price_std = stats["std"]
     trend_strength = safe_div(abs(slope), price_std + 1e-9)
 
-    rsi_val = rsi(closes, period=min(14, n - 1))
-    rsi_val = rsi_val if rsi_val is not None else 50.0
-    rsi_over = clamp((rsi_val - 70.0) / 30.0)
-    rsi_under = clamp((30.0 - rsi_val) / 30.0)
-    rsi_extreme = max(rsi_over, rsi_under)
+    rsi_val = stats["rsi"]
 
     z_val = 0.0
     if price_std > 0:
-        z_val = (close - mean(closes)) / price_std
-    z_extreme = clamp(abs(z_val) / 2.5)
+        z_val = (close - closes_mean) / price_std
 
-    boll_mid = mean(closes[-20:]) if n >= 20 else mean(closes)
-    boll_std = stddev(closes[-20:]) if n >= 20 else price_std
+    boll_mid = stats["mean_20"]
+    boll_std = stats["std_20"]
     boll_pos = safe_div(close - boll_mid, (boll_std * 2) if boll_std else 1.0)
 
     atr_val = atr(highs, lows, closes, period=min(14, n - 1))
     atr_val = atr_val if atr_val is not None else 0.0
     atr_pct = safe_div(atr_val, close)
 
-    short_vol = stddev(closes[-20:]) if n >= 20 else price_std
-    long_vol = stddev(closes[-60:]) if n >= 60 else price_std
+    short_vol = stats["std_20"]
+    long_vol = stats["std_60"]
     vol_ratio = safe_div(short_vol, long_vol + 1e-9)
 
     donchian_period = 20 if n >= 20 else max(5, n // 2)
@@ -205,24 +283,63 @@ def run(payload):
 
     vol_spike = None
     if volumes:
-        avg_vol = mean(volumes[-20:]) if n >= 20 else mean(volumes)
-        vol_spike = safe_div(volumes[-1], avg_vol + 1e-9)
+        vol_spike = safe_div(volumes[-1], stats["volume_mean"] + 1e-9)
 
-    orderbook = compute_orderbook(payload.get("orderbook"))
-    imbalance = orderbook["imbalance"]
+    return {
+        "count": n,
+        "close": close,
+        "return_1": ret1,
+        "return_5": ret5,
+        "return_10": ret10,
+        "slope": slope,
+        "slope_pct": slope_pct,
+        "trend_strength": trend_strength,
+        "rsi": rsi_val,
+        "zscore": z_val,
+        "boll_pos": boll_pos,
+        "atr": atr_val,
+        "atr_pct": atr_pct,
+        "vol_ratio": vol_ratio,
+        "donchian_high": d_high,
+        "donchian_low": d_low,
+        "breakout_up": breakout_up,
+        "breakout_down": breakout_down,
+        "volume_spike": vol_spike,
+    }
+
+
+def score(features, orderbook=None):
+    """Regime probabilities and direction from features plus the order book.
+
+    ``features`` may come from ``compute_features`` or from the incremental
+    state kept by the worker (``incremental.FeatureState``).
+    """
+    rsi_val = features["rsi"]
+    rsi_over = clamp((rsi_val - 70.0) / 30.0)
+    rsi_under = clamp((30.0 - rsi_val) / 30.0)
+    rsi_extreme = max(rsi_over, rsi_under)
+    z_extreme = clamp(abs(features["zscore"]) / 2.5)
+    boll_pos = features["boll_pos"]
+    trend_strength = features["trend_strength"]
+    vol_ratio = features["vol_ratio"]
+    slope_pct = features["slope_pct"]
+    ret5 = features["return_5"]
+    long_ret = features.get("return_10", ret5)
+
+    book = compute_orderbook(orderbook)
+    imbalance = book["imbalance"]
 
     trend_score = clamp(trend_strength / 2.0)
     mean_rev_score = clamp((z_extreme + rsi_extreme + clamp(abs(boll_pos))) / 3.0)
 
     breakout_score = 0.0
-    if breakout_up or breakout_down:
+    if features["breakout_up"] or features["breakout_down"]:
         breakout_score += 0.7
     if vol_ratio > 1.2:
         breakout_score += clamp((vol_ratio - 1.2) / 1.5, 0.0, 0.3)
     breakout_score = clamp(breakout_score)
 
     divergence = 0.0
-    long_ret = safe_div(close - closes[-10], closes[-10]) if n >= 10 else ret5
     if (ret5 > 0 and long_ret < 0) or (ret5 < 0 and long_ret > 0):
         divergence = 0.4
     reversal_score = clamp((rsi_extreme * (1 - trend_score)) + divergence)
@@ -263,39 +380,74 @@ def run(payload):
             "sideways": dir_side / dir_total,
         }
 
-    features = {
-        "count": n,
-        "close": close,
-        "return_1": ret1,
-        "return_5": ret5,
-        "slope": slope,
-        "slope_pct": slope_pct,
-        "trend_strength": trend_strength,
-        "rsi": rsi_val,
-        "zscore": z_val,
-        "boll_pos": boll_pos,
-        "atr": atr_val,
-        "atr_pct": atr_pct,
-        "vol_ratio": vol_ratio,
-        "donchian_high": d_high,
-        "donchian_low": d_low,
-        "breakout_up": breakout_up,
-        "breakout_down": breakout_down,
-        "volume_spike": vol_spike,
-        "orderbook_imbalance": imbalance,
-        "spread": orderbook["spread"],
-        "best_bid": orderbook["best_bid"],
-        "best_ask": orderbook["best_ask"],
-    }
-
     return {
         "model": "heuristic-v1",
         "probs": probs,
         "direction": direction,
-        "features": features,
+        "features": {
+            **features,
+            "orderbook_imbalance": imbalance,
+            "spread": book["spread"],
+            "best_bid": book["best_bid"],
+            "best_ask": book["best_ask"],
+        },
     }
 
 
+def run_one(payload):
+    if payload.get("features"):
+        return score(payload["features"], payload.get("orderbook"))
+
+    series = prepare_series(payload.get("series") or {})
+    if not series:
+        return {"error": "series is empty"}
+
+    features = compute_features(series)
+    if "error" in features:
+        return features
+    return score(features, payload.get("orderbook"))
+
+
+def run_batch(items):
+    """Score many instruments in one call; ``key`` is echoed back per item.
+
+    The whole-window statistics of all series are computed together (see
+    ``stacked_series_stats``); the rest runs per item, every item guarded
+    by its own ``except``.
+    """
+    prepared = []
+    for item in items:
+        series = None
+        if not item.get("features"):
+            try:
+                series = prepare_series(item.get("series") or {})
+            except Exception:
+                pass
+        prepared.append(series)
+
+    results = []
+    for item, series, stats in zip(items, prepared, stacked_series_stats(prepared)):
+        try:
+            if series is None:
+                # precomputed features, or a series that is empty or broken:
+                # exactly what a single call returns or raises
+                result = run_one(item)
+            else:
+                result = compute_features(series, stats)
+                if "error" not in result:
+                    result = score(result, item.get("orderbook"))
+        except Exception as exc:
+            result = {"error": str(exc)}
+        results.append({"key": item.get("key"), **result})
+    return {"results": results}
+
+
+def run(payload):
+    if "batch" in payload:
+        return run_batch(payload.get("batch") or [])
+    return run_one(payload)
+
+
 if __name__ == "__main__":
     raw = sys.stdin.read().strip()
     payload = json.loads(raw) if raw else {}
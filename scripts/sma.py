@@ -1,4 +1,5 @@
-import math
+import indicators
+
 
 def run(payload):
     values = payload.get("values", [])
@@ -8,12 +9,13 @@ def run(payload):
     if len(values) < period:
         return {"error": "not enough values", "needed": period, "got": len(values)}
 
-    series = []
-    window_sum = sum(values[:period])
-    series.append(window_sum / period)
-    for i in range(period, len(values)):
-        window_sum += values[i] - values[i - period]
-        series.append(window_sum / period)
+    if payload.get("drift_free"):
+        # opt-in: no running sum, so no error carried along long series
+        series = indicators.window_means(indicators.as_array(values), period).tolist()
+    else:
+        series = indicators.sma_series(
+            indicators.as_array(values), period, indicators.total(values[:period])
+        ).tolist()
 
     return {
         "period": period,
@@ -0,0 +1,360 @@
+import type { PoolClient } from "pg";
+import { config } from "./config.js";
+import { marketPool, withTransaction } from "./db.js";
+import { bcs } from "./bcs.js";
+import { logger } from "./logger.js";
+
+// Bar length, used to size chunks; D/W/MN only need to be roughly right
+export const TIMEFRAME_SECONDS: Record<string, number> = {
+  M1: 60,
+  M5: 300,
+  M15: 900,
+  M30: 1800,
+  H1: 3600,
+  H4: 14400,
+  D: 86400,
+  W: 7 * 86400,
+  MN: 31 * 86400,
+};
+
+const RETRY_BASE_MS = 1000;
+
+export type BackfillRequest = {
+  classCode: string;
+  tickers: string[];
+  timeFrame: string;
+  startDate: string;
+  endDate: string;
+  // fetch chunks the coverage log already has
+  force?: boolean;
+};
+
+type Job = {
+  id: number;
+  class_code: string;
+  tickers: string[];
+  time_frame: string;
+};
+
+type Chunk = {
+  ticker: string;
+  start_ts: Date;
+  end_ts: Date;
+};
+
+/**
+ * Caps broker requests of all backfill jobs together: at most `concurrency`
+ * in flight and starts spaced `1000 / rps` ms apart.
+ */
+class RequestLimiter {
+  private running = 0;
+  private waiters: (() => void)[] = [];
+  private nextAt = 0;
+
+  constructor(private concurrency: number, private rps: number) {}
+
+  async run<T>(fn: () => Promise<T>): Promise<T> {
+    if (this.running >= this.concurrency) {
+      await new Promise<void>((resolve) => this.waiters.push(resolve));
+    } else {
+      this.running += 1;
+    }
+    try {
+      if (this.rps > 0) {
+        const now = Date.now();
+        const startAt = Math.max(now, this.nextAt);
+        this.nextAt = startAt + 1000 / this.rps;
+        if (startAt > now) await sleep(startAt - now);
+      }
+      return await fn();
+    } finally {
+      // the slot goes straight to the next waiter
+      const next = this.waiters.shift();
+      if (next) next();
+      else this.running -= 1;
+    }
+  }
+}
+
+const limiter = new RequestLimiter(
+  Math.max(1, config.backfill.concurrency),
+  config.backfill.rps
+);
+const active = new Map<number, Promise<any>>();
+
+function sleep(ms: number) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+/**
+ * Splits `[start, end)` of every ticker into chunks of `chunkBars` bars. The
+ * grid is anchored at the epoch, so chunks of different jobs line up and the
+ * coverage log can match them.
+ */
+export function planChunks(
+  tickers: string[],
+  timeFrame: string,
+  start: Date,
+  end: Date
+): Chunk[] {
+  const span = TIMEFRAME_SECONDS[timeFrame] * Math.max(1, config.backfill.chunkBars) * 1000;
+  const chunks: Chunk[] = [];
+  for (const ticker of tickers) {
+    for (let lo = Math.floor(start.getTime() / span) * span; lo < end.getTime(); lo += span) {
+      chunks.push({
+        ticker,
+        start_ts: new Date(Math.max(lo, start.getTime())),
+        end_ts: new Date(Math.min(lo + span, end.getTime())),
+      });
+    }
+  }
+  return chunks;
+}
+
+/**
+ * Creates a job, or returns the running one with the same parameters, so a
+ * repeated call attaches to it instead of fetching everything twice. Chunks
+ * inside ranges fetched earlier are marked `skipped` unless `force`.
+ */
+export async function createBackfillJob(req: BackfillRequest): Promise<number> {
+  const tickers = [...new Set(req.tickers)].sort();
+  const start = new Date(req.startDate);
+  const end = new Date(req.endDate);
+  if (Number.isNaN(start.getTime()) || Number.isNaN(end.getTime())) {
+    throw new Error("startDate and endDate must be valid dates");
+  }
+  if (end <= start) {
+    throw new Error("endDate must be after startDate");
+  }
+  return withTransaction(marketPool, async (client) => {
+    // two identical calls at once must not both miss the running job
+    await client.query(`SELECT pg_advisory_xact_lock(hashtext('backfill_jobs'))`);
+    const existing = await client.query(
+      `SELECT id FROM backfill_jobs
+       WHERE status = 'running' AND class_code = $1 AND tickers = $2::text[]
+         AND time_frame = $3 AND start_ts = $4 AND end_ts = $5
+       LIMIT 1`,
+      [req.classCode, tickers, req.timeFrame, start, end]
+    );
+    if (existing.rows.length) return Number(existing.rows[0].id);
+
+    const created = await client.query(
+      `INSERT INTO backfill_jobs (class_code, tickers, time_frame, start_ts, end_ts)
+       VALUES ($1, $2::text[], $3, $4, $5) RETURNING id`,
+      [req.classCode, tickers, req.timeFrame, start, end]
+    );
+    const jobId = Number(created.rows[0].id);
+    const chunks = planChunks(tickers, req.timeFrame, start, end);
+    await client.query(
+      `INSERT INTO backfill_chunks (job_id, ticker, class_code, time_frame, start_ts, end_ts)
+       SELECT $1, u.ticker, $2, $3, u.start_ts, u.end_ts
+       FROM unnest($4::text[], $5::timestamptz[], $6::timestamptz[]) AS u(ticker, start_ts, end_ts)`,
+      [
+        jobId,
+        req.classCode,
+        req.timeFrame,
+        chunks.map((c) => c.ticker),
+        chunks.map((c) => c.start_ts),
+        chunks.map((c) => c.end_ts),
+      ]
+    );
+    if (!req.force) {
+      await client.query(
+        `UPDATE backfill_chunks c SET status = 'skipped', updated_at = now()
+         WHERE c.job_id = $1 AND EXISTS (
+           SELECT 1 FROM backfill_chunks d
+           WHERE d.status = 'done' AND d.complete
+             AND d.ticker = c.ticker AND d.class_code = c.class_code AND d.time_frame = c.time_frame
+             AND d.start_ts <= c.start_ts AND d.end_ts >= c.end_ts
+         )`,
+        [jobId]
+      );
+    }
+    return jobId;
+  });
+}
+
+/** Runs the unfinished chunks of a job; joins the run already in progress. */
+export function runBackfillJob(jobId: number): Promise<any> {
+  let running = active.get(jobId);
+  if (!running) {
+    running = executeJob(jobId).finally(() => active.delete(jobId));
+    active.set(jobId, running);
+  }
+  return running;
+}
+
+async function executeJob(jobId: number) {
+  const found = await marketPool.query(
+    `SELECT id, class_code, tickers, time_frame FROM backfill_jobs WHERE id = $1`,
+    [jobId]
+  );
+  if (!found.rows.length) throw new Error(`backfill job ${jobId} not found`);
+  const job: Job = { ...found.rows[0], id: Number(found.rows[0].id) };
+  // failed chunks of an earlier run get a new set of attempts
+  const { rows: chunks } = await marketPool.query(
+    `SELECT ticker, start_ts, end_ts FROM backfill_chunks
+     WHERE job_id = $1 AND status IN ('pending', 'failed')
+     ORDER BY start_ts, ticker`,
+    [jobId]
+  );
+  const started = Date.now();
+  logger.info("backfill.job.start", {
+    job: jobId,
+    classCode: job.class_code,
+    tickers: job.tickers.length,
+    timeFrame: job.time_frame,
+    chunks: chunks.length,
+  });
+  await marketPool.query(
+    `UPDATE backfill_jobs SET status = 'running', last_error = NULL, updated_at = now() WHERE id = $1`,
+    [jobId]
+  );
+
+  let next = 0;
+  const worker = async () => {
+    while (next < chunks.length) {
+      await fetchChunk(job, chunks[next++]);
+    }
+  };
+  const workers = Math.min(Math.max(1, config.backfill.concurrency), chunks.length);
+  await Promise.all(Array.from({ length: workers }, worker));
+
+  const failed = await marketPool.query(
+    `SELECT count(*)::int AS n, max(last_error) AS error
+     FROM backfill_chunks WHERE job_id = $1 AND status = 'failed'`,
+    [jobId]
+  );
+  const { n, error } = failed.rows[0];
+  await marketPool.query(
+    `UPDATE backfill_jobs SET status = $2, last_error = $3, updated_at = now() WHERE id = $1`,
+    [jobId, n ? "failed" : "done", n ? `${n} chunks failed: ${error}` : null]
+  );
+  const summary = await getBackfillJob(jobId);
+  logger.info("backfill.job.finish", { ...summary, ms: Date.now() - started });
+  return summary;
+}
+
+async function fetchChunk(job: Job, chunk: Chunk) {
+  const query = new URLSearchParams({
+    classCode: job.class_code,
+    ticker: chunk.ticker,
+    startDate: chunk.start_ts.toISOString(),
+    endDate: chunk.end_ts.toISOString(),
+    timeFrame: job.time_frame,
+  });
+  const maxAttempts = Math.max(1, config.backfill.maxAttempts);
+  for (let attempt = 1; ; attempt++) {
+    try {
+      const data = await limiter.run(() => bcs.getCandles(query));
+      const bars = (data as any)?.bars || [];
+      await withTransaction(marketPool, (client) => storeChunk(client, job, chunk, bars));
+      return;
+    } catch (err: any) {
+      const error = err?.message || String(err);
+      const final = attempt >= maxAttempts;
+      logger.warn("backfill.chunk.error", {
+        job: job.id,
+        ticker: chunk.ticker,
+        start: chunk.start_ts,
+        attempt,
+        error,
+      });
+      await marketPool.query(
+        `UPDATE backfill_chunks
+         SET attempts = attempts + 1, last_error = $4,
+             status = CASE WHEN $5 THEN 'failed' ELSE status END, updated_at = now()
+         WHERE job_id = $1 AND ticker = $2 AND start_ts = $3`,
+        [job.id, chunk.ticker, chunk.start_ts, error, final]
+      );
+      if (final) return;
+      await sleep(RETRY_BASE_MS * 2 ** (attempt - 1));
+    }
+  }
+}
+
+/**
+ * Loads the bars of a chunk into a session temp table and upserts them into
+ * `candles` with one statement; the chunk is checkpointed in the same
+ * transaction, so a resumed job never loses or repeats a chunk.
+ */
+async function storeChunk(client: PoolClient, job: Job, chunk: Chunk, bars: any[]) {
+  await client.query(
+    `CREATE TEMP TABLE IF NOT EXISTS candles_stage (LIKE candles) ON COMMIT DELETE ROWS`
+  );
+  await client.query(
+    `INSERT INTO candles_stage (ticker, class_code, time_frame, ts, open, high, low, close, volume, data)
+     SELECT $1, $2, $3, (b->>'time')::timestamptz, (b->>'open')::numeric, (b->>'high')::numeric,
+            (b->>'low')::numeric, (b->>'close')::numeric, (b->>'volume')::numeric, b
+     FROM jsonb_array_elements($4::jsonb) AS b
+     WHERE b->>'time' IS NOT NULL`,
+    [chunk.ticker, job.class_code, job.time_frame, JSON.stringify(bars)]
+  );
+  // the broker may repeat a bar; unchanged bars are not rewritten
+  const stored = await client.query(
+    `INSERT INTO candles AS c (ticker, class_code, time_frame, ts, open, high, low, close, volume, data)
+     SELECT DISTINCT ON (ts) ticker, class_code, time_frame, ts, open, high, low, close, volume, data
+     FROM candles_stage ORDER BY ts
+     ON CONFLICT (ticker, class_code, time_frame, ts)
+     DO UPDATE SET open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+                   close = EXCLUDED.close, volume = EXCLUDED.volume, data = EXCLUDED.data
+     WHERE (c.open, c.high, c.low, c.close, c.volume, c.data)
+           IS DISTINCT FROM (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume, EXCLUDED.data)`
+  );
+  // a chunk reaching into the current bar is fetched again next time
+  await client.query(
+    `UPDATE backfill_chunks
+     SET status = 'done', bars = $4, last_error = NULL, updated_at = now(),
+         complete = end_ts + make_interval(secs => $5) <= now()
+     WHERE job_id = $1 AND ticker = $2 AND start_ts = $3`,
+    [job.id, chunk.ticker, chunk.start_ts, bars.length, TIMEFRAME_SECONDS[job.time_frame]]
+  );
+  logger.debug("backfill.chunk.ok", {
+    job: job.id,
+    ticker: chunk.ticker,
+    start: chunk.start_ts,
+    bars: bars.length,
+    written: stored.rowCount,
+  });
+}
+
+export async function getBackfillJob(jobId: number) {
+  const { rows } = await marketPool.query(
+    `SELECT j.id, j.class_code, j.tickers, j.time_frame, j.start_ts, j.end_ts, j.status,
+            j.last_error, j.created_at, j.updated_at,
+            count(c.job_id)::int AS chunks,
+            (count(*) FILTER (WHERE c.status = 'done'))::int AS done,
+            (count(*) FILTER (WHERE c.status = 'skipped'))::int AS skipped,
+            (count(*) FILTER (WHERE c.status = 'failed'))::int AS failed,
+            (count(*) FILTER (WHERE c.status = 'pending'))::int AS pending,
+            COALESCE(sum(c.bars), 0)::bigint AS bars
+     FROM backfill_jobs j LEFT JOIN backfill_chunks c ON c.job_id = j.id
+     WHERE j.id = $1
+     GROUP BY j.id`,
+    [jobId]
+  );
+  if (!rows.length) throw new Error(`backfill job ${jobId} not found`);
+  return { ...rows[0], id: Number(rows[0].id), bars: Number(rows[0].bars) };
+}
+
+export async function listBackfillJobs(limit: number) {
+  const { rows } = await marketPool.query(
+    `SELECT id FROM backfill_jobs ORDER BY id DESC LIMIT $1`,
+    [limit]
+  );
+  return Promise.all(rows.map((row: any) => getBackfillJob(Number(row.id))));
+}
+
+/** Picks up the jobs a previous server process left running. */
+export async function resumeBackfillJobs() {
+  const { rows } = await marketPool.query(
+    `SELECT id FROM backfill_jobs WHERE status = 'running' ORDER BY id`
+  );
+  for (const row of rows) {
+    const jobId = Number(row.id);
+    logger.info("backfill.job.resume", { job: jobId });
+    runBackfillJob(jobId).catch((err) =>
+      logger.error("backfill.job.error", { job: jobId, error: err?.message || String(err) })
+    );
+  }
+}
@@ -44,6 +44,26 @@ export const config = {
     mcpProvider: process.env.LLM_MCP_PROVIDER || "auto",
     fallbackOllama: bool(process.env.LLM_BACKEND_FALLBACK_OLLAMA, true),
     timeoutSec: int(process.env.LLM_BACKEND_TIMEOUT_SEC, 30),
+    jobWaitSec: int(process.env.LLM_MCP_JOB_WAIT_SEC, 20),
+  },
+
+  embeddingSearch: {
+    efSearch: int(process.env.EMBEDDING_SEARCH_EF_SEARCH, 40),
+    probes: int(process.env.EMBEDDING_SEARCH_PROBES, 10),
+  },
+
+  scripts: {
+    persistent: bool(process.env.SCRIPT_SERVER, true),
+    workers: int(process.env.SCRIPT_WORKERS, 2),
+    timeoutMs: int(process.env.SCRIPT_TIMEOUT_MS, 10000),
+    maxRequests: int(process.env.SCRIPT_WORKER_MAX_REQUESTS, 500),
+  },
+
+  backfill: {
+    concurrency: int(process.env.BCS_BACKFILL_CONCURRENCY, 4),
+    rps: int(process.env.BCS_BACKFILL_RPS, 5),
+    chunkBars: int(process.env.BCS_BACKFILL_CHUNK_BARS, 1000),
+    maxAttempts: int(process.env.BCS_BACKFILL_MAX_ATTEMPTS, 3),
   },
 
   logLevel: process.env.LOG_LEVEL || "info",
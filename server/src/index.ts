@@ -12,7 +12,7 @@ import {
 } from "@modelcontextprotocol/sdk/types.js";
 
 import { config, flags } from "./config.js";
-import { marketPool, privatePool } from "./db.js";
+import { marketPool, privatePool, withTransaction } from "./db.js";
 import {
   runQuery,
   runLatest,
@@ -20,7 +20,14 @@ import {
   MARKET_TABLES,
   PRIVATE_TABLES,
 } from "./query.js";
-import { loadManifest, runScript } from "./scripts.js";
+import { loadManifest, runScript, startScriptPool } from "./scripts.js";
+import {
+  createBackfillJob,
+  runBackfillJob,
+  getBackfillJob,
+  listBackfillJobs,
+  resumeBackfillJobs,
+} from "./backfill.js";
 import { bcs } from "./bcs.js";
 import { embedText, enrichSignalDirection } from "./llm_backend.js";
 import { logger } from "./logger.js";
@@ -51,6 +58,9 @@ app.use((req: Request, res: Response, next: NextFunction) => {
 
 const manifest = loadManifest();
 
+// embedding_queue: больше — раньше; массовая загрузка из worker идёт с приоритетом 0
+const EMBED_PRIORITY_INTERACTIVE = 10;
+
 interface ToolDef {
   name: string;
   description: string;
@@ -163,6 +173,28 @@ async function storeInstrumentDiscounts(items: any[]) {
   }
 }
 
+// Book levels are stored as parallel float8[] price/quantity arrays; older
+// order_book_snapshots rows still carry bids/asks JSONB instead.
+function bookLevels(prices: number[] | null | undefined, quantities: number[] | null | undefined) {
+  if (!prices) return null;
+  return prices.map((price, i) => ({ price, quantity: quantities?.[i] ?? null }));
+}
+
+function bookSides(row: any) {
+  return {
+    bids: row?.bid_prices ? bookLevels(row.bid_prices, row.bid_qty) : row?.bids ?? null,
+    asks: row?.ask_prices ? bookLevels(row.ask_prices, row.ask_qty) : row?.asks ?? null,
+  };
+}
+
+async function latestHistoryRow(table: string, ticker: string, classCode: string) {
+  const result = await marketPool.query(
+    `SELECT * FROM ${table} WHERE ticker = $1 AND class_code = $2 ORDER BY ts DESC LIMIT 1`,
+    [ticker, classCode]
+  );
+  return result.rows[0] || null;
+}
+
 const authMiddleware = (req: any, res: any, next: any) => {
   if (!config.mcpHttpToken) return next();
   const token = req.headers.authorization?.replace("Bearer ", "");
@@ -292,7 +324,8 @@ addTool({
 addTool({
   name: "market.aggregate",
   description:
-    "Агрегировать временной ряд из bcs_market. Возвращает min/max/avg/sum/count по бакетам.",
+    "Агрегировать временной ряд из bcs_market. Возвращает min/max/avg/sum/count по бакетам. " +
+    "last_trades.price и quotes.last с фильтрами по ticker/class_code читаются из OHLCV-свёрток (ohlcv_rollups).",
   parameters: z.object({
     table: z.enum(Object.keys(MARKET_TABLES) as [string, ...string[]]),
     valueField: z.string().min(1),
@@ -369,6 +402,87 @@ addTool({
   },
 });
 
+addTool({
+  name: "market.indicators",
+  description:
+    "Несколько индикаторов по свечам за один проход (sma, ema, rsi, atr, bollinger, donchian, zscore).",
+  parameters: z.object({
+    ticker: z.string().min(1),
+    classCode: z.string().min(1),
+    timeFrame: z
+      .enum(["M1", "M5", "M15", "M30", "H1", "H4", "D", "W", "MN"])
+      .optional()
+      .default("M1"),
+    lookback: z.number().int().min(2).max(200000).optional().default(500),
+    indicators: z
+      .array(
+        z.object({
+          type: z.enum([
+            "sma",
+            "ema",
+            "rsi",
+            "atr",
+            "bollinger",
+            "bollinger_bands",
+            "donchian",
+            "zscore",
+          ]),
+          period: z.number().int().min(1).optional(),
+          stdMult: z.number().positive().optional(),
+          name: z.string().optional(),
+        })
+      )
+      .min(1)
+      .max(50),
+    tail: z.number().int().min(0).max(500).optional().default(0),
+  }),
+  execute: async (params) => {
+    const rows = await marketPool.query(
+      `SELECT ts, high, low, close
+       FROM candles
+       WHERE ticker = $1 AND class_code = $2 AND time_frame = $3
+         AND close IS NOT NULL AND high IS NOT NULL AND low IS NOT NULL
+       ORDER BY ts DESC
+       LIMIT $4`,
+      [params.ticker, params.classCode, params.timeFrame, params.lookback]
+    );
+    if (!rows.rows.length) {
+      return { ok: false, error: "no candles available" };
+    }
+    const ordered = rows.rows.slice().reverse();
+    const series = {
+      high: ordered.map((r: any) => Number(r.high)),
+      low: ordered.map((r: any) => Number(r.low)),
+      close: ordered.map((r: any) => Number(r.close)),
+    };
+    const wrapped = await runScript("indicators_bundle", {
+      series,
+      tail: params.tail,
+      indicators: params.indicators.map((spec: any) => ({
+        type: spec.type,
+        period: spec.period,
+        std_mult: spec.stdMult,
+        name: spec.name,
+      })),
+    });
+    if (wrapped?.ok === false) {
+      return { ok: false, error: wrapped.error || "indicators_bundle failed" };
+    }
+    const result = wrapped?.result || wrapped || {};
+    if (result?.error) {
+      return { ok: false, error: result.error, details: result };
+    }
+    return {
+      ok: true,
+      ticker: params.ticker,
+      classCode: params.classCode,
+      timeFrame: params.timeFrame,
+      lastTs: ordered[ordered.length - 1]?.ts ?? null,
+      ...result,
+    };
+  },
+});
+
 addTool({
   name: "market.snapshot",
   description:
@@ -380,22 +494,38 @@ addTool({
     includeBook: z.boolean().optional().default(false),
   }),
   execute: async (params) => {
-    const quote = await marketPool.query(
-      `SELECT * FROM quotes WHERE ticker = $1 AND class_code = $2 ORDER BY ts DESC LIMIT 1`,
-      [params.ticker, params.classCode]
-    );
-    const trade = await marketPool.query(
-      `SELECT * FROM last_trades WHERE ticker = $1 AND class_code = $2 ORDER BY ts DESC LIMIT 1`,
-      [params.ticker, params.classCode]
-    );
-    const book = await marketPool.query(
-      `SELECT * FROM order_book_snapshots WHERE ticker = $1 AND class_code = $2 ORDER BY ts DESC LIMIT 1`,
+    // market_latest is kept current by the worker; history tables are only
+    // scanned for sections it does not have yet.
+    const latest = await marketPool.query(
+      `SELECT * FROM market_latest WHERE ticker = $1 AND class_code = $2`,
       [params.ticker, params.classCode]
     );
+    const latestRow = latest.rows[0] || null;
 
-    const quoteRow = quote.rows[0] || null;
-    const tradeRow = trade.rows[0] || null;
-    const bookRow = book.rows[0] || null;
+    const quoteRow = latestRow?.quote_ts
+      ? { ...latestRow, ts: latestRow.quote_ts }
+      : await latestHistoryRow("quotes", params.ticker, params.classCode);
+    const tradeRow = latestRow?.trade_ts
+      ? {
+          ts: latestRow.trade_ts,
+          side: latestRow.trade_side,
+          price: latestRow.trade_price,
+          quantity: latestRow.trade_quantity,
+          volume: latestRow.trade_volume,
+        }
+      : await latestHistoryRow("last_trades", params.ticker, params.classCode);
+    const historyBook = latestRow?.book_ts
+      ? null
+      : await latestHistoryRow("order_book_snapshots", params.ticker, params.classCode);
+    const bookRow = latestRow?.book_ts
+      ? {
+          ts: latestRow.book_ts,
+          depth: latestRow.book_depth,
+          bid_volume: latestRow.bid_volume,
+          ask_volume: latestRow.ask_volume,
+          ...bookSides(latestRow),
+        }
+      : historyBook && { ...historyBook, ...bookSides(historyBook) };
 
     const now = Date.now();
     const age = (ts?: string) =>
@@ -601,9 +731,9 @@ addTool({
     if (params.embed && id) {
       const text = `PROMPT:\n${params.prompt}\n\nRESPONSE:\n${params.response}`;
       await privatePool.query(
-        `INSERT INTO embedding_queue (entity_type, entity_id, text, metadata)
-         VALUES ($1,$2,$3,$4)`,
-        ["decision", id, text, params.metadata || null]
+        `INSERT INTO embedding_queue (entity_type, entity_id, text, metadata, priority)
+         VALUES ($1,$2,$3,$4,$5)`,
+        ["decision", id, text, params.metadata || null, EMBED_PRIORITY_INTERACTIVE]
       );
     }
     return { ok: true, id };
@@ -676,18 +806,21 @@ addTool({
 
 addTool({
   name: "embedding.enqueue",
-  description: "Поставить текст в очередь эмбеддингов",
+  description:
+    "Поставить текст в очередь эмбеддингов. priority: больше — раньше " +
+    "(по умолчанию 10, массовая загрузка идёт с 0)",
   parameters: z.object({
     entityType: z.string().min(1),
     entityId: z.string().min(1),
     text: z.string().min(1),
     metadata: z.record(z.any()).optional(),
+    priority: z.number().int().min(-100).max(100).optional().default(EMBED_PRIORITY_INTERACTIVE),
   }),
   execute: async (params) => {
     await privatePool.query(
-      `INSERT INTO embedding_queue (entity_type, entity_id, text, metadata)
-       VALUES ($1,$2,$3,$4)`,
-      [params.entityType, params.entityId, params.text, params.metadata || null]
+      `INSERT INTO embedding_queue (entity_type, entity_id, text, metadata, priority)
+       VALUES ($1,$2,$3,$4,$5)`,
+      [params.entityType, params.entityId, params.text, params.metadata || null, params.priority]
     );
     return { ok: true };
   },
@@ -696,22 +829,34 @@ addTool({
 addTool({
   name: "embedding.search",
   description:
-    "Семантический поиск по базе эмбеддингов (pgvector). Ищет похожие решения/ошибки.",
+    "Семантический поиск по базе эмбеддингов (pgvector). Ищет похожие решения/ошибки. " +
+    "ef_search (hnsw) и probes (ivfflat) — баланс полноты и скорости при ANN-индексе.",
   parameters: z.object({
     query: z.string().min(1),
     limit: z.number().int().min(1).max(50).optional().default(10),
+    ef_search: z.number().int().min(1).max(1000).optional(),
+    probes: z.number().int().min(1).max(10000).optional(),
   }),
   execute: async (params) => {
     const embedding = await embedText(params.query);
     const vector = `[${embedding.join(",")}]`;
-    const result = await privatePool.query(
-      `SELECT entity_type, entity_id, metadata, (embedding <=> $1) AS distance
-       FROM embeddings
-       ORDER BY embedding <=> $1
-       LIMIT $2`,
-      [vector, params.limit]
-    );
-    return result.rows;
+    // an hnsw scan returns at most ef_search rows
+    const efSearch = Math.max(params.ef_search ?? config.embeddingSearch.efSearch, params.limit);
+    const probes = params.probes ?? config.embeddingSearch.probes;
+    return withTransaction(privatePool, async (client) => {
+      await client.query(
+        "SELECT set_config('hnsw.ef_search', $1, true), set_config('ivfflat.probes', $2, true)",
+        [String(efSearch), String(probes)]
+      );
+      const result = await client.query(
+        `SELECT entity_type, entity_id, metadata, (embedding <=> $1) AS distance
+         FROM embeddings
+         ORDER BY embedding <=> $1
+         LIMIT $2`,
+        [vector, params.limit]
+      );
+      return result.rows;
+    });
   },
 });
 
@@ -757,6 +902,23 @@ addTool({
   execute: async (params) => runScript(params.name, params.payload || {}),
 });
 
+// ts of the newest closed candle of the indicator_state row `s`: the newest
+// stored candle may still be forming, and the worker only applies a bar once
+// a newer one exists
+const CLOSED_CANDLE_TS_SQL = `(
+  SELECT c.ts FROM candles c
+  WHERE c.ticker = s.ticker AND c.class_code = s.class_code AND c.time_frame = s.time_frame
+  ORDER BY c.ts DESC
+  OFFSET 1 LIMIT 1
+)`;
+
+// The worker's state stands in for a full recompute only when it covers the
+// same window and is not behind the candles (worker down, REST backfill)
+function stateIsCurrent(row: any, lookback: number) {
+  if (row.lookback !== lookback) return false;
+  return !row.closed_ts || new Date(row.bar_ts).getTime() >= new Date(row.closed_ts).getTime();
+}
+
 addTool({
   name: "signals.run",
   description:
@@ -773,29 +935,62 @@ addTool({
     store: z.boolean().optional().default(true),
     enrichLlm: z.boolean().optional().default(true),
     maxAgeSeconds: z.number().int().min(1).optional(),
+    // auto: incremental state from the worker when its lookback matches and
+    // it has seen the latest closed candle, otherwise recompute from candles
+    source: z.enum(["auto", "incremental", "full"]).optional().default("auto"),
   }),
   execute: async (params) => {
-    const rows = await marketPool.query(
-      `SELECT ts, open, high, low, close, volume
-       FROM candles
-       WHERE ticker = $1 AND class_code = $2 AND time_frame = $3
-       ORDER BY ts DESC
-       LIMIT $4`,
-      [params.ticker, params.classCode, params.timeFrame, params.lookback]
-    );
-    if (!rows.rows.length) {
-      return { ok: false, error: "no candles available" };
+    let state: any = null;
+    if (params.source !== "full") {
+      const stateRes = await marketPool.query(
+        `SELECT s.lookback, s.bars, s.bar_ts, s.features, ${CLOSED_CANDLE_TS_SQL} AS closed_ts
+         FROM indicator_state s
+         WHERE s.ticker = $1 AND s.class_code = $2 AND s.time_frame = $3`,
+        [params.ticker, params.classCode, params.timeFrame]
+      );
+      const row = stateRes.rows[0] || null;
+      const usable =
+        row?.features &&
+        (params.source === "incremental" || stateIsCurrent(row, params.lookback));
+      if (usable) {
+        state = row;
+      } else if (params.source === "incremental") {
+        return { ok: false, error: "no incremental state for this series" };
+      }
+    }
+
+    let scriptInput: Record<string, unknown>;
+    let lookback: number;
+    let lastTs: any;
+    if (state) {
+      scriptInput = { features: state.features };
+      lookback = state.features.count;
+      lastTs = state.bar_ts;
+    } else {
+      const rows = await marketPool.query(
+        `SELECT ts, open, high, low, close, volume
+         FROM candles
+         WHERE ticker = $1 AND class_code = $2 AND time_frame = $3
+         ORDER BY ts DESC
+         LIMIT $4`,
+        [params.ticker, params.classCode, params.timeFrame, params.lookback]
+      );
+      if (!rows.rows.length) {
+        return { ok: false, error: "no candles available" };
+      }
+      const ordered = rows.rows.slice().reverse();
+      const series = {
+        open: ordered.map((r: any) => r.open).filter((v: any) => v !== null),
+        high: ordered.map((r: any) => r.high).filter((v: any) => v !== null),
+        low: ordered.map((r: any) => r.low).filter((v: any) => v !== null),
+        close: ordered.map((r: any) => r.close).filter((v: any) => v !== null),
+        volume: ordered.map((r: any) => r.volume).filter((v: any) => v !== null),
+      };
+      scriptInput = { series };
+      lookback = series.close.length;
+      lastTs = ordered[ordered.length - 1]?.ts;
     }
-    const ordered = rows.rows.slice().reverse();
-    const series = {
-      open: ordered.map((r: any) => r.open).filter((v: any) => v !== null),
-      high: ordered.map((r: any) => r.high).filter((v: any) => v !== null),
-      low: ordered.map((r: any) => r.low).filter((v: any) => v !== null),
-      close: ordered.map((r: any) => r.close).filter((v: any) => v !== null),
-      volume: ordered.map((r: any) => r.volume).filter((v: any) => v !== null),
-    };
 
-    const lastTs = ordered[ordered.length - 1]?.ts;
     const ageSeconds = lastTs
       ? Math.floor((Date.now() - new Date(lastTs).getTime()) / 1000)
       : null;
@@ -805,7 +1000,7 @@ addTool({
         : false;
 
     const bookRes = await marketPool.query(
-      `SELECT bids, asks, bid_volume, ask_volume, ts
+      `SELECT bid_prices, bid_qty, ask_prices, ask_qty, bids, asks, bid_volume, ask_volume, ts
        FROM order_book_snapshots
        WHERE ticker = $1 AND class_code = $2
        ORDER BY ts DESC
@@ -815,15 +1010,14 @@ addTool({
     const bookRow = bookRes.rows[0] || null;
     const orderbook = bookRow
       ? {
-          bids: bookRow.bids,
-          asks: bookRow.asks,
+          ...bookSides(bookRow),
           bidVolume: bookRow.bid_volume,
           askVolume: bookRow.ask_volume,
           ts: bookRow.ts,
         }
       : null;
 
-    const wrapped = await runScript("signal_score", { series, orderbook });
+    const wrapped = await runScript("signal_score", { ...scriptInput, orderbook });
     if (wrapped?.ok === false) {
       return { ok: false, error: wrapped.error || "signal_score failed" };
     }
@@ -865,7 +1059,7 @@ addTool({
           params.ticker,
           params.classCode,
           params.timeFrame,
-          series.close.length,
+          lookback,
           result.features || {},
         ]
       );
@@ -890,7 +1084,8 @@ addTool({
       ticker: params.ticker,
       classCode: params.classCode,
       timeFrame: params.timeFrame,
-      lookback: series.close.length,
+      lookback,
+      source: state ? "incremental" : "full",
       model: result.model || "heuristic-v1",
       probs: result.probs || {},
       direction: finalDirection,
@@ -903,6 +1098,261 @@ addTool({
   },
 });
 
+// "($1,$2,...),($n+1,...)" for a multi-row INSERT of `rows` tuples of `width`
+function valuesPlaceholders(rows: number, width: number) {
+  const groups: string[] = [];
+  for (let r = 0; r < rows; r++) {
+    const cols: string[] = [];
+    for (let c = 1; c <= width; c++) cols.push(`$${r * width + c}`);
+    groups.push(`(${cols.join(",")})`);
+  }
+  return groups.join(",");
+}
+
+addTool({
+  name: "signals.run_batch",
+  description:
+    "signals.run по всему watchlist (selected_assets) за один проход: общие запросы, один вызов signal_score, пакетная запись.",
+  parameters: z.object({
+    timeFrame: z
+      .enum(["M1", "M5", "M15", "M30", "H1", "H4", "D", "W", "MN"])
+      .optional()
+      .default("M1"),
+    lookback: z.number().int().min(20).max(5000).optional().default(200),
+    instruments: z
+      .array(z.object({ ticker: z.string().min(1), classCode: z.string().min(1) }))
+      .optional(),
+    includeFeatures: z.boolean().optional().default(false),
+    store: z.boolean().optional().default(true),
+    maxAgeSeconds: z.number().int().min(1).optional(),
+    source: z.enum(["auto", "incremental", "full"]).optional().default("auto"),
+  }),
+  execute: async (params) => {
+    const started = Date.now();
+    const instruments: { ticker: string; classCode: string }[] = params.instruments?.length
+      ? params.instruments
+      : (
+          await privatePool.query(
+            "SELECT ticker, class_code FROM selected_assets WHERE enabled = true ORDER BY ticker"
+          )
+        ).rows.map((r: any) => ({ ticker: r.ticker, classCode: r.class_code }));
+    if (!instruments.length) {
+      return { ok: false, error: "no instruments selected" };
+    }
+    const tickers = instruments.map((i) => i.ticker);
+    const classCodes = instruments.map((i) => i.classCode);
+    const keyOf = (ticker: string, classCode: string) => `${ticker}|${classCode}`;
+
+    const states = new Map<string, any>();
+    if (params.source !== "full") {
+      const stateRes = await marketPool.query(
+        `SELECT s.ticker, s.class_code, s.lookback, s.bar_ts, s.features,
+                ${CLOSED_CANDLE_TS_SQL} AS closed_ts
+         FROM unnest($1::text[], $2::text[]) AS a(ticker, class_code)
+         JOIN indicator_state s
+           ON s.ticker = a.ticker AND s.class_code = a.class_code AND s.time_frame = $3
+         WHERE s.features IS NOT NULL`,
+        [tickers, classCodes, params.timeFrame]
+      );
+      for (const row of stateRes.rows) {
+        if (params.source === "incremental" || stateIsCurrent(row, params.lookback)) {
+          states.set(keyOf(row.ticker, row.class_code), row);
+        }
+      }
+    }
+
+    const series = new Map<string, any>();
+    const missing =
+      params.source === "incremental"
+        ? []
+        : instruments.filter((i) => !states.has(keyOf(i.ticker, i.classCode)));
+    if (missing.length) {
+      const candleRes = await marketPool.query(
+        `SELECT a.ticker, a.class_code, max(c.ts) AS last_ts,
+                array_agg(c.open::float8 ORDER BY c.ts) FILTER (WHERE c.open IS NOT NULL) AS open,
+                array_agg(c.high::float8 ORDER BY c.ts) FILTER (WHERE c.high IS NOT NULL) AS high,
+                array_agg(c.low::float8 ORDER BY c.ts) FILTER (WHERE c.low IS NOT NULL) AS low,
+                array_agg(c.close::float8 ORDER BY c.ts) FILTER (WHERE c.close IS NOT NULL) AS close,
+                array_agg(c.volume::float8 ORDER BY c.ts) FILTER (WHERE c.volume IS NOT NULL) AS volume
+         FROM unnest($1::text[], $2::text[]) AS a(ticker, class_code)
+         CROSS JOIN LATERAL (
+           SELECT ts, open, high, low, close, volume
+           FROM candles
+           WHERE ticker = a.ticker AND class_code = a.class_code AND time_frame = $3
+           ORDER BY ts DESC
+           LIMIT $4
+         ) c
+         GROUP BY a.ticker, a.class_code`,
+        [
+          missing.map((i) => i.ticker),
+          missing.map((i) => i.classCode),
+          params.timeFrame,
+          params.lookback,
+        ]
+      );
+      for (const row of candleRes.rows) {
+        series.set(keyOf(row.ticker, row.class_code), row);
+      }
+    }
+
+    const books = new Map<string, any>();
+    const bookRes = await marketPool.query(
+      `SELECT a.ticker, a.class_code,
+              COALESCE(l.bid_prices, b.bid_prices) AS bid_prices,
+              COALESCE(l.bid_qty, b.bid_qty) AS bid_qty,
+              COALESCE(l.ask_prices, b.ask_prices) AS ask_prices,
+              COALESCE(l.ask_qty, b.ask_qty) AS ask_qty,
+              b.bids, b.asks,
+              COALESCE(l.bid_volume, b.bid_volume) AS bid_volume,
+              COALESCE(l.ask_volume, b.ask_volume) AS ask_volume,
+              COALESCE(l.book_ts, b.ts) AS ts
+       FROM unnest($1::text[], $2::text[]) AS a(ticker, class_code)
+       LEFT JOIN market_latest l
+         ON l.ticker = a.ticker AND l.class_code = a.class_code AND l.book_ts IS NOT NULL
+       LEFT JOIN LATERAL (
+         SELECT bid_prices, bid_qty, ask_prices, ask_qty, bids, asks, bid_volume, ask_volume, ts
+         FROM order_book_snapshots
+         WHERE l.ticker IS NULL AND ticker = a.ticker AND class_code = a.class_code
+         ORDER BY ts DESC
+         LIMIT 1
+       ) b ON true`,
+      [tickers, classCodes]
+    );
+    for (const row of bookRes.rows) {
+      if (!row.ts) continue;
+      books.set(keyOf(row.ticker, row.class_code), {
+        ...bookSides(row),
+        bidVolume: row.bid_volume,
+        askVolume: row.ask_volume,
+        ts: row.ts,
+      });
+    }
+
+    const batch: any[] = [];
+    const meta = new Map<string, { source: string; lookback: number; lastTs: any }>();
+    for (const inst of instruments) {
+      const key = keyOf(inst.ticker, inst.classCode);
+      const state = states.get(key);
+      const rows = series.get(key);
+      if (state) {
+        batch.push({ key, features: state.features, orderbook: books.get(key) || null });
+        meta.set(key, {
+          source: "incremental",
+          lookback: state.features.count,
+          lastTs: state.bar_ts,
+        });
+      } else if (rows?.close?.length) {
+        const { open, high, low, close, volume } = rows;
+        batch.push({
+          key,
+          series: { open, high, low, close, volume },
+          orderbook: books.get(key) || null,
+        });
+        meta.set(key, { source: "full", lookback: close.length, lastTs: rows.last_ts });
+      }
+    }
+
+    const wrapped = batch.length
+      ? await runScript("signal_score", { batch })
+      : { ok: true, result: { results: [] } };
+    if (wrapped?.ok === false) {
+      return { ok: false, error: wrapped.error || "signal_score failed" };
+    }
+    const scored = new Map<string, any>();
+    for (const item of wrapped?.result?.results || []) {
+      scored.set(item.key, item);
+    }
+
+    const now = Date.now();
+    const results = instruments.map((inst) => {
+      const key = keyOf(inst.ticker, inst.classCode);
+      const result = scored.get(key);
+      const info = meta.get(key);
+      if (!result || !info) {
+        return {
+          ticker: inst.ticker,
+          classCode: inst.classCode,
+          ok: false,
+          error:
+            params.source === "incremental"
+              ? "no incremental state for this series"
+              : "no candles available",
+        };
+      }
+      if (result.error) {
+        return { ticker: inst.ticker, classCode: inst.classCode, ok: false, error: result.error };
+      }
+      const ageSeconds = info.lastTs
+        ? Math.floor((now - new Date(info.lastTs).getTime()) / 1000)
+        : null;
+      return {
+        ticker: inst.ticker,
+        classCode: inst.classCode,
+        ok: true,
+        source: info.source,
+        lookback: info.lookback,
+        model: result.model || "heuristic-v1",
+        probs: result.probs || {},
+        direction: result.direction || {},
+        ageSeconds,
+        stale:
+          params.maxAgeSeconds && ageSeconds !== null
+            ? ageSeconds > params.maxAgeSeconds
+            : false,
+        featuresId: null as string | null,
+        features: result.features || {},
+      };
+    });
+
+    const stored = results.filter((r: any) => r.ok) as any[];
+    if (params.store && stored.length) {
+      const featureValues: any[] = [];
+      const probValues: any[] = [];
+      for (const r of stored) {
+        r.featuresId = crypto.randomUUID();
+        featureValues.push(
+          r.featuresId,
+          r.ticker,
+          r.classCode,
+          params.timeFrame,
+          r.lookback,
+          r.features
+        );
+        probValues.push(
+          r.ticker,
+          r.classCode,
+          params.timeFrame,
+          r.model,
+          r.probs,
+          r.direction,
+          r.featuresId
+        );
+      }
+      await privatePool.query(
+        `INSERT INTO signal_features (id, ticker, class_code, time_frame, lookback, features)
+         VALUES ${valuesPlaceholders(stored.length, 6)}`,
+        featureValues
+      );
+      await privatePool.query(
+        `INSERT INTO signal_probs (ticker, class_code, time_frame, model, probs, direction, features_id)
+         VALUES ${valuesPlaceholders(stored.length, 7)}`,
+        probValues
+      );
+    }
+
+    return {
+      ok: true,
+      timeFrame: params.timeFrame,
+      count: instruments.length,
+      scored: stored.length,
+      ms: Date.now() - started,
+      results: results.map((r: any) =>
+        r.ok && !params.includeFeatures ? { ...r, features: undefined } : r
+      ),
+    };
+  },
+});
+
 // --- BCS REST tools ---
 
 addTool({
@@ -1180,46 +1630,48 @@ addTool({
 addTool({
   name: "bcs.candles.backfill",
   description:
-    "Получить исторические свечи и сохранить в bcs_market.candles (апсерт)",
+    "Догрузить исторические свечи в bcs_market.candles (апсерт). Диапазон режется на куски по BCS_BACKFILL_CHUNK_BARS баров, " +
+    "куски качаются параллельно с ограничением частоты; уже загруженные ранее куски пропускаются (force=true — качать заново). " +
+    "Прогресс хранится в backfill_jobs/backfill_chunks, прерванное задание продолжается после рестарта. " +
+    "wait=false — вернуть задание сразу, ход смотреть через bcs.candles.backfill.status",
   parameters: z.object({
     classCode: z.string().min(1),
-    ticker: z.string().min(1),
+    ticker: z.string().min(1).optional(),
+    tickers: z.array(z.string().min(1)).min(1).optional(),
     startDate: z.string().min(1),
     endDate: z.string().min(1),
     timeFrame: z.enum(["M1", "M5", "M15", "M30", "H1", "H4", "D", "W", "MN"]),
+    force: z.boolean().optional().default(false),
+    wait: z.boolean().optional().default(true),
   }),
   execute: async (params) => {
-    const query = new URLSearchParams({
-      classCode: params.classCode,
-      ticker: params.ticker,
-      startDate: params.startDate,
-      endDate: params.endDate,
-      timeFrame: params.timeFrame,
-    });
-    const data = await bcs.getCandles(query);
-    const bars = (data as any).bars || [];
-    for (const bar of bars) {
-      await marketPool.query(
-        `INSERT INTO candles (ticker, class_code, time_frame, ts, open, high, low, close, volume, data)
-         VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
-         ON CONFLICT (ticker, class_code, time_frame, ts)
-         DO UPDATE SET open=EXCLUDED.open, high=EXCLUDED.high, low=EXCLUDED.low,
-                       close=EXCLUDED.close, volume=EXCLUDED.volume, data=EXCLUDED.data`,
-        [
-          params.ticker,
-          params.classCode,
-          params.timeFrame,
-          bar.time,
-          bar.open,
-          bar.high,
-          bar.low,
-          bar.close,
-          bar.volume,
-          bar,
-        ]
+    const tickers = [...(params.tickers || []), ...(params.ticker ? [params.ticker] : [])];
+    if (!tickers.length) {
+      throw new Error("ticker or tickers is required");
+    }
+    const jobId = await createBackfillJob({ ...params, tickers });
+    const run = runBackfillJob(jobId);
+    if (!params.wait) {
+      run.catch((err) =>
+        logger.error("backfill.job.error", { job: jobId, error: err?.message || String(err) })
       );
+      return getBackfillJob(jobId);
     }
-    return { ok: true, count: bars.length };
+    const job = await run;
+    return { ok: job.status === "done", count: job.bars, job };
+  },
+});
+
+addTool({
+  name: "bcs.candles.backfill.status",
+  description: "Состояние заданий bcs.candles.backfill: куски done/skipped/failed/pending и число баров",
+  parameters: z.object({
+    jobId: z.number().int().optional(),
+    limit: z.number().int().min(1).max(100).optional().default(10),
+  }),
+  execute: async (params) => {
+    if (params.jobId !== undefined) return getBackfillJob(params.jobId);
+    return listBackfillJobs(params.limit);
   },
 });
 
@@ -1511,6 +1963,10 @@ async function start() {
     ollama: config.ollama,
     allowWrite: flags.allowWrite,
   });
+  startScriptPool();
+  resumeBackfillJobs().catch((err) =>
+    logger.error("backfill.resume.error", { error: err?.message || String(err) })
+  );
   if (config.mcpTransport === "stdio") {
     const transport = new StdioServerTransport();
     await server.connect(transport);
@@ -1,7 +1,14 @@
 import { config } from "./config.js";
 import { logger } from "./logger.js";
 
-const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+const TERMINAL_FAILED = new Set(["failed", "error", "cancelled", "canceled"]);
+
+// Backoff between plain polls of one job when long-poll is not available
+const POLL_MIN_MS = 50;
+const POLL_MAX_MS = 500;
+// Non-terminal answers returned well before `wait` in a row before the
+// server is assumed to ignore the parameter
+const SHORT_POLLS_LIMIT = 3;
 
 function extractEmbedding(result: unknown): number[] {
   if (!result || typeof result !== "object") return [];
@@ -85,40 +92,169 @@ async function enqueueLlmJob(payload: Record<string, unknown>): Promise<string>
   return data.job_id;
 }
 
-async function waitLlmJob(jobId: string): Promise<Record<string, unknown>> {
-  const timeoutSec = Math.max(3, config.llm.timeoutSec || 30);
-  const started = Date.now();
-
-  while ((Date.now() - started) / 1000 < timeoutSec) {
-    const resp = await fetch(
-      `${config.llm.mcpBaseUrl.replace(/\/$/, "")}/v1/jobs/${encodeURIComponent(jobId)}`,
-      { method: "GET" }
-    );
-    if (!resp.ok) {
-      const body = await resp.text();
-      throw new Error(`llm_mcp job read failed ${resp.status}: ${body}`);
+type JobStatus = {
+  status?: string;
+  error?: string;
+  result?: unknown;
+};
+
+type PendingJob = {
+  resolve: (value: Record<string, unknown>) => void;
+  reject: (err: Error) => void;
+  timeoutSec: number;
+  deadline: number;
+  nextAt: number;
+  delayMs: number;
+  controller: AbortController | null;
+};
+
+/**
+ * Waits for many llm_mcp jobs from one scheduler.
+ *
+ * Every pending job has at most one `GET /v1/jobs/{id}?wait=N` in flight;
+ * llm_mcp holds a long-poll request until the job finishes or `N` seconds
+ * pass. If the server answers non-terminal states early several times in a
+ * row it ignores `wait`, and the waiter switches to plain polls with per-job
+ * exponential backoff (POLL_MIN_MS doubling up to POLL_MAX_MS).
+ */
+class JobWaiter {
+  private jobs = new Map<string, PendingJob>();
+  private longPoll: boolean;
+  private shortPolls = 0;
+  private timer: NodeJS.Timeout | null = null;
+
+  constructor(private baseUrl: string, private waitSec: number) {
+    this.longPoll = waitSec > 0;
+  }
+
+  wait(jobId: string, timeoutSec: number): Promise<Record<string, unknown>> {
+    return new Promise((resolve, reject) => {
+      const timeout = Math.max(3, timeoutSec);
+      this.jobs.set(jobId, {
+        resolve,
+        reject,
+        timeoutSec: timeout,
+        deadline: Date.now() + timeout * 1000,
+        nextAt: 0,
+        delayMs: 0,
+        controller: null,
+      });
+      this.pump();
+    });
+  }
+
+  private pump() {
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = null;
+    const now = Date.now();
+    let wakeAt = Infinity;
+    for (const [jobId, job] of this.jobs) {
+      if (now >= job.deadline) {
+        this.finish(jobId, job, new Error(`llm_mcp job timeout after ${job.timeoutSec}s`));
+        continue;
+      }
+      if (!job.controller && job.nextAt <= now) {
+        this.poll(jobId, job, job.deadline - now);
+      }
+      wakeAt = Math.min(wakeAt, job.controller ? job.deadline : Math.min(job.nextAt, job.deadline));
+    }
+    if (wakeAt !== Infinity) {
+      this.timer = setTimeout(() => this.pump(), Math.max(0, wakeAt - Date.now()));
     }
+  }
+
+  private poll(jobId: string, job: PendingJob, remainingMs: number) {
+    const waitSec = this.longPoll ? Math.min(this.waitSec, Math.floor(remainingMs / 1000)) : 0;
+    const query = waitSec > 0 ? `?wait=${waitSec}` : "";
+    const controller = new AbortController();
+    const started = Date.now();
+    job.controller = controller;
+    fetch(`${this.baseUrl}/v1/jobs/${encodeURIComponent(jobId)}${query}`, {
+      method: "GET",
+      signal: controller.signal,
+    })
+      .then(async (resp) => {
+        if (!resp.ok) {
+          const body = await resp.text();
+          throw new Error(`llm_mcp job read failed ${resp.status}: ${body}`);
+        }
+        return (await resp.json()) as JobStatus;
+      })
+      .then(
+        (data) => this.handle(jobId, job, data, waitSec, Date.now() - started),
+        (err) => {
+          if (this.jobs.get(jobId) === job) {
+            this.finish(jobId, job, err instanceof Error ? err : new Error(String(err)));
+          }
+        }
+      )
+      .finally(() => this.pump());
+  }
 
-    const data = (await resp.json()) as {
-      status?: string;
-      error?: string;
-      result?: unknown;
-    };
-    const status = (data.status || "").toLowerCase();
+  private handle(jobId: string, job: PendingJob, data: JobStatus, waitSec: number, elapsedMs: number) {
+    if (this.jobs.get(jobId) !== job) return;
+    job.controller = null;
+    const status = String(data?.status || "").toLowerCase();
     if (status === "done") {
       if (data.result && typeof data.result === "object") {
-        return data.result as Record<string, unknown>;
+        this.finish(jobId, job, null, data.result as Record<string, unknown>);
+      } else {
+        this.finish(jobId, job, new Error("llm_mcp job done without result"));
       }
-      throw new Error("llm_mcp job done without result");
+      return;
     }
-    if (status === "failed" || status === "error" || status === "cancelled" || status === "canceled") {
-      throw new Error(`llm_mcp job ${status}: ${data.error || "unknown"}`);
+    if (TERMINAL_FAILED.has(status)) {
+      this.finish(jobId, job, new Error(`llm_mcp job ${status}: ${data.error || "unknown"}`));
+      return;
     }
 
-    await sleep(500);
+    if (waitSec > 0) {
+      if (elapsedMs < (waitSec * 1000) / 2) {
+        this.shortPolls += 1;
+        if (this.shortPolls >= SHORT_POLLS_LIMIT && this.longPoll) {
+          this.longPoll = false;
+          logger.info("llm.job.long_poll_unsupported", { baseUrl: this.baseUrl });
+        }
+      } else {
+        this.shortPolls = 0;
+      }
+    }
+    if (this.longPoll && waitSec > 0) {
+      job.nextAt = 0;
+    } else {
+      job.delayMs = job.delayMs ? Math.min(POLL_MAX_MS, job.delayMs * 2) : POLL_MIN_MS;
+      job.nextAt = Date.now() + job.delayMs;
+    }
   }
 
-  throw new Error(`llm_mcp job timeout after ${timeoutSec}s`);
+  private finish(
+    jobId: string,
+    job: PendingJob,
+    err: Error | null,
+    result?: Record<string, unknown>
+  ) {
+    this.jobs.delete(jobId);
+    job.controller?.abort();
+    job.controller = null;
+    if (err) job.reject(err);
+    else job.resolve(result as Record<string, unknown>);
+  }
+}
+
+const waiters = new Map<string, JobWaiter>();
+
+function jobWaiter(): JobWaiter {
+  const baseUrl = config.llm.mcpBaseUrl.replace(/\/$/, "");
+  let waiter = waiters.get(baseUrl);
+  if (!waiter) {
+    waiter = new JobWaiter(baseUrl, config.llm.jobWaitSec);
+    waiters.set(baseUrl, waiter);
+  }
+  return waiter;
+}
+
+function waitLlmJob(jobId: string): Promise<Record<string, unknown>> {
+  return jobWaiter().wait(jobId, config.llm.timeoutSec || 30);
 }
 
 async function runLlmTask(payload: Record<string, unknown>): Promise<Record<string, unknown>> {
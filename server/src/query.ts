@@ -91,6 +91,10 @@ export const MARKET_TABLES: Record<string, TableMeta> = {
       "depth",
       "bid_volume",
       "ask_volume",
+      "bid_prices",
+      "bid_qty",
+      "ask_prices",
+      "ask_qty",
       "bids",
       "asks",
       "data",
@@ -110,6 +114,60 @@ export const MARKET_TABLES: Record<string, TableMeta> = {
       "data",
     ],
   },
+  market_latest: {
+    timeField: "updated_at",
+    columns: [
+      "ticker",
+      "class_code",
+      "quote_ts",
+      "bid",
+      "offer",
+      "last",
+      "open",
+      "close",
+      "high",
+      "low",
+      "change",
+      "change_rate",
+      "currency",
+      "security_trading_status",
+      "trade_ts",
+      "trade_side",
+      "trade_price",
+      "trade_quantity",
+      "trade_volume",
+      "book_ts",
+      "book_depth",
+      "bid_volume",
+      "ask_volume",
+      "bid_prices",
+      "bid_qty",
+      "ask_prices",
+      "ask_qty",
+      "updated_at",
+    ],
+  },
+  ohlcv_rollups: {
+    timeField: "ts",
+    columns: [
+      "source",
+      "ticker",
+      "class_code",
+      "bucket_sec",
+      "ts",
+      "open",
+      "high",
+      "low",
+      "close",
+      "count",
+      "value_count",
+      "value_sum",
+      "volume",
+      "turnover",
+      "vwap",
+      "updated_at",
+    ],
+  },
   trading_status_snapshots: {
     timeField: "ts",
     columns: ["id", "class_code", "ts", "data"],
@@ -263,7 +321,21 @@ export const PRIVATE_TABLES: Record<string, TableMeta> = {
   },
   embedding_queue: {
     timeField: "created_at",
-    columns: ["id", "entity_type", "entity_id", "text", "metadata", "status", "created_at"],
+    columns: [
+      "id",
+      "entity_type",
+      "entity_id",
+      "text",
+      "metadata",
+      "status",
+      "priority",
+      "attempts",
+      "available_at",
+      "leased_until",
+      "last_error",
+      "created_at",
+      "updated_at",
+    ],
   },
   embeddings: {
     timeField: "created_at",
@@ -421,6 +493,106 @@ export async function runLatest(
   return { row, ageSeconds, stale };
 }
 
+// Source table -> price column the worker folds into ohlcv_rollups (worker/rollups.py)
+const ROLLUP_SOURCES: Record<string, string> = {
+  last_trades: "price",
+  quotes: "last",
+};
+const ROLLUP_BUCKETS = [3600, 300, 60, 1];
+const ROLLUP_FILTERS = new Set(["ticker", "class_code"]);
+
+function rollupBucket(input: AggregateInput, bucketSeconds: number): number | null {
+  if (ROLLUP_SOURCES[input.table] !== input.valueField) {
+    return null;
+  }
+  if (input.range?.field && input.range.field !== "ts") {
+    return null;
+  }
+  if (Object.keys(input.filters || {}).some((key) => !ROLLUP_FILTERS.has(key))) {
+    return null;
+  }
+  return ROLLUP_BUCKETS.find((sec) => bucketSeconds % sec === 0) ?? null;
+}
+
+// Whole rollup buckets inside the range come from ohlcv_rollups; the partial
+// buckets at the range edges and the rows the worker has not folded yet
+// ((xid, id) above the watermark) are read from the source table. All rollup
+// buckets are multiples of the requested bucket, so the result equals the raw
+// GROUP BY.
+async function runRollupAggregate(
+  pool: Pool,
+  meta: TableMeta,
+  input: AggregateInput,
+  bucketSeconds: number,
+  rollupSeconds: number
+): Promise<any[]> {
+  const valueField = input.valueField;
+  // a known value, unlike a subquery, lets the planner pick the (xid, id) index for the tail
+  const watermark = await pool.query("SELECT last_xid, last_id FROM rollup_watermarks WHERE source = $1", [
+    input.table,
+  ]);
+  const mark = watermark.rows[0] ?? { last_xid: "0", last_id: 0 };
+  const { where, values } = buildWhere(meta, { filters: input.filters });
+  const param = (value: any) => {
+    values.push(value);
+    return `$${values.length}`;
+  };
+  const sourceParam = param(input.table);
+  const rollupParam = param(rollupSeconds);
+  const range: string[] = [];
+  let lo = "'-infinity'::timestamptz";
+  let hi = "'infinity'::timestamptz";
+  if (input.range?.start) {
+    const start = param(input.range.start);
+    range.push(`ts >= ${start}`);
+    lo = `to_timestamp(ceil(extract(epoch from ${start}::timestamptz) / ${rollupParam}) * ${rollupParam})`;
+  }
+  if (input.range?.end) {
+    const end = param(input.range.end);
+    range.push(`ts <= ${end}`);
+    hi = `to_timestamp(floor(extract(epoch from ${end}::timestamptz) / ${rollupParam}) * ${rollupParam})`;
+  }
+  const raw = (extra: string[]) =>
+    `SELECT ts, ${valueField} AS min, ${valueField} AS max, ${valueField} AS sum,
+            (${valueField} IS NOT NULL)::int AS n, 1 AS count
+     FROM ${input.table}
+     WHERE ${[...where, ...range, ...extra].join(" AND ")}`;
+  const bucketParam = param(bucketSeconds);
+  const order = input.order || "desc";
+  const limit = Math.min(input.limit || 1000, 10000);
+
+  const sql = `WITH parts AS (
+      SELECT ts, low AS min, high AS max,
+             CASE WHEN value_count > 0 THEN value_sum END AS sum,
+             value_count AS n, count
+      FROM ohlcv_rollups
+      WHERE ${[...where, `source = ${sourceParam}`, `bucket_sec = ${rollupParam}`, `ts >= ${lo}`, `ts < ${hi}`].join(" AND ")}
+      UNION ALL
+      ${raw([`ts < ${lo}`])}
+      UNION ALL
+      ${raw([`ts >= GREATEST(${lo}, ${hi})`])}
+      UNION ALL
+      ${raw([
+        `ts >= ${lo}`,
+        `ts < ${hi}`,
+        `(xid, id) > (${param(mark.last_xid)}, ${param(mark.last_id)})`,
+      ])}
+    )
+    SELECT to_timestamp(floor(extract(epoch from ts) / ${bucketParam}) * ${bucketParam}) AS bucket,
+           min(min) AS min,
+           max(max) AS max,
+           sum(sum) / NULLIF(sum(n), 0) AS avg,
+           sum(sum) AS sum,
+           sum(count) AS count
+    FROM parts
+    GROUP BY bucket
+    ORDER BY bucket ${order.toUpperCase()}
+    LIMIT ${limit}`;
+
+  const result = await pool.query(sql, values);
+  return result.rows;
+}
+
 export async function runAggregate(
   pool: Pool,
   meta: TableMeta,
@@ -434,11 +606,19 @@ export async function runAggregate(
   if (!allowed.has(valueField)) {
     throw new Error(`invalid valueField: ${valueField}`);
   }
-  if (["data", "metadata", "bids", "asks"].includes(valueField)) {
+  if (
+    ["data", "metadata", "bids", "asks", "bid_prices", "bid_qty", "ask_prices", "ask_qty"].includes(
+      valueField
+    )
+  ) {
     throw new Error(`valueField not numeric: ${valueField}`);
   }
 
   const bucketSeconds = Math.min(Math.max(input.bucketSeconds || 60, 1), 31536000);
+  const rollupSeconds = rollupBucket(input, bucketSeconds);
+  if (rollupSeconds !== null && MARKET_TABLES[input.table] === meta) {
+    return runRollupAggregate(pool, meta, input, bucketSeconds, rollupSeconds);
+  }
   values.push(bucketSeconds);
   const bucketIndex = values.length;
   const bucketExpr = `to_timestamp(floor(extract(epoch from ${meta.timeField}) / $${bucketIndex}) * $${bucketIndex})`;
@@ -1,9 +1,16 @@
 import { readFileSync } from "fs";
-import { spawn } from "child_process";
+import { spawn, ChildProcessWithoutNullStreams } from "child_process";
+import { createInterface } from "readline";
 import path from "path";
+import { config } from "./config.js";
 import { logger } from "./logger.js";
 
 const MANIFEST_PATH = path.resolve("/app/scripts/manifest.json");
+const RUNNER_PATH = "/app/scripts/run.py";
+
+// The python side aborts a script after timeoutMs on its own; the worker
+// process is killed only if it does not answer within this extra grace.
+const KILL_GRACE_MS = 2000;
 
 export type ScriptInfo = {
   name: string;
@@ -17,14 +24,196 @@ export function loadManifest(): { scripts: ScriptInfo[] } {
   return JSON.parse(raw);
 }
 
+type ScriptJob = {
+  name: string;
+  payload: any;
+  started: number;
+  resolve: (value: any) => void;
+  reject: (err: Error) => void;
+};
+
+class ScriptWorker {
+  readonly proc: ChildProcessWithoutNullStreams;
+  served = 0;
+  alive = true;
+  private job: ScriptJob | null = null;
+  private jobId = 0;
+  private timer: NodeJS.Timeout | null = null;
+  private stderr = "";
+
+  constructor(private onIdle: (worker: ScriptWorker) => void) {
+    this.proc = spawn("python3", [RUNNER_PATH, "--serve"], {
+      stdio: ["pipe", "pipe", "pipe"],
+    });
+    createInterface({ input: this.proc.stdout }).on("line", (line) =>
+      this.handleLine(line)
+    );
+    this.proc.stderr.on("data", (data) => {
+      // keep only the tail, scripts may print a lot
+      this.stderr = (this.stderr + data.toString()).slice(-4000);
+    });
+    // EPIPE after a crash is reported through "close" below
+    this.proc.stdin.on("error", () => undefined);
+    this.proc.on("error", (err) => this.fail(err));
+    this.proc.on("close", (code) => {
+      this.fail(new Error(this.stderr || `script worker exited with code ${code}`));
+    });
+  }
+
+  get busy() {
+    return this.job !== null;
+  }
+
+  run(job: ScriptJob) {
+    this.job = job;
+    this.jobId += 1;
+    this.served += 1;
+    this.stderr = "";
+    this.timer = setTimeout(() => {
+      logger.error("script.worker.timeout", {
+        name: job.name,
+        pid: this.proc.pid,
+        ms: Date.now() - job.started,
+      });
+      this.fail(new Error(`script ${job.name} timed out`));
+      this.proc.kill("SIGKILL");
+    }, config.scripts.timeoutMs + KILL_GRACE_MS);
+    this.proc.stdin.write(
+      JSON.stringify({
+        id: this.jobId,
+        name: job.name,
+        payload: job.payload ?? {},
+        timeoutMs: config.scripts.timeoutMs,
+      }) + "\n"
+    );
+  }
+
+  retire() {
+    this.alive = false;
+    this.proc.stdin.end();
+  }
+
+  private handleLine(line: string) {
+    const job = this.job;
+    if (!job) return;
+    let parsed: any;
+    try {
+      parsed = JSON.parse(line);
+    } catch (err) {
+      // the stream is out of sync, the worker cannot be reused
+      logger.error("script.run.parse_error", { name: job.name, error: String(err) });
+      this.fail(err as Error);
+      this.proc.kill("SIGKILL");
+      return;
+    }
+    if (parsed.id !== this.jobId) return;
+    const { id: _id, ...result } = parsed;
+    this.finish();
+    logger.debug("script.run.ok", {
+      name: job.name,
+      ms: Date.now() - job.started,
+      result: logger.summarize(result),
+    });
+    job.resolve(result);
+  }
+
+  private finish() {
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = null;
+    this.job = null;
+    if (this.alive) this.onIdle(this);
+  }
+
+  private fail(err: Error) {
+    const job = this.job;
+    this.alive = false;
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = null;
+    this.job = null;
+    this.onIdle(this);
+    if (job) {
+      logger.error("script.run.error", {
+        name: job.name,
+        error: err.message,
+        ms: Date.now() - job.started,
+      });
+      job.reject(err);
+    }
+  }
+}
+
+/**
+ * Pool of long-lived `run.py --serve` processes.
+ *
+ * Each worker runs one script at a time; extra calls wait in a FIFO queue.
+ * Workers are replaced after `maxRequests` calls, on timeout and on crash.
+ */
+class ScriptPool {
+  private workers: ScriptWorker[] = [];
+  private queue: ScriptJob[] = [];
+
+  start() {
+    while (this.workers.length < Math.max(1, config.scripts.workers)) {
+      this.spawn();
+    }
+    logger.info("script.pool.ready", { workers: this.workers.length });
+  }
+
+  run(name: string, payload: any): Promise<any> {
+    return new Promise((resolve, reject) => {
+      this.queue.push({ name, payload, started: Date.now(), resolve, reject });
+      this.dispatch();
+    });
+  }
+
+  private spawn() {
+    const worker = new ScriptWorker((w) => this.release(w));
+    this.workers.push(worker);
+    return worker;
+  }
+
+  private release(worker: ScriptWorker) {
+    if (worker.alive && worker.served >= config.scripts.maxRequests) {
+      logger.debug("script.worker.recycle", { pid: worker.proc.pid, served: worker.served });
+      worker.retire();
+    }
+    if (!worker.alive) {
+      this.workers = this.workers.filter((w) => w !== worker);
+    }
+    this.dispatch();
+  }
+
+  private dispatch() {
+    while (this.queue.length) {
+      let worker = this.workers.find((w) => w.alive && !w.busy);
+      if (!worker && this.workers.length < Math.max(1, config.scripts.workers)) {
+        worker = this.spawn();
+      }
+      if (!worker) return;
+      worker.run(this.queue.shift() as ScriptJob);
+    }
+  }
+}
+
+const pool = new ScriptPool();
+
+export function startScriptPool() {
+  if (config.scripts.persistent) pool.start();
+}
+
 export function runScript(name: string, payload: any): Promise<any> {
+  logger.debug("script.run.start", {
+    name,
+    payload: logger.sanitize(payload),
+  });
+  if (config.scripts.persistent) return pool.run(name, payload);
+  return runScriptOnce(name, payload);
+}
+
+function runScriptOnce(name: string, payload: any): Promise<any> {
   return new Promise((resolve, reject) => {
     const started = Date.now();
-    logger.debug("script.run.start", {
-      name,
-      payload: logger.sanitize(payload),
-    });
-    const proc = spawn("python3", ["/app/scripts/run.py", name], {
+    const proc = spawn("python3", [RUNNER_PATH, name], {
       stdio: ["pipe", "pipe", "pipe"],
     });
 
@@ -0,0 +1,65 @@
+// Chunk planning of dist/backfill.js.
+//
+//   npm run build && npm test
+import assert from "node:assert/strict";
+import { beforeEach, test } from "node:test";
+
+const { config } = await import("../dist/config.js");
+const { planChunks } = await import("../dist/backfill.js");
+
+const at = (time) => new Date(`2026-01-05T${time}:00Z`);
+const plain = (chunks) =>
+  chunks.map((c) => [c.ticker, c.start_ts.toISOString().slice(11, 16), c.end_ts.toISOString().slice(11, 16)]);
+
+beforeEach(() => {
+  // 60 M1 bars: one chunk per hour
+  config.backfill.chunkBars = 60;
+});
+
+test("chunks follow the epoch grid and are clamped at both ends", () => {
+  assert.deepEqual(plain(planChunks(["SBER"], "M1", at("10:15"), at("12:30"))), [
+    ["SBER", "10:15", "11:00"],
+    ["SBER", "11:00", "12:00"],
+    ["SBER", "12:00", "12:30"],
+  ]);
+});
+
+test("a range on grid boundaries has no partial or empty chunks", () => {
+  assert.deepEqual(plain(planChunks(["SBER"], "M1", at("10:00"), at("12:00"))), [
+    ["SBER", "10:00", "11:00"],
+    ["SBER", "11:00", "12:00"],
+  ]);
+});
+
+test("overlapping jobs share interior chunks", () => {
+  const first = plain(planChunks(["SBER"], "M1", at("09:40"), at("12:10")));
+  const second = plain(planChunks(["SBER"], "M1", at("10:05"), at("13:00")));
+  assert.deepEqual(first.slice(1, -1), [["SBER", "10:00", "11:00"], ["SBER", "11:00", "12:00"]]);
+  assert.deepEqual(second.slice(1, 2), first.slice(2, 3));
+});
+
+test("one chunk per ticker per span", () => {
+  const tickers = ["SBER", "GAZP", "LKOH"];
+  assert.deepEqual(plain(planChunks(tickers, "M1", at("10:10"), at("10:50"))), [
+    ["SBER", "10:10", "10:50"],
+    ["GAZP", "10:10", "10:50"],
+    ["LKOH", "10:10", "10:50"],
+  ]);
+
+  const chunks = planChunks(tickers, "M1", at("10:10"), at("13:20"));
+  assert.equal(chunks.length, tickers.length * 4);
+  for (const ticker of tickers) {
+    const own = chunks.filter((c) => c.ticker === ticker);
+    assert.deepEqual(new Set(own.map((c) => Math.floor(c.start_ts.getTime() / 3600_000))).size, own.length);
+  }
+});
+
+test("span scales with the timeframe", () => {
+  config.backfill.chunkBars = 4;
+  // 4 H1 bars: the grid is 00:00, 04:00, 08:00, ...
+  assert.deepEqual(plain(planChunks(["SBER"], "H1", at("03:00"), at("09:00"))), [
+    ["SBER", "03:00", "04:00"],
+    ["SBER", "04:00", "08:00"],
+    ["SBER", "08:00", "09:00"],
+  ]);
+});
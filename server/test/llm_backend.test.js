@@ -0,0 +1,130 @@
+// Job waiter of dist/llm_backend.js against a stub llm_mcp.
+//
+//   npm run build && npm test
+import assert from "node:assert/strict";
+import { createServer } from "node:http";
+import { after, before, test } from "node:test";
+
+process.env.LLM_BACKEND = "llm_mcp";
+process.env.LLM_BACKEND_FALLBACK_OLLAMA = "false";
+process.env.LLM_BACKEND_TIMEOUT_SEC = "10";
+process.env.LLM_MCP_JOB_WAIT_SEC = "5";
+
+const { config } = await import("../dist/config.js");
+const { embedText } = await import("../dist/llm_backend.js");
+
+/**
+ * Minimal llm_mcp: a job finishes `latencyMs` after enqueue; with `longPoll`
+ * a `GET /v1/jobs/{id}?wait=N` is held until then, otherwise `wait` is ignored.
+ */
+function stubLlmMcp({ latencyMs, longPoll, fail = () => false }) {
+  const jobs = new Map();
+  const reads = [];
+  let nextId = 0;
+
+  const server = createServer(async (req, res) => {
+    const url = new URL(req.url, "http://stub");
+    const reply = (status, body) => {
+      res.writeHead(status, { "Content-Type": "application/json" });
+      res.end(JSON.stringify(body));
+    };
+
+    if (req.method === "POST" && url.pathname === "/v1/llm/request") {
+      let raw = "";
+      for await (const chunk of req) raw += chunk;
+      const payload = JSON.parse(raw);
+      const jobId = `job-${++nextId}`;
+      const job = { payload, done: false };
+      job.finished = new Promise((resolve) =>
+        setTimeout(() => {
+          job.done = true;
+          resolve();
+        }, latencyMs)
+      );
+      jobs.set(jobId, job);
+      reply(202, { job_id: jobId });
+      return;
+    }
+
+    const match = url.pathname.match(/^\/v1\/jobs\/([^/]+)$/);
+    const job = match && jobs.get(decodeURIComponent(match[1]));
+    if (req.method !== "GET" || !job) {
+      reply(404, { error: "not found" });
+      return;
+    }
+    const wait = Number(url.searchParams.get("wait") || 0);
+    reads.push({ jobId: match[1], wait });
+    if (longPoll && wait > 0 && !job.done) {
+      await Promise.race([job.finished, new Promise((resolve) => setTimeout(resolve, wait * 1000))]);
+    }
+    if (!job.done) {
+      reply(200, { status: "running" });
+    } else if (fail(job.payload)) {
+      reply(200, { status: "failed", error: "provider timeout" });
+    } else {
+      reply(200, { status: "done", result: { data: { embedding: [job.payload.prompt.length, 1] } } });
+    }
+  });
+
+  return {
+    reads,
+    jobs,
+    async start() {
+      await new Promise((resolve) => server.listen(0, "127.0.0.1", resolve));
+      return `http://127.0.0.1:${server.address().port}`;
+    },
+    stop() {
+      server.closeAllConnections();
+      return new Promise((resolve) => server.close(resolve));
+    },
+  };
+}
+
+const longPolling = stubLlmMcp({ latencyMs: 300, longPoll: true, fail: (p) => p.prompt === "bad" });
+const polling = stubLlmMcp({ latencyMs: 300, longPoll: false });
+let longPollingUrl;
+let pollingUrl;
+
+before(async () => {
+  longPollingUrl = await longPolling.start();
+  pollingUrl = await polling.start();
+});
+
+after(async () => {
+  await longPolling.stop();
+  await polling.stop();
+});
+
+test("long-poll answers many jobs with one read each", async () => {
+  config.llm.mcpBaseUrl = longPollingUrl;
+  longPolling.reads.length = 0;
+  const texts = Array.from({ length: 20 }, (_, i) => "x".repeat(i + 1));
+
+  const vectors = await Promise.all(texts.map((text) => embedText(text)));
+
+  assert.deepEqual(vectors, texts.map((text) => [text.length, 1]));
+  assert.equal(longPolling.reads.length, texts.length);
+  assert.ok(longPolling.reads.every((read) => read.wait === 5));
+});
+
+test("failed job rejects without waiting for the timeout", async () => {
+  config.llm.mcpBaseUrl = longPollingUrl;
+  const started = Date.now();
+
+  await assert.rejects(embedText("bad"), /llm_mcp job failed: provider timeout/);
+  assert.ok(Date.now() - started < 2000);
+});
+
+test("server ignoring wait gets plain polls with backoff", async () => {
+  config.llm.mcpBaseUrl = pollingUrl;
+  polling.reads.length = 0;
+
+  // the first jobs notice early answers and switch the waiter to plain polls
+  await Promise.all(["a", "bb", "ccc"].map((text) => embedText(text)));
+  polling.reads.length = 0;
+  assert.deepEqual(await embedText("dddd"), [4, 1]);
+
+  assert.ok(polling.reads.every((read) => read.wait === 0));
+  // 50, 100, 200 ms backoff covers 300 ms in a handful of reads, not a busy loop
+  assert.ok(polling.reads.length >= 2 && polling.reads.length <= 6, `${polling.reads.length} reads`);
+});
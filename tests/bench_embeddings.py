@@ -0,0 +1,140 @@
+"""Embedding throughput against a local mock backend.
+
+    python tests/bench_embeddings.py [--rows 200] [--latency-ms 50]
+
+Starts a mock of Ollama (``/api/embed``, ``/api/embeddings``) and of the
+llm_mcp job API (``/v1/llm/request``, long-poll ``/v1/jobs/{id}``) that
+answer every request or job after ``--latency-ms``, then pushes ``--rows``
+texts through ``llm_backend.embed_texts`` the way the embedding worker does:
+batches of ``BCS_EMBEDDING_BATCH_SIZE`` texts, ``BCS_EMBEDDING_CONCURRENCY``
+batches in flight, one shared session. ``1 x 1`` is the old one text per
+request, one request at a time.
+
+Measured with the defaults (200 rows, 50 ms):
+
+    backend                  concurrency x batch   rows/s
+    ollama                             1 x 1            19
+    ollama                             4 x 16          940
+    llm_mcp multi-prompt               1 x 1            19
+    llm_mcp multi-prompt               4 x 16          941
+    llm_mcp single-prompt              1 x 1            19
+    llm_mcp single-prompt              4 x 16          500
+
+"single-prompt" is an llm_mcp without ``prompts`` support: the first job
+shows it, and every batch then runs as parallel one-text jobs, each holding
+one of the session's connections while it long-polls.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+from aiohttp import web
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from worker import llm_backend  # noqa: E402
+
+DIM = 8
+
+
+def mock_app(latency: float, multi_prompt: bool) -> web.Application:
+    jobs = {}
+
+    async def ollama_embed(request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        return web.json_response({"embeddings": [[0.1] * DIM for _ in body["input"]]})
+
+    async def ollama_embeddings(request):
+        await asyncio.sleep(latency)
+        return web.json_response({"embedding": [0.1] * DIM})
+
+    async def enqueue(request):
+        body = await request.json()
+        job_id = uuid.uuid4().hex
+        prompts = body.get("prompts") if multi_prompt else None
+        if prompts:
+            data = {"embeddings": [[0.1] * DIM for _ in prompts]}
+        else:
+            data = {"embedding": [0.1] * DIM}
+        jobs[job_id] = (asyncio.get_running_loop().time() + latency, data)
+        return web.json_response({"job_id": job_id}, status=202)
+
+    async def job(request):
+        ready_at, data = jobs[request.match_info["job_id"]]
+        wait = float(request.query.get("wait", 0))
+        delay = ready_at - asyncio.get_running_loop().time()
+        if delay > 0 and wait > 0:
+            await asyncio.sleep(min(delay, wait))
+        if asyncio.get_running_loop().time() < ready_at:
+            return web.json_response({"status": "running"})
+        return web.json_response({"status": "done", "result": {"data": data}})
+
+    app = web.Application()
+    app.router.add_post("/api/embed", ollama_embed)
+    app.router.add_post("/api/embeddings", ollama_embeddings)
+    app.router.add_post("/v1/llm/request", enqueue)
+    app.router.add_get("/v1/jobs/{job_id}", job)
+    return app
+
+
+async def measure(base_url: str, backend: str, rows: int, concurrency: int, batch: int) -> float:
+    config = SimpleNamespace(
+        llm_backend=backend,
+        llm_mcp_base_url=base_url,
+        llm_mcp_provider="auto",
+        llm_mcp_batch_embed=True,
+        llm_mcp_job_wait_sec=20,
+        llm_backend_timeout_sec=30,
+        llm_backend_fallback_ollama=False,
+        ollama_base_url=base_url,
+        ollama_embed_model="mock",
+    )
+    llm_backend._mcp_multi_prompt_off_until = 0.0
+    texts = [f"text {i}" for i in range(rows)]
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(chunk):
+        async with slots:
+            out = await llm_backend.embed_texts(session, config, chunk)
+            assert len(out) == len(chunk) and all(out)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency * 2)) as session:
+        started = time.monotonic()
+        await asyncio.gather(*(run(texts[i : i + batch]) for i in range(0, rows, batch)))
+        return rows / (time.monotonic() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    print(f"{'backend':<22} {'concurrency x batch':>21}   rows/s")
+    for name, backend, multi_prompt in (
+        ("ollama", "ollama", True),
+        ("llm_mcp multi-prompt", "llm_mcp", True),
+        ("llm_mcp single-prompt", "llm_mcp", False),
+    ):
+        runner = web.AppRunner(mock_app(args.latency_ms / 1000, multi_prompt))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            for concurrency, batch in ((1, 1), (4, 16)):
+                rate = await measure(f"http://127.0.0.1:{port}", backend, args.rows, concurrency, batch)
+                print(f"{name:<22} {concurrency:>13} x {batch:<6} {rate:>8.0f}")
+        finally:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""AuthClient.run_refresh: how long the proactive refresh loop waits."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from worker import auth
+
+
+class Stop(BaseException):
+    """Ends the loop; a BaseException so ``run_refresh`` does not retry it."""
+
+
+def _run(client, monkeypatch, sleeps_before_stop=3):
+    """Runs ``run_refresh`` with a fake ``asyncio.sleep`` that records delays."""
+    sleeps = []
+
+    async def sleep(delay):
+        sleeps.append(delay)
+        if len(sleeps) >= sleeps_before_stop:
+            raise Stop
+
+    monkeypatch.setattr(auth, "asyncio", SimpleNamespace(sleep=sleep, Lock=asyncio.Lock))
+    with pytest.raises(Stop):
+        asyncio.run(client.run_refresh())
+    return sleeps
+
+
+def _client(monkeypatch, expires_in, fail=0):
+    client = auth.AuthClient("refresh", "client", refresh_margin_sec=120)
+    calls = []
+
+    async def refresh():
+        calls.append(time.time())
+        if len(calls) > 10:
+            raise Stop("refresh loop spins")
+        if len(calls) <= fail:
+            raise RuntimeError("token endpoint down")
+        client._access_token = f"token-{len(calls)}"
+        client._expires_at = time.time() + expires_in
+
+    monkeypatch.setattr(client, "_refresh", refresh)
+    return client, calls
+
+
+@pytest.mark.parametrize("expires_in", [0, 60, 120])
+def test_short_lived_token_waits_the_floor(monkeypatch, expires_in):
+    client, calls = _client(monkeypatch, expires_in)
+    sleeps = _run(client, monkeypatch)
+    assert sleeps == [auth.MIN_REFRESH_SEC] * 3
+    assert len(calls) == 3
+
+
+def test_refresh_margin_before_expiry(monkeypatch):
+    client, calls = _client(monkeypatch, 3600)
+    sleeps = _run(client, monkeypatch, sleeps_before_stop=1)
+    assert len(calls) == 1
+    assert 3600 - 120 - 5 < sleeps[0] <= 3600 - 120
+
+
+def test_fresh_token_is_not_refreshed_again(monkeypatch):
+    client, calls = _client(monkeypatch, 3600)
+    client._access_token = "from get_access_token"
+    client._expires_at = time.time() + 1800
+    sleeps = _run(client, monkeypatch, sleeps_before_stop=1)
+    assert calls == []
+    assert 1800 - 120 - 5 < sleeps[0] <= 1800 - 120
+
+
+def test_failures_back_off_then_reset(monkeypatch):
+    client, calls = _client(monkeypatch, 0, fail=2)
+    sleeps = _run(client, monkeypatch, sleeps_before_stop=4)
+    assert sleeps == [2, 4, auth.MIN_REFRESH_SEC, auth.MIN_REFRESH_SEC]
+    assert len(calls) == 4
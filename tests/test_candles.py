@@ -0,0 +1,173 @@
+"""Candle coalescing and synthesis: bar boundaries, late updates, the first bar after a restart."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from worker import db as db_module
+from worker.candles import MISSING_TS, CandleCoalescer, CandleSynthesizer, _ts, bar_start
+
+MSK = timedelta(hours=3)
+
+
+def _utc(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def _candle(date_time, close, **extra):
+    return {"ticker": "SBER", "classCode": "TQBR", "timeFrame": "M1", "dateTime": date_time, "close": close, **extra}
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2026-01-05T10:00:00Z", _utc("2026-01-05T10:00:00")),
+        ("2026-01-05T13:00:00+03:00", _utc("2026-01-05T10:00:00")),
+        ("2026-01-05T10:00:00", _utc("2026-01-05T10:00:00")),
+        ("", MISSING_TS),
+        ("not a date", MISSING_TS),
+        (None, MISSING_TS),
+        (1767607200, MISSING_TS),
+    ],
+)
+def test_ts_is_always_aware(value, expected):
+    ts = _ts({"dateTime": value})
+    assert ts == expected
+    assert ts.tzinfo is not None
+
+
+def test_resends_of_open_bar_collapse():
+    coalescer = CandleCoalescer()
+    for close in (1, 2, 3):
+        assert coalescer.update(_candle("2026-01-05T10:00:00Z", close)) == []
+    assert [bar["close"] for bar in coalescer.take_dirty()] == [3]
+    assert coalescer.take_dirty() == []
+    assert coalescer.stats() == {"open": 1, "updates": 3, "closed": 0}
+
+
+def test_newer_bar_closes_the_open_one():
+    coalescer = CandleCoalescer()
+    coalescer.update(_candle("2026-01-05T10:00:00Z", 1))
+    coalescer.update(_candle("2026-01-05T10:00:00Z", 2))
+    closed = coalescer.update(_candle("2026-01-05T10:01:00Z", 3))
+    assert [bar["close"] for bar in closed] == [2]
+    assert [bar["close"] for bar in coalescer.take_dirty()] == [3]
+    assert coalescer.closed == 1
+
+
+def test_late_resend_is_written_through():
+    coalescer = CandleCoalescer()
+    coalescer.update(_candle("2026-01-05T10:01:00Z", 3))
+    coalescer.take_dirty()
+    assert [bar["close"] for bar in coalescer.update(_candle("2026-01-05T10:00:00Z", 2))] == [2]
+    assert coalescer.take_dirty() == []
+
+
+def test_series_are_independent():
+    coalescer = CandleCoalescer()
+    coalescer.update(_candle("2026-01-05T10:00:00Z", 1))
+    coalescer.update(_candle("2026-01-05T10:00:00Z", 5, timeFrame="M5"))
+    assert coalescer.update(_candle("2026-01-05T10:01:00Z", 2)) != []
+    assert sorted(bar["close"] for bar in coalescer.take_dirty()) == [2, 5]
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("2026-01-05T10:00:00Z", "2026-01-05T10:01:00"),
+        ("2026-01-05T10:00:00", "2026-01-05T10:01:00Z"),
+        ("2026-01-05T10:00:00Z", None),
+        (None, "2026-01-05T10:01:00Z"),
+        ("2026-01-05T10:00:00Z", "garbage"),
+    ],
+)
+def test_mixed_or_missing_timestamps_do_not_raise(first, second):
+    coalescer = CandleCoalescer()
+    coalescer.update(_candle(first, 1))
+    coalescer.update(_candle(second, 2))
+    coalescer.update(_candle(first, 3))
+
+
+@pytest.mark.parametrize(
+    "ts, time_frame, start",
+    [
+        # Monday 00:30 MSK opens a new week, Sunday 23:59 MSK still belongs to the old one
+        ("2026-01-04T21:30:00", "W", "2026-01-04T21:00:00"),
+        ("2026-01-04T20:59:00", "W", "2025-12-28T21:00:00"),
+        # February starts at 00:00 MSK on the 1st, i.e. 21:00 UTC on January 31
+        ("2026-01-31T21:00:00", "MN", "2026-01-31T21:00:00"),
+        ("2026-01-31T20:59:59", "MN", "2025-12-31T21:00:00"),
+        ("2026-01-05T20:59:59", "D", "2026-01-04T21:00:00"),
+        ("2026-01-05T21:00:00", "D", "2026-01-05T21:00:00"),
+        ("2026-01-05T10:07:30", "H4", "2026-01-05T09:00:00"),
+    ],
+)
+def test_bar_start_follows_exchange_clock(ts, time_frame, start):
+    assert bar_start(_utc(ts), time_frame, MSK) == _utc(start)
+
+
+def _trade(ts, price, quantity=1):
+    return {"ticker": "SBER", "classCode": "TQBR", "price": price, "quantity": quantity, "dateTime": ts}
+
+
+def test_week_bar_closes_at_monday_midnight_msk():
+    synth = CandleSynthesizer(["W"], utc_offset_min=180)
+    synth.update(_trade("2026-01-04T20:00:00Z", 100))
+    synth.update(_trade("2026-01-04T20:30:00Z", 105))
+    out = synth.update(_trade("2026-01-04T21:00:00Z", 101))
+
+    closed, opened = out
+    assert closed["dateTime"] == "2025-12-28T21:00:00Z"
+    assert (closed["open"], closed["high"], closed["low"], closed["close"], closed["volume"]) == (100, 105, 100, 105, 2)
+    assert opened["dateTime"] == "2026-01-04T21:00:00Z"
+    assert synth.closed == 1
+
+
+def test_late_trades_update_open_bar_but_not_closed_ones():
+    synth = CandleSynthesizer(["M1"])
+    synth.update(_trade("2026-01-05T10:00:10Z", 100))
+    synth.update(_trade("2026-01-05T10:01:10Z", 101))
+    # earlier than the first trade of the open bar: becomes its open, not its close
+    assert synth.update(_trade("2026-01-05T10:01:05Z", 99)) == []
+    # belongs to the closed 10:00 bar
+    assert synth.update(_trade("2026-01-05T10:00:50Z", 150)) == []
+
+    (bar,) = synth.take_dirty()
+    assert (bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"]) == (99, 101, 99, 101, 2)
+    assert synth.late == 1
+
+
+def test_first_bar_of_every_series_is_partial():
+    synth = CandleSynthesizer(["M1", "D"], utc_offset_min=180)
+    first = synth.update(_trade("2026-01-05T10:00:10Z", 100))
+    assert [(bar["timeFrame"], bar.get("_partial")) for bar in first] == [("M1", True), ("D", True)]
+    assert all(bar.get("_partial") for bar in synth.take_dirty() + synth.update(_trade("2026-01-05T10:00:20Z", 101)))
+
+    closed, opened = synth.update(_trade("2026-01-05T10:01:00Z", 102))
+    assert closed["timeFrame"] == "M1" and closed.get("_partial")
+    assert opened["timeFrame"] == "M1" and "_partial" not in opened
+    # the day bar is still the one the worker started in
+    assert all(bar.get("_partial") for bar in synth.take_dirty() if bar["timeFrame"] == "D")
+
+
+class FakePool:
+    def __init__(self):
+        self.calls = []
+
+    async def executemany(self, sql, rows):
+        self.calls.append((sql, [row[3] for row in rows]))
+
+
+def test_partial_bars_are_merged_into_stored_ones():
+    synth = CandleSynthesizer(["M1"])
+    bars = synth.update(_trade("2026-01-05T10:00:10Z", 100)) + synth.update(_trade("2026-01-05T10:01:00Z", 101))
+    pool = FakePool()
+    db = db_module.Db(pool, None)
+
+    asyncio.run(db.upsert_candles_batch(bars))
+
+    assert pool.calls == [
+        (db_module.CANDLE_UPSERT_SQL, [_utc("2026-01-05T10:01:00")]),
+        (db_module.CANDLE_MERGE_SQL, [_utc("2026-01-05T10:00:00"), _utc("2026-01-05T10:00:00")]),
+    ]
@@ -0,0 +1,172 @@
+"""Db row building, writers and the pgvector codec against a fake asyncpg pool."""
+
+import asyncio
+import re
+import struct
+
+import asyncpg
+import pytest
+
+from worker import db as db_module
+from worker.db import Db
+
+
+class FakeConn:
+    """COPY rejects a chunk holding a row priced ``"bad"``; INSERT rejects that row alone."""
+
+    def __init__(self, down=False):
+        self.down = down
+        self.copied = []
+        self.copy_sizes = []
+        self.inserted = []
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.down:
+            raise ConnectionRefusedError("connection refused")
+        self.copy_sizes.append(len(records))
+        if any("bad" in row for row in records):
+            raise asyncpg.DataError("invalid input syntax for type numeric")
+        self.copied.extend(records)
+
+    async def execute(self, sql, *args):
+        if "bad" in args:
+            raise asyncpg.DataError("invalid input syntax for type numeric")
+        self.inserted.append(args)
+
+    async def executemany(self, sql, rows):
+        self.inserted.extend((sql, row) for row in rows)
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        return self
+
+    async def __aenter__(self):
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _trade(i, price=None):
+    return {
+        "ticker": "SBER",
+        "classCode": "TQBR",
+        "dateTime": "2026-01-05T10:00:00Z",
+        "price": 100.0 + i if price is None else price,
+        "quantity": i,
+    }
+
+
+def _insert_columns(sql):
+    return [c.strip() for c in re.search(r"\(([^)]*)\)\s*VALUES", sql).group(1).split(",")]
+
+
+@pytest.mark.parametrize(
+    "columns, sql, row",
+    [
+        (db_module.ORDERBOOK_COLUMNS, db_module.ORDERBOOK_INSERT_SQL, db_module._orderbook_row),
+        (db_module.QUOTES_COLUMNS, db_module.QUOTES_INSERT_SQL, db_module._quotes_row),
+        (db_module.LAST_TRADE_COLUMNS, db_module.LAST_TRADE_INSERT_SQL, db_module._last_trade_row),
+    ],
+)
+def test_copy_columns_match_rows_and_insert_fallback(columns, sql, row):
+    assert _insert_columns(sql) == columns
+    assert len(row({"dateTime": "2026-01-05T10:00:00Z"})) == len(columns)
+
+
+def test_clean_batch_is_one_copy():
+    conn = FakeConn()
+    rows = [_trade(i) for i in range(100)]
+
+    failed = asyncio.run(Db(FakePool(conn), None).insert_last_trades_batch(rows))
+
+    assert failed == 0
+    assert conn.copy_sizes == [100]
+    assert [r[5] for r in conn.copied] == list(range(100))
+    assert conn.inserted == []
+
+
+def test_bad_row_costs_only_its_chunk_a_retry():
+    conn = FakeConn()
+    rows = [_trade(i) for i in range(100)]
+    rows[70] = _trade(70, price="bad")
+
+    failed = asyncio.run(Db(FakePool(conn), None).insert_last_trades_batch(rows))
+
+    assert failed == 1
+    # 100 -> 50 + 50 -> 25 + 25 -> 12 + 13; the 13 rows around the bad one go one by one
+    assert conn.copy_sizes == [100, 50, 50, 25, 12, 13, 25]
+    assert len(conn.inserted) == 12
+    assert sorted(r[5] for r in conn.copied + conn.inserted) == [i for i in range(100) if i != 70]
+
+
+def test_connection_error_is_raised_not_counted():
+    conn = FakeConn(down=True)
+
+    with pytest.raises(ConnectionRefusedError):
+        asyncio.run(Db(FakePool(conn), None).insert_last_trades_batch([_trade(1)]))
+    assert conn.inserted == []
+
+
+def test_empty_batch_does_not_touch_the_pool():
+    assert asyncio.run(Db(None, None).insert_quotes_batch([])) == 0
+
+
+def _placeholders(sql):
+    return max(int(n) for n in re.findall(r"\$(\d+)", sql))
+
+
+def test_latest_rows_fill_every_placeholder():
+    conn = FakeConn()
+    quote = {"ticker": "SBER", "classCode": "TQBR", "dateTime": "2026-01-05T10:00:00Z", "last": 1.0}
+    trade = _trade(1)
+    book = {
+        "ticker": "SBER",
+        "classCode": "TQBR",
+        "dateTime": "2026-01-05T10:00:00Z",
+        "bids": [{"price": 99.5, "quantity": 10}],
+        "asks": [{"price": 100.5, "quantity": 3}],
+        "_raw": {"large": "payload"},
+    }
+
+    asyncio.run(Db(FakePool(conn), None).upsert_latest([quote], [trade], [book]))
+
+    written = {sql: row for sql, row in conn.inserted}
+    assert set(written) == {
+        db_module.LATEST_QUOTE_UPSERT_SQL,
+        db_module.LATEST_TRADE_UPSERT_SQL,
+        db_module.LATEST_BOOK_UPSERT_SQL,
+    }
+    for sql, row in written.items():
+        assert len(row) == _placeholders(sql)
+    # market_latest has no raw payload column
+    assert {"large": "payload"} not in written[db_module.LATEST_BOOK_UPSERT_SQL]
+    assert written[db_module.LATEST_BOOK_UPSERT_SQL][6:] == ([99.5], [10.0], [100.5], [3.0])
+
+
+def test_vector_binary_layout():
+    # what pgvector's vector_send gives for '[1,2,3]': dim, unused, big-endian float4s
+    wire = bytes.fromhex("0003" "0000" "3f800000" "40000000" "40400000")
+    assert db_module._vector_encode([1.0, 2.0, 3.0]) == wire
+    assert db_module._vector_decode(wire) == [1.0, 2.0, 3.0]
+
+
+@pytest.mark.parametrize("dim", [1, 768, 1536])
+def test_vector_round_trip_is_float4(dim):
+    values = [((i * 7919) % 1000 - 500) / 3.0 for i in range(dim)]
+
+    decoded = db_module._vector_decode(db_module._vector_encode(values))
+
+    assert len(decoded) == dim
+    # float4 precision, as pgvector stores it
+    assert decoded == pytest.approx(values, rel=1e-7)
+    assert db_module._vector_decode(db_module._vector_encode(decoded)) == decoded
+
+
+def test_vector_encode_rejects_non_numbers():
+    with pytest.raises(struct.error):
+        db_module._vector_encode([1.0, "2"])
@@ -0,0 +1,145 @@
+"""MarketDecoder: the same fields from every backend, raw payloads only where stored."""
+
+import json
+
+import pytest
+
+from worker import decode
+from worker.db import RawJson, _last_trade_row, _orderbook_row
+from worker.decode import MarketDecoder
+
+BACKENDS = [
+    "json",
+    # optional, not in requirements.txt
+    pytest.param("orjson", marks=pytest.mark.skipif(decode.orjson is None, reason="orjson is not installed")),
+    "msgspec",
+]
+
+MESSAGES = {
+    "OrderBook": {
+        "responseType": "OrderBook",
+        "ticker": "SBER",
+        "classCode": "TQBR",
+        "dateTime": "2026-01-05T10:00:00Z",
+        "depth": 2,
+        "bidVolume": 15,
+        "askVolume": 7.5,
+        "bids": [{"price": 99.5, "quantity": 10}, {"price": 99, "quantity": 5}],
+        "asks": [{"price": 100.5, "quantity": 7.5}],
+        "extra": {"ignored": [1, 2, 3]},
+    },
+    "Quotes": {
+        "responseType": "Quotes",
+        "ticker": "SBER",
+        "classCode": "TQBR",
+        "dateTime": "2026-01-05T10:00:00Z",
+        "bid": 99.5,
+        "offer": 100,
+        "last": 100,
+        "changeRate": -0.25,
+        "currency": "RUB",
+        "securityTradingStatus": 17,
+    },
+    "LastTrades": {
+        "responseType": "LastTrades",
+        "ticker": "SBER",
+        "classCode": "TQBR",
+        "dateTime": "2026-01-05T10:00:00.123Z",
+        "side": 1,
+        "price": 100.25,
+        "quantity": 3,
+        "volume": 300.75,
+    },
+    "CandleStick": {
+        "responseType": "CandleStick",
+        "ticker": "SBER",
+        "classCode": "TQBR",
+        "timeFrame": "M1",
+        "dateTime": "2026-01-05T10:00:00Z",
+        "open": 100,
+        "high": 101.5,
+        "low": 99,
+        "close": 101,
+        "volume": 1200,
+    },
+}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("response_type", list(MESSAGES))
+def test_backends_agree(backend, response_type):
+    message = json.dumps(MESSAGES[response_type])
+    reference = MarketDecoder("json").decode(message)[1]
+
+    got_type, data = MarketDecoder(backend).decode(message)
+
+    assert got_type == response_type
+    assert MarketDecoder(backend).backend == backend
+    for name, value in data.items():
+        if name == "_raw":
+            continue
+        # ints stay ints and floats floats, as json.loads gives them
+        assert (value, type(value)) == (reference.get(name), type(reference.get(name))), name
+    # msgspec skips fields the worker does not store ("extra"), the dict backends keep them
+    assert set(MESSAGES[response_type]) - {"responseType", "extra"} <= set(data)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_rows_do_not_depend_on_the_backend(backend):
+    for response_type, row in (("OrderBook", _orderbook_row), ("LastTrades", _last_trade_row)):
+        message = json.dumps(MESSAGES[response_type])
+        decoder = MarketDecoder(backend, {"last_trades"})
+        assert row(decoder.decode(message)[1]) == row(MarketDecoder("json", {"last_trades"}).decode(message)[1])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize(
+    "message",
+    [
+        '{"responseType": "Success", "message": "subscribed"}',
+        '{"responseType": "Error", "errors": ["bad ticker"]}',
+        '{"responseType": "Unknown", "ticker": "SBER"}',
+        "[1, 2]",
+        "not json",
+        "",
+    ],
+)
+def test_control_and_broken_messages_are_skipped(backend, message):
+    assert MarketDecoder(backend).decode(message) is None
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_unexpected_field_type_falls_back_to_a_dict(backend):
+    message = json.dumps({**MESSAGES["CandleStick"], "timeFrame": 1})
+    response_type, data = MarketDecoder(backend).decode(message)
+    assert (response_type, data["timeFrame"], data["close"]) == ("CandleStick", 1, 101)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("as_bytes", [False, True])
+def test_raw_payload_only_for_stored_tables(backend, as_bytes):
+    decoder = MarketDecoder(backend, {"quotes", "candles"})
+    for response_type, body in MESSAGES.items():
+        message = json.dumps(body)
+        _, data = decoder.decode(message.encode() if as_bytes else message)
+        if response_type in ("Quotes", "CandleStick"):
+            # the message text as received, written to jsonb without re-serializing
+            assert isinstance(data["_raw"], RawJson)
+            assert data["_raw"] == message
+        else:
+            assert data["_raw"] is None
+
+
+def test_raw_none_keeps_the_data_column_empty():
+    message = json.dumps(MESSAGES["LastTrades"])
+    assert _last_trade_row(MarketDecoder("msgspec").decode(message)[1])[-1] is None
+    # a dict from elsewhere (no decoder) is stored whole
+    assert _last_trade_row(MESSAGES["LastTrades"])[-1] is MESSAGES["LastTrades"]
+
+
+def test_missing_backend_falls_back(monkeypatch):
+    monkeypatch.setattr(decode, "msgspec", None)
+    monkeypatch.setattr(decode, "orjson", None)
+    assert MarketDecoder("auto").backend == "json"
+    assert MarketDecoder("msgspec").backend == "json"
+    assert MarketDecoder("simdjson").backend == "json"
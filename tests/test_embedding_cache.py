@@ -0,0 +1,73 @@
+"""Embedding cache keys and what gets stored after an Ollama fallback."""
+
+import asyncio
+from types import SimpleNamespace
+
+from worker import embeddings, llm_backend
+from worker.embedding_cache import EmbeddingCache
+
+
+def _config(**overrides):
+    values = dict(
+        llm_backend="llm_mcp",
+        llm_mcp_provider="auto",
+        ollama_embed_model="nomic-embed-text",
+        llm_backend_fallback_ollama=True,
+        embedding_cache=True,
+        embedding_cache_size=10,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+class FakeDb:
+    def __init__(self):
+        self.cached = []
+        self.stored = []
+
+    async def get_cached_embeddings(self, hashes):
+        return {}
+
+    async def put_cached_embeddings(self, model, items):
+        self.cached.append((model, items))
+
+    async def store_embeddings(self, ready):
+        self.stored.extend(ready)
+
+
+def test_key_depends_on_backend_provider_and_model():
+    db = FakeDb()
+    keys = {
+        EmbeddingCache(db, _config(**overrides)).key("text")
+        for overrides in (
+            {},
+            {"llm_backend": "ollama"},
+            {"llm_mcp_provider": "ollama"},
+            {"ollama_embed_model": "other-model"},
+        )
+    }
+    assert len(keys) == 4
+
+
+def test_fallback_vectors_are_not_cached(monkeypatch):
+    async def mcp_embed(session, config, texts):
+        return [[] if text == "skipped" else [1.0] for text in texts]
+
+    async def ollama_embed(session, config, texts):
+        return [[2.0] for _ in texts]
+
+    monkeypatch.setattr(llm_backend, "_mcp_embed", mcp_embed)
+    monkeypatch.setattr(llm_backend, "_ollama_embed", ollama_embed)
+    config = _config()
+    db = FakeDb()
+    cache = EmbeddingCache(db, config)
+    batch = [
+        {"id": i, "text": text, "entity_type": "news", "entity_id": str(i), "metadata": None}
+        for i, text in enumerate(["embedded", "skipped"])
+    ]
+
+    done, failed = asyncio.run(embeddings._embed_batch(db, None, config, cache, batch))
+
+    assert (done, failed) == (2, 0)
+    assert [row[3] for row in db.stored] == [[1.0], [2.0]]
+    assert db.cached == [("llm_mcp/auto/nomic-embed-text", [(cache.key("embedded"), [1.0])])]
@@ -0,0 +1,159 @@
+"""Incremental indicator state against the batch ``signal_score`` features."""
+
+import asyncio
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from worker.features import FeatureTracker
+
+import incremental  # noqa: E402  (on sys.path via worker.features)
+import signal_score  # noqa: E402
+
+LOOKBACK = 200
+START = datetime(2026, 1, 5, 7, 0, tzinfo=timezone.utc)
+
+
+def _bars(count, seed=7):
+    rng = random.Random(seed)
+    close = 100.0
+    bars = []
+    for i in range(count):
+        close = max(1.0, close + rng.gauss(0, 1))
+        bars.append(
+            {
+                "ts": START + timedelta(minutes=i),
+                "high": close + rng.random(),
+                "low": close - rng.random(),
+                "close": close,
+                "volume": float(rng.randint(1, 1000)),
+            }
+        )
+    return bars
+
+
+def _expected(bars):
+    window = bars[-LOOKBACK:]
+    series = signal_score.prepare_series(
+        {
+            "close": [b["close"] for b in window],
+            "high": [b["high"] for b in window],
+            "low": [b["low"] for b in window],
+            "volume": [b["volume"] for b in window],
+        }
+    )
+    return signal_score.compute_features(series)
+
+
+def _assert_matches(state, bars, rsi_tol):
+    got = state.features()
+    want = _expected(bars)
+    assert got["count"] == want["count"]
+    for name, value in want.items():
+        # RSI is seeded at the first bar the state saw, not at the window start
+        tol = rsi_tol if name == "rsi" else 1e-9
+        assert got[name] == pytest.approx(value, rel=tol, abs=tol), name
+
+
+def _feed(state, bars):
+    for b in bars:
+        state.update(b["ts"].isoformat(), b["high"], b["low"], b["close"], b["volume"])
+
+
+def test_state_matches_batch_features():
+    bars = _bars(700)
+    state = incremental.FeatureState(LOOKBACK)
+    _feed(state, bars[:LOOKBACK])
+    _assert_matches(state, bars[:LOOKBACK], rsi_tol=1e-9)
+    _feed(state, bars[LOOKBACK:])
+    _assert_matches(state, bars, rsi_tol=1e-3)
+
+
+class FakeDb:
+    def __init__(self, bars, state=None):
+        self.bars = bars
+        self.state = state
+
+    async def get_indicator_state(self, ticker, class_code, time_frame):
+        return self.state
+
+    async def get_candles_before(self, ticker, class_code, time_frame, before, limit):
+        return [b for b in self.bars if b["ts"] < before][-limit:]
+
+    async def upsert_indicator_states(self, rows):
+        pass
+
+
+def _tracker(db):
+    config = SimpleNamespace(features_lookback=LOOKBACK, features_flush_sec=60, ingest_queue_max=100)
+    return FeatureTracker(db, config)
+
+
+def _candle(b):
+    return {
+        "ticker": "SBER",
+        "classCode": "TQBR",
+        "timeFrame": "M1",
+        "dateTime": b["ts"].strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "high": b["high"],
+        "low": b["low"],
+        "close": b["close"],
+        "volume": b["volume"],
+    }
+
+
+def _run_tracker(db, live):
+    tracker = _tracker(db)
+
+    async def scenario():
+        for b in live:
+            await tracker._on_candle(_candle(b))
+
+    asyncio.run(scenario())
+    return tracker._states[("SBER", "TQBR", "M1")]
+
+
+@pytest.mark.parametrize("gap", [0, 7, LOOKBACK - 1, LOOKBACK, LOOKBACK + 30])
+def test_restore_gap_update(gap):
+    bars = _bars(1000)
+    # the worker stopped after bar 399; bars up to 399 + gap were stored meanwhile
+    before_stop = bars[:400]
+    state = incremental.FeatureState(LOOKBACK)
+    _feed(state, before_stop)
+    stored = json.loads(json.dumps(state.dump()))
+    resume = 400 + gap
+    db = FakeDb(bars[:resume], stored)
+
+    # live bars from `resume` on; the last one is still open
+    state = _run_tracker(db, bars[resume : resume + 20])
+
+    assert state.last_ts == bars[resume + 18]["ts"].isoformat()
+    assert state.bars == (400 + gap + 19 if gap < LOOKBACK else LOOKBACK + 19)
+    _assert_matches(state, bars[: resume + 19], rsi_tol=1e-3)
+
+
+def test_state_of_other_lookback_is_rebuilt():
+    bars = _bars(500)
+    state = incremental.FeatureState(LOOKBACK * 2)
+    _feed(state, bars[:450])
+    db = FakeDb(bars[:450], state.dump())
+
+    state = _run_tracker(db, bars[450:460])
+
+    assert state.lookback == LOOKBACK
+    assert state.bars == LOOKBACK + 9
+    _assert_matches(state, bars[:459], rsi_tol=1e-3)
+
+
+def test_stale_state_without_catch_up_would_drift():
+    """What the catch-up prevents: folding new bars onto a state that missed some."""
+    bars = _bars(700)
+    state = incremental.FeatureState(LOOKBACK)
+    _feed(state, bars[:400])
+    _feed(state, bars[430:460])
+    want = _expected(bars[:460])
+    assert not math.isclose(state.features()["zscore"], want["zscore"], rel_tol=1e-6)
@@ -0,0 +1,157 @@
+"""IngestPipeline: spooling on a lost database, the final flush on shutdown, market_latest."""
+
+import asyncio
+
+import pytest
+
+from worker.config import load_config
+from worker.ingest import IngestPipeline
+
+
+class FakeDb:
+    """Records what each writer got; ``down`` makes every write a connection error."""
+
+    def __init__(self):
+        self.down = False
+        self.written = {"orderbook": [], "quotes": [], "last_trades": [], "candles": []}
+        self.latest = []
+        # cleared to hold writes until the test sets it
+        self.open = asyncio.Event()
+        self.open.set()
+
+    def _writer(kind):
+        async def write(self, rows):
+            await self.open.wait()
+            if self.down:
+                raise ConnectionRefusedError("connection refused")
+            self.written[kind].extend(rows)
+            return 0
+
+        return write
+
+    insert_orderbook_batch = _writer("orderbook")
+    insert_quotes_batch = _writer("quotes")
+    insert_last_trades_batch = _writer("last_trades")
+    upsert_candles_batch = _writer("candles")
+
+    async def upsert_latest(self, quotes, trades, books):
+        self.latest.append((quotes, trades, books))
+
+
+@pytest.fixture
+def config(monkeypatch, tmp_path):
+    monkeypatch.setenv("BCS_SPOOL_DIR", str(tmp_path / "spool"))
+    monkeypatch.setenv("BCS_FEATURES_LOOKBACK", "0")
+    monkeypatch.setenv("BCS_INGEST_STATS_SEC", "0")
+    return load_config()
+
+
+def _trade(i):
+    return {"ticker": "SBER", "classCode": "TQBR", "price": 100 + i, "quantity": 1}
+
+
+def test_connection_error_spools_only_append_only_kinds(config):
+    db = FakeDb()
+    pipeline = IngestPipeline(db, config)
+    db.down = True
+    bar = {"ticker": "SBER", "classCode": "TQBR", "timeFrame": "M1", "dateTime": "2026-01-05T10:00:00Z"}
+
+    async def scenario():
+        await pipeline._write("last_trades", [_trade(1)])
+        await pipeline._write("candles", [bar])
+
+    asyncio.run(scenario())
+    pipeline.spool.close()
+
+    assert pipeline.counters["last_trades"]["spooled"] == 1
+    assert pipeline.spool.pending("last_trades")
+    assert pipeline.counters["candles"]["spooled"] == 0
+    assert pipeline.counters["candles"]["failed"] == 1
+    assert not pipeline.spool.pending("candles")
+
+
+def _bar(minute, close):
+    return {
+        "ticker": "SBER",
+        "classCode": "TQBR",
+        "timeFrame": "M1",
+        "dateTime": f"2026-01-05T10:{minute:02d}:00Z",
+        "close": close,
+    }
+
+
+def test_shutdown_writes_open_bars_with_a_full_candle_queue(monkeypatch, config):
+    monkeypatch.setenv("BCS_INGEST_QUEUE_MAX", "1")
+    monkeypatch.setenv("BCS_CANDLE_FLUSH_MS", "60000")
+    monkeypatch.setenv("BCS_LATEST_FLUSH_MS", "0")
+    db = FakeDb()
+    pipeline = IngestPipeline(db, load_config())
+    assert pipeline.policies["candles"] == "block"
+    closed = []
+    monkeypatch.setattr(pipeline.spool, "close", lambda: closed.append(True))
+
+    async def scenario():
+        db.open.clear()
+        pipeline.queues["candles"].put_nowait(_bar(0, 1))
+        task = asyncio.create_task(pipeline.run())
+        # the flusher holds bar 0 in a write; bar 1 fills the queue again
+        while pipeline.queues["candles"].qsize():
+            await asyncio.sleep(0.01)
+        pipeline.queues["candles"].put_nowait(_bar(1, 2))
+        pipeline.candles.update(_bar(2, 3))
+        task.cancel()
+        await asyncio.sleep(0.01)
+        db.open.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+
+    assert [bar["close"] for bar in db.written["candles"]] == [1, 2, 3]
+    assert closed
+
+
+def _quote(ticker, last):
+    return {"ticker": ticker, "classCode": "TQBR", "last": last}
+
+
+def test_latest_keeps_the_newest_message_per_instrument(config):
+    db = FakeDb()
+    pipeline = IngestPipeline(db, config)
+
+    async def scenario():
+        for last in (1, 2, 3):
+            await pipeline.submit("quotes", _quote("SBER", last))
+        await pipeline.submit("quotes", _quote("GAZP", 7))
+        await pipeline.submit("last_trades", _trade(5))
+        await pipeline._flush_latest()
+        # nothing new since: no write
+        await pipeline._flush_latest()
+        await pipeline.submit("quotes", _quote("SBER", 4))
+        await pipeline._flush_latest()
+
+    asyncio.run(scenario())
+    pipeline.spool.close()
+
+    (quotes, trades, books), (quotes_after, trades_after, books_after) = db.latest
+    assert sorted((q["ticker"], q["last"]) for q in quotes) == [("GAZP", 7), ("SBER", 3)]
+    assert [t["price"] for t in trades] == [105]
+    assert books == []
+    assert (quotes_after, trades_after, books_after) == ([_quote("SBER", 4)], [], [])
+    # every message still goes to its history table
+    assert pipeline.counters["quotes"]["enqueued"] == 5
+
+
+def test_latest_is_off_with_a_zero_interval(monkeypatch, config):
+    monkeypatch.setenv("BCS_LATEST_FLUSH_MS", "0")
+    db = FakeDb()
+    pipeline = IngestPipeline(db, load_config())
+
+    async def scenario():
+        await pipeline.submit("quotes", _quote("SBER", 1))
+        await pipeline._flush_latest()
+
+    asyncio.run(scenario())
+    pipeline.spool.close()
+
+    assert db.latest == []
@@ -0,0 +1,67 @@
+"""llm_mcp multi-prompt embedding: when batching is switched off and back on."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from worker import llm_backend
+
+CONFIG = SimpleNamespace(llm_mcp_batch_embed=True)
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """Fake ``_mcp_embed_job``: records the prompts per job, answers per ``mode``."""
+    calls = []
+    state = {"mode": "ok"}
+
+    async def embed_job(session, config, texts):
+        calls.append(list(texts))
+        if len(texts) > 1 and state["mode"] == "fail":
+            raise RuntimeError("llm_mcp job failed: provider timeout")
+        if len(texts) > 1 and state["mode"] == "unsupported":
+            return []
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(llm_backend, "_mcp_embed_job", embed_job)
+    monkeypatch.setattr(llm_backend, "_mcp_multi_prompt_off_until", 0.0)
+    return calls, state
+
+
+def _embed(texts):
+    return asyncio.run(llm_backend._mcp_embed(None, CONFIG, texts))
+
+
+def test_failed_multi_prompt_job_does_not_disable_batching(jobs):
+    calls, state = jobs
+    state["mode"] = "fail"
+    assert _embed(["a", "bb"]) == [[1.0], [2.0]]
+    assert calls == [["a", "bb"], ["a"], ["bb"]]
+
+    state["mode"] = "ok"
+    calls.clear()
+    assert _embed(["a", "bb"]) == [[1.0], [2.0]]
+    assert calls == [["a", "bb"]]
+
+
+def test_unsupported_prompts_disable_batching_until_retry(jobs, monkeypatch):
+    calls, state = jobs
+    state["mode"] = "unsupported"
+    assert _embed(["a", "bb"]) == [[1.0], [2.0]]
+    assert calls == [["a", "bb"], ["a"], ["bb"]]
+
+    off_until = llm_backend._mcp_multi_prompt_off_until
+    assert off_until > time.monotonic() + llm_backend.MULTI_PROMPT_RETRY_SEC - 60
+
+    calls.clear()
+    _embed(["a", "bb"])
+    assert calls == [["a"], ["bb"]]
+
+    # llm_mcp upgraded meanwhile: the next probe after the cooldown batches again
+    state["mode"] = "ok"
+    monkeypatch.setattr(llm_backend, "_mcp_multi_prompt_off_until", time.monotonic() - 1)
+    calls.clear()
+    _embed(["a", "bb"])
+    assert calls == [["a", "bb"]]
@@ -0,0 +1,125 @@
+"""Partition naming, period arithmetic and which partitions retention expires."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from worker import partitions
+from worker.partitions import _parse_partition_start, next_period, partition_name, period_start
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "start, period, end",
+    [
+        (_utc(2026, 1, 31), "day", _utc(2026, 2, 1)),
+        (_utc(2028, 2, 28), "day", _utc(2028, 2, 29)),
+        (_utc(2026, 12, 31), "day", _utc(2027, 1, 1)),
+        (_utc(2026, 1, 1), "month", _utc(2026, 2, 1)),
+        (_utc(2026, 12, 1), "month", _utc(2027, 1, 1)),
+    ],
+)
+def test_next_period(start, period, end):
+    assert next_period(start, period) == end
+
+
+def test_period_start_is_utc():
+    # 01:30 in Moscow on February 1 is still January 31 in UTC
+    ts = datetime(2026, 2, 1, 1, 30, tzinfo=timezone(timedelta(hours=3)))
+    assert period_start(ts, "day") == _utc(2026, 1, 31)
+    assert period_start(ts, "month") == _utc(2026, 1, 1)
+
+
+@pytest.mark.parametrize(
+    "table, start, period, name",
+    [
+        ("quotes", _utc(2026, 1, 5), "day", "quotes_p20260105"),
+        ("candles", _utc(2026, 11, 1), "month", "candles_p202611"),
+        ("order_book_snapshots", _utc(2027, 1, 1), "day", "order_book_snapshots_p20270101"),
+    ],
+)
+def test_partition_name_round_trip(table, start, period, name):
+    assert partition_name(table, start, period) == name
+    assert _parse_partition_start(table, name, period) == start
+
+
+@pytest.mark.parametrize(
+    "table, name, period",
+    [
+        # the default partition and partitions detached by retention
+        ("quotes", "quotes_default", "day"),
+        ("quotes", "quotes_p20260105_archived", "day"),
+        ("quotes", "quotes_p20260105_archived2", "day"),
+        # another table's partition that shares a suffix
+        ("trades", "last_trades_p202601", "month"),
+        # a partition of the other period length
+        ("quotes", "quotes_p202601", "day"),
+        ("candles", "candles_p20260105", "month"),
+    ],
+)
+def test_foreign_names_are_not_parsed(table, name, period):
+    assert _parse_partition_start(table, name, period) is None
+
+
+class FakeConn:
+    """Every partition ahead already exists and the default partition is empty."""
+
+    def __init__(self, names):
+        self.names = names
+        self.executed = []
+
+    async def fetchval(self, sql, *args):
+        if "to_regclass" in sql:
+            # *_archived names are free, so archive_partition takes the first one
+            return not args[0].endswith(partitions.ARCHIVED_SUFFIX)
+        return None
+
+    async def fetch(self, sql, *args):
+        return [{"relname": name} for name in self.names]
+
+    async def execute(self, sql, *args):
+        self.executed.append(" ".join(sql.split()))
+
+    def transaction(self):
+        return FakeTransaction()
+
+
+class FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.mark.parametrize("mode", ["drop", "detach"])
+def test_retention_expires_whole_periods_only(mode):
+    today = period_start(datetime.now(timezone.utc), "day")
+    names = [partition_name("quotes", today - timedelta(days=days), "day") for days in (9, 8, 7, 6, 0)]
+    conn = FakeConn(names + ["quotes_default", "quotes_p20200101_archived"])
+    config = SimpleNamespace(
+        partition_premake=1,
+        partition_retention={"quotes": 7},
+        partition_retention_mode=mode,
+    )
+
+    asyncio.run(partitions.maintain_table(conn, "quotes", "day", config))
+
+    # a partition goes once its whole day is older than the retention window
+    expired = names[:2]
+    if mode == "drop":
+        assert conn.executed == [f"DROP TABLE {name}" for name in expired]
+    else:
+        assert conn.executed == [
+            statement
+            for name in expired
+            for statement in (
+                f"ALTER TABLE quotes DETACH PARTITION {name}",
+                f"ALTER TABLE {name} RENAME TO {name}_archived",
+            )
+        ]
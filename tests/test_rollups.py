@@ -0,0 +1,181 @@
+"""Rollup watermark: rows are folded once, and never past a writer still in progress.
+
+The fake connection below replays the bound queries of ``refresh_source`` on
+a list of ``(xid, id)`` rows. The tests marked ``needs_db`` run the real SQL
+with concurrent writers; they need a ``bcs_market`` database initialized
+from ``db/init`` and are skipped unless ``BCS_TEST_MARKET_DSN`` points at
+one. They work in a scratch schema that is dropped afterwards.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+
+import asyncpg
+import pytest
+
+from worker import rollups
+
+DSN = os.getenv("BCS_TEST_MARKET_DSN")
+
+
+class FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeConn:
+    def __init__(self, rows, horizon, mark=None):
+        self.rows = sorted(rows)
+        self.horizon = horizon
+        self.mark = mark
+        self.folded = []
+
+    def transaction(self):
+        return FakeTransaction()
+
+    async def fetchrow(self, sql, *args):
+        if "rollup_watermarks" in sql:
+            return None if self.mark is None else {"xid": self.mark[0], "id": self.mark[1]}
+        after, horizon, chunk = args[:2], args[2], args[3]
+        settled = [row for row in self.rows if row > after and row[0] < horizon]
+        if len(settled) < chunk:
+            return None
+        xid, id_ = settled[chunk - 1]
+        return {"xid": xid, "id": id_}
+
+    async def fetchval(self, sql, *args):
+        if "pg_snapshot_xmin" in sql:
+            return self.horizon
+        after, upto = args[:2], args[2:4]
+        batch = [row for row in self.rows if after < row <= upto]
+        self.folded.extend(batch)
+        return len(batch)
+
+    async def execute(self, sql, source, xid, id_):
+        self.mark = (xid, id_)
+
+
+def test_chunks_stop_at_the_oldest_running_writer():
+    # xid 9 is still writing; so is 8, which has no row yet
+    conn = FakeConn([(5, 1), (5, 2), (6, 4), (7, 3), (9, 5)], horizon=8)
+
+    folded = asyncio.run(rollups.refresh_source(conn, "last_trades", chunk=2))
+
+    assert folded == 4
+    assert conn.folded == [(5, 1), (5, 2), (6, 4), (7, 3)]
+    # everything below the horizon is settled, so the watermark moves up to it
+    assert conn.mark == (8, 0)
+
+    # xid 8 commits a row with an id below the ones already folded; 9 finishes
+    conn.rows = sorted(conn.rows + [(8, 2)])
+    conn.horizon = 12
+    assert asyncio.run(rollups.refresh_source(conn, "last_trades", chunk=2)) == 2
+    assert conn.folded[4:] == [(8, 2), (9, 5)]
+    assert conn.mark == (12, 0)
+
+
+def test_writer_older_than_the_watermark_blocks_the_pass():
+    conn = FakeConn([(5, 1), (8, 2)], horizon=7, mark=(7, 0))
+
+    assert asyncio.run(rollups.refresh_source(conn, "last_trades", chunk=100)) == 0
+    assert conn.folded == []
+    assert conn.mark == (7, 0)
+
+
+@pytest.mark.parametrize("source", list(rollups.SOURCES))
+def test_rollup_sql_takes_the_half_open_range(source):
+    sql = rollups.rollup_sql(source)
+    assert f"FROM {source}" in sql
+    assert "WHERE (xid, id) > ($1, $2) AND (xid, id) <= ($3, $4)" in sql
+
+
+needs_db = pytest.mark.skipif(not DSN, reason="BCS_TEST_MARKET_DSN is not set")
+
+TABLES = ("last_trades", "quotes", "ohlcv_rollups", "rollup_watermarks")
+
+
+async def _connect(schema):
+    return await asyncpg.connect(DSN, server_settings={"search_path": schema})
+
+
+async def _with_schema(scenario):
+    schema = f"rollup_test_{uuid.uuid4().hex[:8]}"
+    admin = await asyncpg.connect(DSN)
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    try:
+        for table in TABLES:
+            await admin.execute(f"CREATE TABLE {schema}.{table} (LIKE public.{table} INCLUDING ALL)")
+        await scenario(schema)
+    finally:
+        await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+        await admin.close()
+
+
+TS = datetime(2026, 1, 5, 10, 0, 0, tzinfo=timezone.utc)
+
+
+async def _trade(conn, price, second=0):
+    await conn.execute(
+        "INSERT INTO last_trades (ticker, class_code, ts, price, quantity) VALUES ('SBER', 'TQBR', $1, $2, 1)",
+        TS.replace(second=second),
+        price,
+    )
+
+
+async def _minute_bar(conn):
+    return await conn.fetchrow(
+        "SELECT open, close, count FROM ohlcv_rollups WHERE source = 'last_trades' AND bucket_sec = 60"
+    )
+
+
+@needs_db
+def test_row_of_a_slow_writer_is_not_skipped():
+    async def scenario(schema):
+        slow, fast, worker = [await _connect(schema) for _ in range(3)]
+        try:
+            slow_tx = slow.transaction()
+            await slow_tx.start()
+            # the slow writer draws its id first and commits last
+            await _trade(slow, 10, second=1)
+            await _trade(fast, 20, second=2)
+
+            assert await rollups.refresh_source(worker, "last_trades", chunk=1000) == 0
+            assert await rollups.refresh_source(worker, "last_trades", chunk=1000) == 0
+            assert await _minute_bar(worker) is None
+
+            await slow_tx.commit()
+            assert await rollups.refresh_source(worker, "last_trades", chunk=1000) == 2
+            bar = await _minute_bar(worker)
+            assert (bar["open"], bar["close"], bar["count"]) == (10, 20, 2)
+
+            # nothing is counted twice
+            assert await rollups.refresh_source(worker, "last_trades", chunk=1000) == 0
+        finally:
+            for conn in (slow, fast, worker):
+                await conn.close()
+
+    asyncio.run(_with_schema(scenario))
+
+
+@needs_db
+def test_backlog_is_folded_in_chunks():
+    async def scenario(schema):
+        conn = await _connect(schema)
+        try:
+            for i in range(7):
+                await _trade(conn, 100 + i, second=i)
+
+            assert await rollups.refresh_source(conn, "last_trades", chunk=3) == 7
+            bar = await _minute_bar(conn)
+            assert (bar["open"], bar["close"], bar["count"]) == (100, 106, 7)
+            mark = await conn.fetchrow("SELECT last_xid, last_id FROM rollup_watermarks WHERE source = 'last_trades'")
+            assert mark["last_id"] == 0 and mark["last_xid"] > 0
+        finally:
+            await conn.close()
+
+    asyncio.run(_with_schema(scenario))
@@ -0,0 +1,67 @@
+"""``scripts/run.py --serve``: request timeouts."""
+
+import importlib.util
+import io
+import json
+import signal
+import time
+import types
+from pathlib import Path
+
+import pytest
+
+RUN = Path(__file__).resolve().parent.parent / "scripts" / "run.py"
+
+
+@pytest.fixture
+def run_module():
+    spec = importlib.util.spec_from_file_location("script_runner", RUN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    previous = signal.getsignal(signal.SIGALRM)
+    yield module
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    signal.signal(signal.SIGALRM, previous)
+
+
+def _serve(run_module, monkeypatch, script, requests):
+    monkeypatch.setattr(run_module.ScriptCache, "preload", lambda self: None)
+    monkeypatch.setattr(run_module, "resolve", lambda cache, name: (script, None))
+    monkeypatch.setattr("sys.stdin", io.StringIO("".join(json.dumps(r) + "\n" for r in requests)))
+    out = io.StringIO()
+    monkeypatch.setattr("sys.stdout", out)
+    run_module.serve()
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_timeout_is_not_swallowed_by_script(run_module, monkeypatch):
+    def run(payload):
+        # like signal_score.run_batch: every item guarded by its own except
+        results = []
+        for _ in range(1000):
+            try:
+                time.sleep(0.01)
+            except Exception as exc:
+                results.append(str(exc))
+        return results
+
+    script = types.SimpleNamespace(run=run)
+    replies = _serve(run_module, monkeypatch, script, [{"id": 1, "name": "slow", "payload": {}, "timeoutMs": 50}])
+    assert replies == [{"id": 1, "ok": False, "error": "script timed out after 50 ms"}]
+
+
+def test_timer_is_disarmed_after_the_call(run_module, monkeypatch):
+    def run(payload):
+        if payload.get("fail"):
+            raise ValueError("bad payload")
+        return payload
+
+    script = types.SimpleNamespace(run=run)
+    requests = [
+        {"id": 1, "name": "s", "payload": {"fail": True}, "timeoutMs": 50},
+        {"id": 2, "name": "s", "payload": {"x": 1}, "timeoutMs": 50},
+    ]
+    replies = _serve(run_module, monkeypatch, script, requests)
+    assert replies[0] == {"id": 1, "ok": False, "error": "bad payload"}
+    assert replies[1] == {"id": 2, "ok": True, "result": {"x": 1}}
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
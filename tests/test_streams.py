@@ -0,0 +1,103 @@
+"""Market subscriptions sharded across connections and processes."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from worker.streams import MARKET_WS_URL, MarketStream, shard_instruments
+
+
+def _instruments(count):
+    return [{"ticker": f"T{i:03d}", "class_code": "TQBR"} for i in range(count)]
+
+
+@pytest.mark.parametrize("count", [0, 1, 100, 101, 250])
+@pytest.mark.parametrize("per_connection", [0, 1, 100])
+@pytest.mark.parametrize("processes", [1, 3, 8])
+def test_every_instrument_lands_in_exactly_one_shard(count, per_connection, processes):
+    instruments = _instruments(count)
+
+    owned = [shard_instruments(instruments, per_connection, index, processes) for index in range(processes)]
+
+    shards = sorted((n, shard) for own in owned for n, shard in own)
+    assert [n for n, _ in shards] == list(range(len(shards)))
+    assert [i for _, shard in shards for i in shard] == instruments
+    assert all(len(shard) <= per_connection for _, shard in shards if per_connection)
+    if per_connection == 0 and count:
+        assert len(shards) == 1
+    # round-robin: no process has more than one shard more than another
+    sizes = [len(own) for own in owned]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_shards_are_dealt_round_robin():
+    owned = shard_instruments(_instruments(10), 2, process_index=1, process_count=3)
+    assert [(n, [i["ticker"] for i in shard]) for n, shard in owned] == [(1, ["T002", "T003"]), (4, ["T008", "T009"])]
+
+
+class FakeSupervisor:
+    def __init__(self):
+        self.connections = []
+
+    async def run_connection(self, name, url, on_message, on_open=None):
+        self.connections.append((name, url, on_open))
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, text):
+        self.sent.append(json.loads(text))
+
+
+def _config(**overrides):
+    values = dict(
+        subscribe_instruments=_instruments(5),
+        market_instruments_per_conn=2,
+        market_process_index=0,
+        market_processes=1,
+        json_decoder="json",
+        store_raw=set(),
+        store_orderbook=False,
+        store_candles=False,
+        store_last_trades=True,
+        store_quotes=True,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def _run(config):
+    supervisor = FakeSupervisor()
+    stream = MarketStream(supervisor, None, config, SimpleNamespace(synth=None))
+    asyncio.run(stream.run())
+    return supervisor.connections
+
+
+def test_one_connection_per_shard_subscribes_its_own_instruments():
+    connections = _run(_config())
+
+    assert [name for name, _, _ in connections] == ["market.0", "market.1", "market.2"]
+    assert all(url == MARKET_WS_URL for _, url, _ in connections)
+
+    subscribed = []
+    for _, _, on_open in connections:
+        ws = FakeSocket()
+        asyncio.run(on_open(ws))
+        # last trades and quotes, both for the same instruments
+        assert [m["dataType"] for m in ws.sent] == [2, 3]
+        assert ws.sent[0]["instruments"] == ws.sent[1]["instruments"]
+        subscribed.append([i["ticker"] for i in ws.sent[0]["instruments"]])
+    assert subscribed == [["T000", "T001"], ["T002", "T003"], ["T004"]]
+
+
+def test_unsharded_connection_keeps_its_name():
+    assert [name for name, _, _ in _run(_config(market_instruments_per_conn=0))] == ["market"]
+
+
+def test_process_without_shards_opens_nothing():
+    config = _config(market_instruments_per_conn=0, market_processes=2, market_process_index=1)
+    assert _run(config) == []
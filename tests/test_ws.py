@@ -0,0 +1,129 @@
+"""WsSupervisor: reconnect backoff, its reset after a stable connection, health counters."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from worker import ws as ws_module
+from worker.ws import WsSupervisor
+
+
+class Stop(BaseException):
+    """Ends ``run_connection``; a BaseException so it is not taken for a dropped connection."""
+
+
+class FakeAuth:
+    async def get_access_token(self):
+        return "token"
+
+
+class FakeSocket:
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for message in self.messages:
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+
+def _config(**overrides):
+    values = dict(ws_backoff_base_ms=250, ws_backoff_max_ms=5000, ws_stable_sec=30, ws_open_timeout_sec=10)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def _run(monkeypatch, config, attempts, sleeps_before_stop):
+    """Runs one connection; ``attempts`` lists what each connect does: an exception or messages."""
+    attempts = list(attempts)
+    sleeps = []
+    received = []
+    opened = []
+
+    def connect(url, **kwargs):
+        assert kwargs["extra_headers"] == {"Authorization": "Bearer token"}
+        outcome = attempts.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeSocket(outcome)
+
+    async def sleep(delay):
+        sleeps.append(delay)
+        if len(sleeps) >= sleeps_before_stop:
+            raise Stop
+
+    async def on_message(message):
+        received.append(message)
+
+    async def on_open(ws):
+        opened.append(ws)
+
+    monkeypatch.setattr(ws_module.websockets, "connect", connect)
+    monkeypatch.setattr(ws_module, "asyncio", SimpleNamespace(sleep=sleep, CancelledError=asyncio.CancelledError))
+    # the top of every jittered range
+    monkeypatch.setattr(ws_module.random, "uniform", lambda low, high: high)
+
+    supervisor = WsSupervisor(FakeAuth(), config)
+    with pytest.raises(Stop):
+        asyncio.run(supervisor.run_connection("market", "wss://example/ws", on_message, on_open))
+    return supervisor.connections["market"], sleeps, received, opened
+
+
+def test_backoff_is_full_jitter_under_a_doubling_cap(monkeypatch):
+    supervisor = WsSupervisor(FakeAuth(), _config())
+    ranges = []
+    monkeypatch.setattr(ws_module.random, "uniform", lambda low, high: ranges.append((low, high)) or high)
+
+    delays = [supervisor.backoff(failures) for failures in range(8)]
+
+    assert delays == [0.25, 0.5, 1.0, 2.0, 4.0, 5.0, 5.0, 5.0]
+    assert all(low == 0 for low, _ in ranges)
+
+
+def test_failed_connects_back_off_further(monkeypatch):
+    refused = ConnectionRefusedError("connection refused")
+
+    health, sleeps, _, opened = _run(monkeypatch, _config(), [refused] * 5, sleeps_before_stop=5)
+
+    assert sleeps == [0.25, 0.5, 1.0, 2.0, 4.0]
+    assert opened == []
+    assert (health.connects, health.disconnects, health.connected) == (0, 0, False)
+    assert health.last_error == "connection refused"
+
+
+def test_stable_connection_resets_the_backoff(monkeypatch):
+    refused = ConnectionRefusedError("connection refused")
+    attempts = [refused, refused, ["a", "b"], refused]
+
+    health, sleeps, received, opened = _run(monkeypatch, _config(ws_stable_sec=0), attempts, sleeps_before_stop=4)
+
+    # the drop after a stable connection starts again from the first step
+    assert sleeps == [0.25, 0.5, 0.25, 0.5]
+    assert received == ["a", "b"]
+    assert len(opened) == 1
+    assert (health.connects, health.disconnects, health.messages) == (1, 1, 2)
+    assert health.last_error == "connection refused"
+
+
+def test_short_lived_connection_keeps_backing_off(monkeypatch):
+    attempts = [["a"], ["b", ConnectionResetError("reset")], ["c"]]
+
+    health, sleeps, received, _ = _run(monkeypatch, _config(ws_stable_sec=3600), attempts, sleeps_before_stop=3)
+
+    assert sleeps == [0.25, 0.5, 1.0]
+    assert received == ["a", "b", "c"]
+    assert (health.connects, health.disconnects) == (3, 3)
+    assert health.last_error == "closed by server"
+    # gap from the last message before a drop to the first after the reconnect
+    assert health.last_gap_sec is not None and health.last_gap_sec >= 0
@@ -8,22 +8,48 @@ from .logger import get_logger
 
 log = get_logger("worker.auth")
 
+# floor for the proactive refresh period, so a token without expires_in does not spin
+MIN_REFRESH_SEC = 10
+RETRY_MAX_SEC = 60
+
 
 class AuthClient:
-    def __init__(self, refresh_token: str, client_id: str):
+    def __init__(self, refresh_token: str, client_id: str, refresh_margin_sec: int = 60):
         self.refresh_token = refresh_token
         self.client_id = client_id
+        self.refresh_margin_sec = refresh_margin_sec
         self._access_token: Optional[str] = None
         self._expires_at: float = 0.0
         self._lock = asyncio.Lock()
 
     async def get_access_token(self) -> str:
         async with self._lock:
-            if self._access_token and time.time() < self._expires_at - 60:
+            if self._access_token and time.time() < self._expires_at - self.refresh_margin_sec:
                 return self._access_token
             await self._refresh()
             return self._access_token
 
+    async def run_refresh(self):
+        """Refreshes the token ``refresh_margin_sec`` before it expires, so
+        ``get_access_token`` (and websocket reconnects) never wait on the endpoint."""
+        failures = 0
+        while True:
+            try:
+                async with self._lock:
+                    # get_access_token may have refreshed it meanwhile
+                    if not self._access_token or time.time() >= self._expires_at - self.refresh_margin_sec:
+                        await self._refresh()
+                failures = 0
+            except Exception as exc:
+                failures += 1
+                retry = min(RETRY_MAX_SEC, 2**failures)
+                log.error(f"token.refresh.error error={exc} retry_in={retry}")
+                await asyncio.sleep(retry)
+                continue
+            # a token shorter than the margin (or without expires_in) still waits the floor
+            delay = self._expires_at - self.refresh_margin_sec - time.time()
+            await asyncio.sleep(max(MIN_REFRESH_SEC, delay))
+
     async def _refresh(self):
         log.debug("token.refresh.start")
         async with aiohttp.ClientSession() as session:
@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SeriesKey = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+# sorts before every real bar; aware, like the parsed timestamps it is compared with
+MISSING_TS = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _ts(data: Dict[str, Any]) -> datetime:
+    """``dateTime`` as an aware UTC datetime (no offset means UTC), ``MISSING_TS`` if absent or bad."""
+    value = data.get("dateTime")
+    if not isinstance(value, str):
+        return MISSING_TS
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return MISSING_TS
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+class CandleCoalescer:
+    """Collapses repeated updates of a still-forming candle.
+
+    The feed resends the open bar of every ``(ticker, class_code, time_frame)``
+    series many times. Only the latest state of each open bar is kept and
+    handed out by ``take_dirty`` (called once per flush interval). When a newer
+    bar arrives the previous one is closed and returned from ``update`` right
+    away, so the final OHLCV is always written.
+    """
+
+    def __init__(self):
+        self._open: Dict[SeriesKey, Dict[str, Any]] = {}
+        self._dirty: set = set()
+        self.updates = 0
+        self.closed = 0
+
+    @staticmethod
+    def series_key(data: Dict[str, Any]) -> SeriesKey:
+        return (data.get("ticker"), data.get("classCode"), data.get("timeFrame"))
+
+    def update(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Store the latest bar state; returns bars that must be written now."""
+        self.updates += 1
+        key = self.series_key(data)
+        current = self._open.get(key)
+        if current is None or current.get("dateTime") == data.get("dateTime"):
+            self._open[key] = data
+            self._dirty.add(key)
+            return []
+        if _ts(data) < _ts(current):
+            # late resend of a bar that is already closed
+            return [data]
+        self._open[key] = data
+        self._dirty.add(key)
+        self.closed += 1
+        return [current]
+
+    def take_dirty(self) -> List[Dict[str, Any]]:
+        """Latest state of every open bar changed since the previous call."""
+        bars = [self._open[key] for key in self._dirty]
+        self._dirty.clear()
+        return bars
+
+    def stats(self) -> Dict[str, int]:
+        return {"open": len(self._open), "updates": self.updates, "closed": self.closed}
+
+
+# intraday timeframes -> bar length in seconds; D/W/MN follow the calendar
+TIMEFRAME_SECONDS = {"M1": 60, "M5": 300, "M15": 900, "M30": 1800, "H1": 3600, "H4": 14400}
+TIMEFRAMES = (*TIMEFRAME_SECONDS, "D", "W", "MN")
+DAY = 86400
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _epoch(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - EPOCH).total_seconds()
+
+
+def bar_start_epoch(epoch: float, time_frame: str, utc_offset_sec: int) -> int:
+    """Start (UTC epoch seconds) of the ``time_frame`` bar holding ``epoch``;
+    bars follow the exchange clock, ``utc_offset_sec`` ahead of UTC."""
+    local = int(epoch // 1) + utc_offset_sec
+    seconds = TIMEFRAME_SECONDS.get(time_frame)
+    if seconds is not None:
+        return local - local % seconds - utc_offset_sec
+    day = local - local % DAY
+    if time_frame == "D":
+        return day - utc_offset_sec
+    if time_frame == "W":
+        # 1970-01-01 was a Thursday
+        return day - (day // DAY + 3) % 7 * DAY - utc_offset_sec
+    if time_frame == "MN":
+        date = datetime.fromtimestamp(day, timezone.utc)
+        return int(_epoch(datetime(date.year, date.month, 1, tzinfo=timezone.utc))) - utc_offset_sec
+    raise ValueError(f"unknown time frame: {time_frame}")
+
+
+def bar_start(ts: datetime, time_frame: str, utc_offset: timedelta) -> datetime:
+    """``bar_start_epoch`` for datetimes."""
+    offset = int(utc_offset.total_seconds())
+    return datetime.fromtimestamp(bar_start_epoch(_epoch(ts), time_frame, offset), timezone.utc)
+
+
+class CandleSynthesizer:
+    """Builds candles of several timeframes from the trade stream.
+
+    Every trade updates the open bar of each ``(ticker, class_code, time_frame)``
+    series. ``update`` returns the bars to hand on right away: a bar that a
+    newer trade has closed, plus the first state of the bar that replaced it
+    (so a ``FeatureTracker`` sees the close). The latest state of open bars is
+    available from ``take_dirty``, like with ``CandleCoalescer``. Trades older
+    than the open bar of a series are counted as ``late`` and skipped: its
+    previous bars are final already.
+
+    The first bar of every series only holds the trades seen since start, so
+    it carries ``"_partial": True``: it is merged into a stored bar of the same
+    period instead of replacing it (``Db.upsert_candles_batch``).
+    """
+
+    def __init__(self, time_frames: Iterable[str], utc_offset_min: int = 0):
+        self.time_frames = [tf for tf in TIMEFRAMES if tf in set(time_frames)]
+        self.utc_offset_sec = utc_offset_min * 60
+        self._open: Dict[SeriesKey, Dict[str, Any]] = {}
+        # (bar start, epoch of the first and of the last trade) of every open bar
+        self._span: Dict[SeriesKey, Tuple[int, float, float]] = {}
+        self._dirty: set = set()
+        self.trades = 0
+        self.closed = 0
+        self.late = 0
+
+    def update(self, trade: Dict[str, Any]) -> List[Dict[str, Any]]:
+        price = trade.get("price")
+        ts = _ts(trade)
+        if price is None or ts == MISSING_TS:
+            return []
+        epoch = _epoch(ts)
+        self.trades += 1
+        quantity = trade.get("quantity") or 0
+        ticker, class_code = trade.get("ticker"), trade.get("classCode")
+        out: List[Dict[str, Any]] = []
+        for time_frame in self.time_frames:
+            key = (ticker, class_code, time_frame)
+            start = bar_start_epoch(epoch, time_frame, self.utc_offset_sec)
+            bar = self._open.get(key)
+            if bar is not None:
+                bar_ts, first, last = self._span[key]
+                if start < bar_ts:
+                    self.late += 1
+                    continue
+                if start == bar_ts:
+                    if price > bar["high"]:
+                        bar["high"] = price
+                    if price < bar["low"]:
+                        bar["low"] = price
+                    bar["volume"] += quantity
+                    if epoch < first:
+                        bar["open"] = price
+                        first = epoch
+                    if epoch >= last:
+                        bar["close"] = price
+                        last = epoch
+                    self._span[key] = (bar_ts, first, last)
+                    self._dirty.add(key)
+                    continue
+                out.append(dict(bar))
+                self.closed += 1
+            bar = {
+                "ticker": ticker,
+                "classCode": class_code,
+                "timeFrame": time_frame,
+                "dateTime": datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "open": price,
+                "high": price,
+                "low": price,
+                "close": price,
+                "volume": quantity,
+                # built here, there is no broker message to keep
+                "_raw": None,
+            }
+            if key not in self._open:
+                bar["_partial"] = True
+            self._open[key] = bar
+            self._span[key] = (start, epoch, epoch)
+            self._dirty.discard(key)
+            out.append(dict(bar))
+        return out
+
+    def take_dirty(self) -> List[Dict[str, Any]]:
+        bars = [dict(self._open[key]) for key in self._dirty]
+        self._dirty.clear()
+        return bars
+
+    def stats(self) -> Dict[str, int]:
+        return {"open": len(self._open), "trades": self.trades, "closed": self.closed, "late": self.late}
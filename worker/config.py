@@ -22,6 +22,36 @@ def _int(key: str, default: int) -> int:
         return default
 
 
+def _set(key: str, default: str = "") -> set:
+    """Parse ``a,b,c`` into a set of names; an empty value gives an empty set."""
+    return {item.strip() for item in os.getenv(key, default).split(",") if item.strip()}
+
+
+def _int_map(key: str) -> dict:
+    """Parse ``name=value,name=value`` into a dict of ints, skipping bad items."""
+    out = {}
+    for item in os.getenv(key, "").split(","):
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip():
+            continue
+        try:
+            out[name.strip()] = int(value)
+        except ValueError:
+            continue
+    return out
+
+
+def _str_map(key: str, default: str = "") -> dict:
+    """Parse ``name=value,name=value`` into a dict of lowercased strings; ``key`` overrides ``default`` per name."""
+    out = {}
+    for raw in (default, os.getenv(key, "")):
+        for item in raw.split(","):
+            name, sep, value = item.partition("=")
+            if sep and name.strip() and value.strip():
+                out[name.strip()] = value.strip().lower()
+    return out
+
+
 @dataclass
 class Config:
     refresh_token: str
@@ -39,11 +69,22 @@ class Config:
     stream_orders: bool
     stream_limits: bool
     stream_marginal: bool
+    market_instruments_per_conn: int
+    market_processes: int
+    market_process_index: int
+    ws_backoff_base_ms: int
+    ws_backoff_max_ms: int
+    ws_stable_sec: int
+    ws_open_timeout_sec: int
+    ws_stats_sec: int
+    token_refresh_margin_sec: int
 
     store_orderbook: bool
     store_quotes: bool
     store_last_trades: bool
     store_candles: bool
+    store_raw: set
+    json_decoder: str
 
     subscribe_instruments: list
     use_db_instruments: bool
@@ -55,8 +96,45 @@ class Config:
     llm_mcp_provider: str
     llm_backend_fallback_ollama: bool
     llm_backend_timeout_sec: int
+    llm_mcp_batch_embed: bool
+    llm_mcp_job_wait_sec: int
+    embedding_concurrency: int
+    embedding_batch_size: int
+    embedding_cache: bool
+    embedding_cache_size: int
+    embedding_lease_sec: int
+    embedding_max_attempts: int
+    embedding_retry_sec: int
+    vector_index: str
+    vector_index_min_rows: int
+    vector_index_check_sec: int
 
     candle_time_frame: str
+    candle_flush_ms: int
+    candle_synth_timeframes: set
+    candle_utc_offset_min: int
+
+    ingest_batch_size: int
+    ingest_flush_ms: int
+    ingest_queue_max: int
+    ingest_overload: dict
+    spool_dir: str
+    spool_segment_mb: int
+    spool_max_mb: int
+    spool_fsync_ms: int
+    spool_retry_sec: int
+    ingest_stats_sec: int
+    latest_flush_ms: int
+    features_lookback: int
+    features_flush_sec: int
+
+    rollup_refresh_sec: int
+    rollup_chunk_rows: int
+
+    partition_check_sec: int
+    partition_premake: int
+    partition_retention: dict
+    partition_retention_mode: str
 
 
 def load_config() -> Config:
@@ -86,10 +164,21 @@ def load_config() -> Config:
         stream_orders=_bool("BCS_STREAM_ORDERS", False),
         stream_limits=_bool("BCS_STREAM_LIMITS", False),
         stream_marginal=_bool("BCS_STREAM_MARGINAL", False),
+        market_instruments_per_conn=_int("BCS_MARKET_INSTRUMENTS_PER_CONN", 0),
+        market_processes=max(1, _int("BCS_MARKET_PROCESSES", 1)),
+        market_process_index=_int("BCS_MARKET_PROCESS_INDEX", 0),
+        ws_backoff_base_ms=_int("BCS_WS_BACKOFF_BASE_MS", 500),
+        ws_backoff_max_ms=_int("BCS_WS_BACKOFF_MAX_MS", 30000),
+        ws_stable_sec=_int("BCS_WS_STABLE_SEC", 30),
+        ws_open_timeout_sec=_int("BCS_WS_OPEN_TIMEOUT_SEC", 10),
+        ws_stats_sec=_int("BCS_WS_STATS_SEC", 60),
+        token_refresh_margin_sec=_int("BCS_TOKEN_REFRESH_MARGIN_SEC", 120),
         store_orderbook=_bool("BCS_STORE_ORDERBOOK", True),
         store_quotes=_bool("BCS_STORE_QUOTES", True),
         store_last_trades=_bool("BCS_STORE_LAST_TRADES", True),
         store_candles=_bool("BCS_STORE_CANDLES", True),
+        store_raw=_set("BCS_STORE_RAW", "quotes,last_trades,candles"),
+        json_decoder=os.getenv("BCS_JSON_DECODER", "auto").strip().lower() or "auto",
         subscribe_instruments=instruments,
         use_db_instruments=_bool("BCS_USE_DB_INSTRUMENTS", False),
         ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434"),
@@ -99,5 +188,45 @@ def load_config() -> Config:
         llm_mcp_provider=os.getenv("LLM_MCP_PROVIDER", "auto").strip().lower() or "auto",
         llm_backend_fallback_ollama=_bool("LLM_BACKEND_FALLBACK_OLLAMA", True),
         llm_backend_timeout_sec=_int("LLM_BACKEND_TIMEOUT_SEC", 30),
+        llm_mcp_batch_embed=_bool("LLM_MCP_BATCH_EMBED", True),
+        llm_mcp_job_wait_sec=_int("LLM_MCP_JOB_WAIT_SEC", 20),
+        embedding_concurrency=_int("BCS_EMBEDDING_CONCURRENCY", 4),
+        embedding_batch_size=_int("BCS_EMBEDDING_BATCH_SIZE", 16),
+        embedding_cache=_bool("BCS_EMBEDDING_CACHE", True),
+        embedding_cache_size=_int("BCS_EMBEDDING_CACHE_SIZE", 10000),
+        embedding_lease_sec=_int("BCS_EMBEDDING_LEASE_SEC", 300),
+        embedding_max_attempts=_int("BCS_EMBEDDING_MAX_ATTEMPTS", 5),
+        embedding_retry_sec=_int("BCS_EMBEDDING_RETRY_SEC", 30),
+        vector_index=os.getenv("BCS_VECTOR_INDEX", "hnsw").strip().lower(),
+        vector_index_min_rows=_int("BCS_VECTOR_INDEX_MIN_ROWS", 10000),
+        vector_index_check_sec=_int("BCS_VECTOR_INDEX_CHECK_SEC", 3600),
         candle_time_frame=os.getenv("BCS_CANDLE_TIMEFRAME", "M1"),
+        candle_flush_ms=_int("BCS_CANDLE_FLUSH_MS", 1000),
+        candle_synth_timeframes=_set("BCS_CANDLE_SYNTH_TIMEFRAMES", "M1,M5,M15,M30,H1,H4,D,W,MN"),
+        candle_utc_offset_min=_int("BCS_CANDLE_UTC_OFFSET_MIN", 180),
+        ingest_batch_size=_int("BCS_INGEST_BATCH_SIZE", 500),
+        ingest_flush_ms=_int("BCS_INGEST_FLUSH_MS", 250),
+        ingest_queue_max=_int("BCS_INGEST_QUEUE_MAX", 20000),
+        ingest_overload=_str_map(
+            "BCS_INGEST_OVERLOAD", "orderbook=conflate,quotes=conflate,last_trades=spool,candles=block"
+        ),
+        spool_dir=os.getenv("BCS_SPOOL_DIR", "").strip(),
+        spool_segment_mb=max(1, _int("BCS_SPOOL_SEGMENT_MB", 64)),
+        spool_max_mb=_int("BCS_SPOOL_MAX_MB", 2048),
+        spool_fsync_ms=_int("BCS_SPOOL_FSYNC_MS", 200),
+        spool_retry_sec=max(1, _int("BCS_SPOOL_RETRY_SEC", 5)),
+        ingest_stats_sec=_int("BCS_INGEST_STATS_SEC", 60),
+        latest_flush_ms=_int("BCS_LATEST_FLUSH_MS", 500),
+        features_lookback=_int("BCS_FEATURES_LOOKBACK", 200),
+        features_flush_sec=_int("BCS_FEATURES_FLUSH_SEC", 5),
+        rollup_refresh_sec=_int("BCS_ROLLUP_REFRESH_SEC", 5),
+        rollup_chunk_rows=_int("BCS_ROLLUP_CHUNK_ROWS", 200000),
+        partition_check_sec=_int("BCS_PARTITION_CHECK_SEC", 3600),
+        partition_premake=_int("BCS_PARTITION_PREMAKE", 3),
+        partition_retention=_int_map("BCS_PARTITION_RETENTION_DAYS"),
+        partition_retention_mode=(
+            "drop"
+            if os.getenv("BCS_PARTITION_RETENTION_MODE", "detach").strip().lower() == "drop"
+            else "detach"
+        ),
     )
@@ -1,10 +1,133 @@
+import asyncio
 import asyncpg
+import json
+import struct
+import sys
+from array import array
 from datetime import datetime
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 from .logger import get_logger, sanitize
 
 log = get_logger("worker.db")
 
+# Append-only tables are bulk-loaded with COPY; the column lists match the
+# tuples built by the _*_row helpers below.
+ORDERBOOK_COLUMNS = [
+    "ticker", "class_code", "ts", "depth", "bid_volume", "ask_volume",
+    "bid_prices", "bid_qty", "ask_prices", "ask_qty", "data",
+]
+QUOTES_COLUMNS = [
+    "ticker", "class_code", "ts", "bid", "offer", "last", "open", "close", "high", "low",
+    "change", "change_rate", "currency", "security_trading_status", "data",
+]
+LAST_TRADE_COLUMNS = [
+    "ticker", "class_code", "ts", "side", "price", "quantity", "volume", "data",
+]
+
+# market_latest keeps one row per instrument; each stream updates only its
+# own columns and never moves a section back in time.
+LATEST_QUOTE_UPSERT_SQL = """
+    INSERT INTO market_latest AS l
+      (ticker, class_code, quote_ts, bid, offer, last, open, close, high, low,
+       change, change_rate, currency, security_trading_status, updated_at)
+    VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11,$12,$13,$14, now())
+    ON CONFLICT (ticker, class_code)
+    DO UPDATE SET quote_ts=EXCLUDED.quote_ts, bid=EXCLUDED.bid, offer=EXCLUDED.offer,
+                  last=EXCLUDED.last, open=EXCLUDED.open, close=EXCLUDED.close,
+                  high=EXCLUDED.high, low=EXCLUDED.low, change=EXCLUDED.change,
+                  change_rate=EXCLUDED.change_rate, currency=EXCLUDED.currency,
+                  security_trading_status=EXCLUDED.security_trading_status,
+                  updated_at=EXCLUDED.updated_at
+    WHERE l.quote_ts IS NULL OR l.quote_ts <= EXCLUDED.quote_ts
+"""
+
+LATEST_TRADE_UPSERT_SQL = """
+    INSERT INTO market_latest AS l
+      (ticker, class_code, trade_ts, trade_side, trade_price, trade_quantity, trade_volume, updated_at)
+    VALUES ($1,$2,$3,$4,$5,$6,$7, now())
+    ON CONFLICT (ticker, class_code)
+    DO UPDATE SET trade_ts=EXCLUDED.trade_ts, trade_side=EXCLUDED.trade_side,
+                  trade_price=EXCLUDED.trade_price, trade_quantity=EXCLUDED.trade_quantity,
+                  trade_volume=EXCLUDED.trade_volume, updated_at=EXCLUDED.updated_at
+    WHERE l.trade_ts IS NULL OR l.trade_ts <= EXCLUDED.trade_ts
+"""
+
+LATEST_BOOK_UPSERT_SQL = """
+    INSERT INTO market_latest AS l
+      (ticker, class_code, book_ts, book_depth, bid_volume, ask_volume,
+       bid_prices, bid_qty, ask_prices, ask_qty, updated_at)
+    VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10, now())
+    ON CONFLICT (ticker, class_code)
+    DO UPDATE SET book_ts=EXCLUDED.book_ts, book_depth=EXCLUDED.book_depth,
+                  bid_volume=EXCLUDED.bid_volume, ask_volume=EXCLUDED.ask_volume,
+                  bid_prices=EXCLUDED.bid_prices, bid_qty=EXCLUDED.bid_qty,
+                  ask_prices=EXCLUDED.ask_prices, ask_qty=EXCLUDED.ask_qty,
+                  updated_at=EXCLUDED.updated_at
+    WHERE l.book_ts IS NULL OR l.book_ts <= EXCLUDED.book_ts
+"""
+
+INDICATOR_STATE_UPSERT_SQL = """
+    INSERT INTO indicator_state
+      (ticker, class_code, time_frame, lookback, bars, bar_ts, features, state, updated_at)
+    VALUES ($1,$2,$3,$4,$5,$6,$7,$8, now())
+    ON CONFLICT (ticker, class_code, time_frame)
+    DO UPDATE SET lookback=EXCLUDED.lookback, bars=EXCLUDED.bars, bar_ts=EXCLUDED.bar_ts,
+                  features=EXCLUDED.features, state=EXCLUDED.state, updated_at=EXCLUDED.updated_at
+"""
+
+# Failed COPY batches are split in halves down to this size, then inserted
+# row by row so a single bad row costs only its neighbours a retry.
+COPY_MIN_CHUNK = 16
+
+# Upper bound of the exponential pause between embedding attempts.
+EMBEDDING_RETRY_MAX_SEC = 3600
+
+ORDERBOOK_INSERT_SQL = """
+    INSERT INTO order_book_snapshots
+      (ticker, class_code, ts, depth, bid_volume, ask_volume,
+       bid_prices, bid_qty, ask_prices, ask_qty, data)
+    VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11)
+"""
+
+QUOTES_INSERT_SQL = """
+    INSERT INTO quotes
+      (ticker, class_code, ts, bid, offer, last, open, close, high, low,
+       change, change_rate, currency, security_trading_status, data)
+    VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11,$12,$13,$14,$15)
+"""
+
+LAST_TRADE_INSERT_SQL = """
+    INSERT INTO last_trades
+      (ticker, class_code, ts, side, price, quantity, volume, data)
+    VALUES ($1,$2,$3,$4,$5,$6,$7,$8)
+"""
+
+CANDLE_UPSERT_SQL = """
+    INSERT INTO candles
+      (ticker, class_code, time_frame, ts, open, high, low, close, volume, data)
+    VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
+    ON CONFLICT (ticker, class_code, time_frame, ts)
+    DO UPDATE SET open=EXCLUDED.open, high=EXCLUDED.high, low=EXCLUDED.low,
+                  close=EXCLUDED.close, volume=EXCLUDED.volume, data=EXCLUDED.data
+"""
+
+# A synthesized bar that started before the worker did only covers part of its
+# period: it widens the stored bar instead of replacing it. Volume is a lower
+# bound either way, so the larger one wins.
+CANDLE_MERGE_SQL = """
+    INSERT INTO candles
+      (ticker, class_code, time_frame, ts, open, high, low, close, volume, data)
+    VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
+    ON CONFLICT (ticker, class_code, time_frame, ts)
+    DO UPDATE SET open=COALESCE(candles.open, EXCLUDED.open),
+                  high=GREATEST(candles.high, EXCLUDED.high),
+                  low=LEAST(candles.low, EXCLUDED.low),
+                  close=EXCLUDED.close,
+                  volume=GREATEST(candles.volume, EXCLUDED.volume),
+                  data=COALESCE(EXCLUDED.data, candles.data)
+"""
+
 
 def _dt(value: Optional[str]) -> datetime:
     if not value:
@@ -13,8 +136,177 @@ def _dt(value: Optional[str]) -> datetime:
     return datetime.fromisoformat(value.replace("Z", "+00:00"))
 
 
-def _vector_str(vec: List[float]) -> str:
-    return "[" + ",".join(f"{v:.8f}" for v in vec) + "]"
+def is_connection_error(exc: BaseException) -> bool:
+    """True when the error means Postgres is unreachable rather than a bad row."""
+    if isinstance(
+        exc,
+        (
+            OSError,
+            asyncio.TimeoutError,
+            asyncpg.PostgresConnectionError,
+            asyncpg.exceptions.OperatorInterventionError,
+        ),
+    ):
+        return True
+    # client-side encoding errors are both InterfaceError and ValueError
+    return isinstance(exc, asyncpg.InterfaceError) and not isinstance(exc, ValueError)
+
+
+class RawJson(str):
+    """JSON text that is already serialized (e.g. a websocket message) and is
+    written to json/jsonb columns as is."""
+
+
+def _jsonb_encode(value: Any) -> bytes:
+    if isinstance(value, RawJson):
+        return b"\x01" + value.encode("utf-8")
+    return b"\x01" + json.dumps(value).encode("utf-8")
+
+
+def _jsonb_decode(data: bytes) -> Any:
+    return json.loads(data[1:])
+
+
+def _json_encode(value: Any) -> bytes:
+    if isinstance(value, RawJson):
+        return value.encode("utf-8")
+    return json.dumps(value).encode("utf-8")
+
+
+# pgvector binary format: uint16 dim, uint16 unused, then dim big-endian float4
+@lru_cache(maxsize=8)
+def _vector_struct(dim: int) -> struct.Struct:
+    return struct.Struct(f">HH{dim}f")
+
+
+def _vector_encode(value: Any) -> bytes:
+    return _vector_struct(len(value)).pack(len(value), 0, *value)
+
+
+def _vector_decode(data: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(data[4:])
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values.tolist()
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    # JSONB columns receive plain dicts/lists from the streams. Binary format
+    # keeps the codec usable for COPY as well as for regular queries.
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=_jsonb_encode,
+        decoder=_jsonb_decode,
+        schema="pg_catalog",
+        format="binary",
+    )
+    await conn.set_type_codec(
+        "json",
+        encoder=_json_encode,
+        decoder=json.loads,
+        schema="pg_catalog",
+        format="binary",
+    )
+    # pgvector is installed in bcs_private only; embeddings travel as float4
+    # arrays instead of decimal text in both directions and through COPY
+    vector_schema = await conn.fetchval(
+        """
+        SELECT n.nspname FROM pg_type t JOIN pg_namespace n ON n.oid = t.typnamespace
+        WHERE t.typname = 'vector'
+        """
+    )
+    if vector_schema:
+        await conn.set_type_codec(
+            "vector",
+            encoder=_vector_encode,
+            decoder=_vector_decode,
+            schema=vector_schema,
+            format="binary",
+        )
+
+
+def _raw(data: Dict[str, Any]) -> Any:
+    """Value of the ``data`` column: what the stream decoder kept under
+    ``_raw`` (None when the table does not store raw payloads), or the whole
+    dict for messages that did not come through it."""
+    return data["_raw"] if "_raw" in data else data
+
+
+def _float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def _book_side(levels: Optional[List[Dict[str, Any]]]) -> tuple:
+    """``[{price, quantity}, ...]`` as ``(prices, quantities)`` float8 arrays."""
+    if levels is None:
+        return None, None
+    return (
+        [_float(level.get("price")) for level in levels],
+        [_float(level.get("quantity")) for level in levels],
+    )
+
+
+def _orderbook_row(data: Dict[str, Any]) -> tuple:
+    return (
+        data.get("ticker"),
+        data.get("classCode"),
+        _dt(data.get("dateTime")),
+        data.get("depth"),
+        data.get("bidVolume"),
+        data.get("askVolume"),
+        *_book_side(data.get("bids")),
+        *_book_side(data.get("asks")),
+        _raw(data),
+    )
+
+
+def _quotes_row(data: Dict[str, Any]) -> tuple:
+    return (
+        data.get("ticker"),
+        data.get("classCode"),
+        _dt(data.get("dateTime")),
+        data.get("bid"),
+        data.get("offer"),
+        data.get("last"),
+        data.get("open"),
+        data.get("close"),
+        data.get("high"),
+        data.get("low"),
+        data.get("change"),
+        data.get("changeRate"),
+        data.get("currency"),
+        data.get("securityTradingStatus"),
+        _raw(data),
+    )
+
+
+def _last_trade_row(data: Dict[str, Any]) -> tuple:
+    return (
+        data.get("ticker"),
+        data.get("classCode"),
+        _dt(data.get("dateTime")),
+        data.get("side"),
+        data.get("price"),
+        data.get("quantity"),
+        data.get("volume"),
+        _raw(data),
+    )
+
+
+def _candle_row(data: Dict[str, Any]) -> tuple:
+    return (
+        data.get("ticker"),
+        data.get("classCode"),
+        data.get("timeFrame"),
+        _dt(data.get("dateTime")),
+        data.get("open"),
+        data.get("high"),
+        data.get("low"),
+        data.get("close"),
+        data.get("volume"),
+        _raw(data),
+    )
 
 
 class Db:
@@ -25,16 +317,27 @@ class Db:
     @classmethod
     async def create(cls, host, port, user, password, market_db, private_db):
         market_pool = await asyncpg.create_pool(
-            host=host, port=port, user=user, password=password, database=market_db
+            host=host,
+            port=port,
+            user=user,
+            password=password,
+            database=market_db,
+            init=_init_connection,
         )
         private_pool = await asyncpg.create_pool(
-            host=host, port=port, user=user, password=password, database=private_db
+            host=host,
+            port=port,
+            user=user,
+            password=password,
+            database=private_db,
+            init=_init_connection,
         )
         return cls(market_pool, private_pool)
 
     async def get_selected_assets(self) -> List[Dict[str, str]]:
         rows = await self.private.fetch(
-            "SELECT ticker, class_code FROM selected_assets WHERE enabled = true"
+            # stable order: market shard processes must split the same list
+            "SELECT ticker, class_code FROM selected_assets WHERE enabled = true ORDER BY class_code, ticker"
         )
         log.debug(f"selected_assets fetched {sanitize({'count': len(rows)})}")
         return [{"ticker": r["ticker"], "class_code": r["class_code"]} for r in rows]
@@ -43,95 +346,158 @@ class Db:
         log.debug(
             f"insert orderbook {sanitize({'ticker': data.get('ticker'), 'classCode': data.get('classCode'), 'depth': data.get('depth')})}"
         )
-        await self.market.execute(
-            """
-            INSERT INTO order_book_snapshots
-              (ticker, class_code, ts, depth, bid_volume, ask_volume, bids, asks, data)
-            VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9)
-            """,
-            data.get("ticker"),
-            data.get("classCode"),
-            _dt(data.get("dateTime")),
-            data.get("depth"),
-            data.get("bidVolume"),
-            data.get("askVolume"),
-            data.get("bids"),
-            data.get("asks"),
-            data,
-        )
+        await self.market.execute(ORDERBOOK_INSERT_SQL, *_orderbook_row(data))
 
     async def insert_quotes(self, data: Dict[str, Any]):
         log.debug(
             f"insert quotes {sanitize({'ticker': data.get('ticker'), 'classCode': data.get('classCode'), 'last': data.get('last')})}"
         )
-        await self.market.execute(
-            """
-            INSERT INTO quotes
-              (ticker, class_code, ts, bid, offer, last, open, close, high, low,
-               change, change_rate, currency, security_trading_status, data)
-            VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11,$12,$13,$14,$15)
-            """,
-            data.get("ticker"),
-            data.get("classCode"),
-            _dt(data.get("dateTime")),
-            data.get("bid"),
-            data.get("offer"),
-            data.get("last"),
-            data.get("open"),
-            data.get("close"),
-            data.get("high"),
-            data.get("low"),
-            data.get("change"),
-            data.get("changeRate"),
-            data.get("currency"),
-            data.get("securityTradingStatus"),
-            data,
-        )
+        await self.market.execute(QUOTES_INSERT_SQL, *_quotes_row(data))
 
     async def insert_last_trade(self, data: Dict[str, Any]):
         log.debug(
             f"insert last trade {sanitize({'ticker': data.get('ticker'), 'classCode': data.get('classCode'), 'price': data.get('price'), 'quantity': data.get('quantity')})}"
         )
-        await self.market.execute(
-            """
-            INSERT INTO last_trades
-              (ticker, class_code, ts, side, price, quantity, volume, data)
-            VALUES ($1,$2,$3,$4,$5,$6,$7,$8)
-            """,
-            data.get("ticker"),
-            data.get("classCode"),
-            _dt(data.get("dateTime")),
-            data.get("side"),
-            data.get("price"),
-            data.get("quantity"),
-            data.get("volume"),
-            data,
-        )
+        await self.market.execute(LAST_TRADE_INSERT_SQL, *_last_trade_row(data))
 
     async def upsert_candle(self, data: Dict[str, Any]):
         log.debug(
             f"upsert candle {sanitize({'ticker': data.get('ticker'), 'classCode': data.get('classCode'), 'timeFrame': data.get('timeFrame'), 'ts': data.get('dateTime')})}"
         )
-        await self.market.execute(
+        await self.market.execute(CANDLE_UPSERT_SQL, *_candle_row(data))
+
+    async def insert_orderbook_batch(self, items: List[Dict[str, Any]]) -> int:
+        log.debug(f"insert orderbook batch {sanitize({'rows': len(items)})}")
+        return await self.copy_append(
+            "order_book_snapshots",
+            ORDERBOOK_COLUMNS,
+            ORDERBOOK_INSERT_SQL,
+            [_orderbook_row(d) for d in items],
+        )
+
+    async def insert_quotes_batch(self, items: List[Dict[str, Any]]) -> int:
+        log.debug(f"insert quotes batch {sanitize({'rows': len(items)})}")
+        return await self.copy_append(
+            "quotes", QUOTES_COLUMNS, QUOTES_INSERT_SQL, [_quotes_row(d) for d in items]
+        )
+
+    async def insert_last_trades_batch(self, items: List[Dict[str, Any]]) -> int:
+        log.debug(f"insert last trades batch {sanitize({'rows': len(items)})}")
+        return await self.copy_append(
+            "last_trades",
+            LAST_TRADE_COLUMNS,
+            LAST_TRADE_INSERT_SQL,
+            [_last_trade_row(d) for d in items],
+        )
+
+    async def upsert_candles_batch(self, items: List[Dict[str, Any]]) -> int:
+        log.debug(f"upsert candles batch {sanitize({'rows': len(items)})}")
+        full = [_candle_row(d) for d in items if not d.get("_partial")]
+        partial = [_candle_row(d) for d in items if d.get("_partial")]
+        if full:
+            await self.market.executemany(CANDLE_UPSERT_SQL, full)
+        if partial:
+            await self.market.executemany(CANDLE_MERGE_SQL, partial)
+        return 0
+
+    async def get_indicator_state(
+        self, ticker: str, class_code: str, time_frame: str
+    ) -> Optional[Dict[str, Any]]:
+        return await self.market.fetchval(
+            "SELECT state FROM indicator_state WHERE ticker = $1 AND class_code = $2 AND time_frame = $3",
+            ticker,
+            class_code,
+            time_frame,
+        )
+
+    async def get_candles_before(
+        self, ticker: str, class_code: str, time_frame: str, before: datetime, limit: int
+    ) -> List[asyncpg.Record]:
+        """Up to ``limit`` stored bars older than ``before``, oldest first."""
+        rows = await self.market.fetch(
             """
-            INSERT INTO candles
-              (ticker, class_code, time_frame, ts, open, high, low, close, volume, data)
-            VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
-            ON CONFLICT (ticker, class_code, time_frame, ts)
-            DO UPDATE SET open=EXCLUDED.open, high=EXCLUDED.high, low=EXCLUDED.low,
-                          close=EXCLUDED.close, volume=EXCLUDED.volume, data=EXCLUDED.data
+            SELECT ts, high, low, close, volume FROM candles
+            WHERE ticker = $1 AND class_code = $2 AND time_frame = $3 AND ts < $4
+              AND close IS NOT NULL
+            ORDER BY ts DESC
+            LIMIT $5
             """,
-            data.get("ticker"),
-            data.get("classCode"),
-            data.get("timeFrame"),
-            _dt(data.get("dateTime")),
-            data.get("open"),
-            data.get("high"),
-            data.get("low"),
-            data.get("close"),
-            data.get("volume"),
-            data,
+            ticker,
+            class_code,
+            time_frame,
+            before,
+            limit,
+        )
+        return list(reversed(rows))
+
+    async def upsert_indicator_states(self, rows: List[tuple]):
+        log.debug(f"upsert indicator_state {sanitize({'rows': len(rows)})}")
+        await self.market.executemany(INDICATOR_STATE_UPSERT_SQL, rows)
+
+    async def upsert_latest(
+        self,
+        quotes: List[Dict[str, Any]],
+        trades: List[Dict[str, Any]],
+        books: List[Dict[str, Any]],
+    ):
+        log.debug(
+            f"upsert market_latest {sanitize({'quotes': len(quotes), 'trades': len(trades), 'books': len(books)})}"
         )
+        async with self.market.acquire() as conn:
+            if quotes:
+                await conn.executemany(
+                    LATEST_QUOTE_UPSERT_SQL, [_quotes_row(d)[:-1] for d in quotes]
+                )
+            if trades:
+                await conn.executemany(
+                    LATEST_TRADE_UPSERT_SQL, [_last_trade_row(d)[:-1] for d in trades]
+                )
+            if books:
+                await conn.executemany(
+                    LATEST_BOOK_UPSERT_SQL, [_orderbook_row(d)[:-1] for d in books]
+                )
+
+    async def copy_append(
+        self, table: str, columns: List[str], insert_sql: str, rows: List[tuple]
+    ) -> int:
+        """Bulk-load rows into an append-only market table with COPY.
+
+        A batch that COPY rejects is bisected; chunks of up to COPY_MIN_CHUNK
+        rows are inserted one by one and only the rows that still fail are
+        dropped. Returns the number of dropped rows. Connection errors are
+        raised so the caller can keep the whole batch.
+        """
+        if not rows:
+            return 0
+        async with self.market.acquire() as conn:
+            return await self._copy_chunk(conn, table, columns, insert_sql, rows)
+
+    async def _copy_chunk(self, conn, table, columns, insert_sql, rows) -> int:
+        try:
+            await conn.copy_records_to_table(table, records=rows, columns=columns)
+            return 0
+        except Exception as exc:
+            if is_connection_error(exc):
+                raise
+            log.warning(
+                f"copy rejected {sanitize({'table': table, 'rows': len(rows), 'error': str(exc)})}"
+            )
+        if len(rows) > COPY_MIN_CHUNK:
+            mid = len(rows) // 2
+            failed = await self._copy_chunk(conn, table, columns, insert_sql, rows[:mid])
+            return failed + await self._copy_chunk(conn, table, columns, insert_sql, rows[mid:])
+        failed = 0
+        for row in rows:
+            try:
+                await conn.execute(insert_sql, *row)
+            except Exception as exc:
+                if is_connection_error(exc):
+                    raise
+                failed += 1
+                log.error(
+                    f"row insert failed {sanitize({'table': table, 'ticker': row[0], 'classCode': row[1], 'error': str(exc)})}"
+                )
+        return failed
 
     async def insert_holdings_snapshot(self, data: Any):
         log.debug(
@@ -203,38 +569,78 @@ class Db:
             data,
         )
 
-    async def enqueue_embedding(self, entity_type: str, entity_id: str, text: str, metadata: Dict[str, Any] | None = None):
-        log.debug(f"enqueue embedding {sanitize({'entity_type': entity_type, 'entity_id': entity_id})}")
+    async def enqueue_embedding(
+        self,
+        entity_type: str,
+        entity_id: str,
+        text: str,
+        metadata: Dict[str, Any] | None = None,
+        priority: int = 0,
+    ):
+        log.debug(f"enqueue embedding {sanitize({'entity_type': entity_type, 'entity_id': entity_id, 'priority': priority})}")
         await self.private.execute(
             """
-            INSERT INTO embedding_queue (entity_type, entity_id, text, metadata)
-            VALUES ($1,$2,$3,$4)
+            INSERT INTO embedding_queue (entity_type, entity_id, text, metadata, priority)
+            VALUES ($1,$2,$3,$4,$5)
             """,
             entity_type,
             entity_id,
             text,
             metadata,
+            priority,
         )
 
-    async def fetch_embedding_batch(self, limit: int = 10):
+    async def fetch_embedding_batch(self, limit: int = 10, lease_sec: int = 300):
+        """Leases up to ``limit`` due rows, highest priority first, for ``lease_sec``."""
         rows = await self.private.fetch(
             """
             UPDATE embedding_queue
-            SET status = 'processing', updated_at = now()
+            SET status = 'processing',
+                attempts = attempts + 1,
+                leased_until = now() + make_interval(secs => $2),
+                updated_at = now()
             WHERE id IN (
               SELECT id FROM embedding_queue
-              WHERE status = 'pending'
-              ORDER BY created_at ASC
+              WHERE status = 'pending' AND available_at <= now()
+              ORDER BY priority DESC, available_at ASC
               LIMIT $1
               FOR UPDATE SKIP LOCKED
             )
-            RETURNING id, entity_type, entity_id, text, metadata
+            RETURNING id, entity_type, entity_id, text, metadata, attempts
             """,
             limit,
+            lease_sec,
         )
         log.debug(f"fetch embedding batch {sanitize({'count': len(rows)})}")
         return rows
 
+    async def reclaim_embedding_leases(self, max_attempts: int) -> Dict[str, int]:
+        """Returns rows whose lease ran out (worker died mid-batch) to ``pending``.
+
+        Rows that already used ``max_attempts`` leases go to ``error`` instead.
+        """
+        rows = await self.private.fetch(
+            """
+            UPDATE embedding_queue
+            SET status = CASE WHEN attempts >= $1 THEN 'error' ELSE 'pending' END,
+                leased_until = NULL,
+                available_at = now(),
+                last_error = coalesce(last_error, 'lease expired'),
+                updated_at = now()
+            WHERE id IN (
+              SELECT id FROM embedding_queue
+              WHERE status = 'processing' AND leased_until < now()
+              FOR UPDATE SKIP LOCKED
+            )
+            RETURNING status
+            """,
+            max_attempts,
+        )
+        counts: Dict[str, int] = {}
+        for row in rows:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        return counts
+
     async def store_embedding(self, queue_id: str, entity_type: str, entity_id: str, embedding: List[float], metadata: Dict[str, Any] | None = None):
         log.debug(
             f"store embedding {sanitize({'queue_id': queue_id, 'entity_type': entity_type, 'entity_id': entity_id, 'size': len(embedding)})}"
@@ -246,18 +652,78 @@ class Db:
             """,
             entity_type,
             entity_id,
-            _vector_str(embedding),
+            embedding,
             metadata,
         )
         await self.private.execute(
-            "UPDATE embedding_queue SET status='done', updated_at=now() WHERE id=$1",
+            "UPDATE embedding_queue SET status='done', leased_until=NULL, updated_at=now() WHERE id=$1",
             queue_id,
         )
 
-    async def mark_embedding_failed(self, queue_id: str, error: str):
-        log.error(f"embedding failed {sanitize({'queue_id': queue_id, 'error': error})}")
-        await self.private.execute(
-            "UPDATE embedding_queue SET status='error', updated_at=now(), metadata = jsonb_set(coalesce(metadata,'{}'::jsonb), '{error}', to_jsonb($2::text), true) WHERE id=$1",
+    async def store_embeddings(self, items: List[tuple]):
+        """Bulk ``store_embedding`` for ``(queue_id, entity_type, entity_id, embedding, metadata)``.
+
+        Vectors are COPYed in binary; all rows land or none do.
+        """
+        if not items:
+            return
+        log.debug(f"store embeddings {sanitize({'rows': len(items)})}")
+        async with self.private.acquire() as conn:
+            async with conn.transaction():
+                await conn.copy_records_to_table(
+                    "embeddings",
+                    records=[item[1:] for item in items],
+                    columns=["entity_type", "entity_id", "embedding", "metadata"],
+                )
+                await conn.execute(
+                    "UPDATE embedding_queue SET status='done', leased_until=NULL, updated_at=now() WHERE id = ANY($1::uuid[])",
+                    [item[0] for item in items],
+                )
+
+    async def get_cached_embeddings(self, hashes: List[str]) -> Dict[str, List[float]]:
+        rows = await self.private.fetch(
+            "SELECT content_hash, embedding FROM embedding_cache WHERE content_hash = ANY($1::text[])",
+            hashes,
+        )
+        log.debug(f"embedding cache lookup {sanitize({'keys': len(hashes), 'hits': len(rows)})}")
+        return {row["content_hash"]: row["embedding"] for row in rows}
+
+    async def put_cached_embeddings(self, model: str, items: List[tuple]):
+        """Stores ``(content_hash, embedding)`` pairs; existing hashes are kept."""
+        if not items:
+            return
+        await self.private.executemany(
+            """
+            INSERT INTO embedding_cache (content_hash, model, embedding)
+            VALUES ($1,$2,$3)
+            ON CONFLICT (content_hash) DO NOTHING
+            """,
+            [(content_hash, model, embedding) for content_hash, embedding in items],
+        )
+
+    async def mark_embedding_failed(self, queue_id: str, error: str, max_attempts: int = 1, retry_sec: float = 0):
+        """Schedules another attempt after ``retry_sec * 2^(attempts-1)`` seconds
+        (at most ``EMBEDDING_RETRY_MAX_SEC``), or marks the row ``error`` once
+        ``max_attempts`` are used up.
+        """
+        status = await self.private.fetchval(
+            """
+            UPDATE embedding_queue
+            SET status = CASE WHEN attempts >= $3 THEN 'error' ELSE 'pending' END,
+                available_at = now() + make_interval(secs => least($4 * power(2, greatest(attempts - 1, 0)), $5)),
+                leased_until = NULL,
+                last_error = $2,
+                updated_at = now()
+            WHERE id = $1
+            RETURNING status
+            """,
             queue_id,
             error,
+            max_attempts,
+            float(retry_sec),
+            float(EMBEDDING_RETRY_MAX_SEC),
         )
+        if status == "pending":
+            log.warning(f"embedding retry scheduled {sanitize({'queue_id': queue_id, 'error': error})}")
+        else:
+            log.error(f"embedding failed {sanitize({'queue_id': queue_id, 'error': error})}")
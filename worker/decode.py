@@ -0,0 +1,145 @@
+"""Decoding of market data websocket messages.
+
+``BCS_JSON_DECODER`` picks the backend:
+
+* ``msgspec`` decodes straight into the structs below, which list only the
+  fields the worker stores; everything else in the message is skipped by
+  the parser instead of being built into Python objects;
+* ``orjson`` / ``json`` parse the whole message into a dict;
+* ``auto`` (default) takes the first one that is installed.
+
+Whatever the backend, ``decode`` returns ``(responseType, fields)`` with the
+wire (camelCase) field names. When the target table keeps raw payloads
+(``BCS_STORE_RAW``) the original message text rides along under ``"_raw"``
+as ``RawJson`` and is written to the ``data`` column as is, without being
+serialized again.
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from .db import RawJson
+from .logger import get_logger
+
+try:
+    import msgspec
+except ImportError:  # optional: falls back to orjson / json
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+log = get_logger("worker.decode")
+
+# responseType -> table that stores it
+TABLES = {
+    "OrderBook": "order_book_snapshots",
+    "Quotes": "quotes",
+    "LastTrades": "last_trades",
+    "CandleStick": "candles",
+}
+
+if msgspec is not None:
+    # Field names are the wire names. Numbers stay ``Any`` so ints and floats
+    # come out exactly as json.loads would give them.
+
+    class _Market(msgspec.Struct, tag_field="responseType", tag=True):
+        ticker: Optional[str] = None
+        classCode: Optional[str] = None
+        dateTime: Optional[str] = None
+
+    class OrderBook(_Market):
+        depth: Any = None
+        bidVolume: Any = None
+        askVolume: Any = None
+        bids: Any = None
+        asks: Any = None
+
+    class Quotes(_Market):
+        bid: Any = None
+        offer: Any = None
+        last: Any = None
+        open: Any = None
+        close: Any = None
+        high: Any = None
+        low: Any = None
+        change: Any = None
+        changeRate: Any = None
+        currency: Optional[str] = None
+        securityTradingStatus: Any = None
+
+    class LastTrades(_Market):
+        side: Any = None
+        price: Any = None
+        quantity: Any = None
+        volume: Any = None
+
+    class CandleStick(_Market):
+        timeFrame: Optional[str] = None
+        open: Any = None
+        high: Any = None
+        low: Any = None
+        close: Any = None
+        volume: Any = None
+
+
+def _loads() -> Tuple[str, Callable[[Any], Any]]:
+    if orjson is not None:
+        return "orjson", orjson.loads
+    return "json", json.loads
+
+
+class MarketDecoder:
+    def __init__(self, backend: str = "auto", raw_tables: Iterable[str] = ()):
+        raw = set(raw_tables)
+        self.raw_types = {rt for rt, table in TABLES.items() if table in raw}
+        fallback_name, self._loads = _loads()
+        if backend == "auto":
+            backend = "msgspec" if msgspec is not None else fallback_name
+        elif (backend == "msgspec" and msgspec is None) or (backend == "orjson" and orjson is None):
+            log.warning(f"json decoder {backend} is not installed, using {fallback_name}")
+            backend = fallback_name
+        elif backend not in {"msgspec", "orjson", "json"}:
+            backend = fallback_name
+        if backend == "json":
+            self._loads = json.loads
+        self.backend = backend
+        self._struct_decoder = (
+            msgspec.json.Decoder(Union[OrderBook, Quotes, LastTrades, CandleStick])
+            if backend == "msgspec"
+            else None
+        )
+
+    def decode(self, message: Union[str, bytes]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """``(responseType, fields)`` of a market data message, None for anything else."""
+        if self._struct_decoder is None:
+            return self._decode_dict(message)
+        try:
+            item = self._struct_decoder.decode(message)
+        except msgspec.MsgspecError:
+            # control messages, or a field of an unexpected type
+            return self._decode_dict(message)
+        response_type = type(item).__name__
+        data = msgspec.structs.asdict(item)
+        data["_raw"] = self._raw(response_type, message)
+        return response_type, data
+
+    def _raw(self, response_type: str, message: Union[str, bytes]) -> Optional[RawJson]:
+        if response_type not in self.raw_types:
+            return None
+        return RawJson(message if isinstance(message, str) else message.decode("utf-8"))
+
+    def _decode_dict(self, message: Union[str, bytes]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        try:
+            data = self._loads(message)
+        except Exception:
+            return None
+        if not isinstance(data, dict):
+            return None
+        response_type = data.get("responseType")
+        if response_type not in TABLES:
+            return None
+        data["_raw"] = self._raw(response_type, message)
+        return response_type, data
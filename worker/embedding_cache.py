@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import Config
+from .db import Db
+from .llm_backend import embedding_source
+from .logger import get_logger, sanitize
+
+log = get_logger("worker.embedding_cache")
+
+
+def normalize_text(text: str) -> str:
+    """NFC form with runs of whitespace collapsed, so cosmetic edits still hit."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def content_hash(source: str, text: str) -> str:
+    return hashlib.sha256(f"{source}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-addressed embeddings: an in-process LRU in front of ``embedding_cache``.
+
+    Keys are ``content_hash(source, text)`` with the ``embedding_source`` of
+    the configured backend (backend, provider, model), so switching any of
+    them never reuses old vectors. Only vectors of that source may be stored,
+    not Ollama fallback ones. Lookup and store errors only cost a cache miss.
+    Texts being embedded by another batch right now are awaited via
+    ``claim``/``release`` instead of being sent to the backend twice.
+    """
+
+    def __init__(self, db: Db, config: Config):
+        self.db = db
+        self.source = embedding_source(config)
+        self.enabled = config.embedding_cache
+        self.size = max(0, config.embedding_cache_size)
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return content_hash(self.source, text)
+
+    def _remember(self, key: str, embedding: List[float]):
+        if not self.size:
+            return
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+
+    async def lookup(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        if not self.enabled:
+            return {}
+        found: Dict[str, List[float]] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            embedding = self._lru.get(key)
+            if embedding is None:
+                missing.append(key)
+            else:
+                self._lru.move_to_end(key)
+                found[key] = embedding
+        self.hits += len(found)
+        if missing:
+            try:
+                stored = await self.db.get_cached_embeddings(missing)
+            except Exception as exc:
+                log.warning(f"embedding cache lookup failed {sanitize({'keys': len(missing), 'error': str(exc)})}")
+                stored = {}
+            for key, embedding in stored.items():
+                self._remember(key, embedding)
+            found.update(stored)
+            self.db_hits += len(stored)
+            self.misses += len(missing) - len(stored)
+        return found
+
+    async def store(self, items: Dict[str, List[float]]):
+        if not self.enabled or not items:
+            return
+        for key, embedding in items.items():
+            self._remember(key, embedding)
+        try:
+            await self.db.put_cached_embeddings(self.source, list(items.items()))
+        except Exception as exc:
+            log.warning(f"embedding cache store failed {sanitize({'keys': len(items), 'error': str(exc)})}")
+
+    def claim(self, pending: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, asyncio.Future]]:
+        """Splits ``key -> text`` into texts to embed here and futures of other batches."""
+        owned: Dict[str, str] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        for key, text in pending.items():
+            future = self._inflight.get(key)
+            if future is None:
+                self._inflight[key] = asyncio.get_running_loop().create_future()
+                owned[key] = text
+            else:
+                waiting[key] = future
+        return owned, waiting
+
+    def release(self, owned: Iterable[str], results: Dict[str, List[float]]):
+        for key in owned:
+            future: Optional[asyncio.Future] = self._inflight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(results.get(key))
+
+    def stats(self) -> Dict[str, int]:
+        return {"cache_hits": self.hits, "cache_db_hits": self.db_hits, "cache_misses": self.misses}
@@ -1,45 +1,153 @@
 import asyncio
+import time
+
 import aiohttp
 
 from .db import Db
 from .config import Config
-from .llm_backend import embed_text
+from .embedding_cache import EmbeddingCache
+from .llm_backend import embed_texts_with_sources
 from .logger import get_logger, sanitize
 
 log = get_logger("worker.embeddings")
 
 
+async def _mark_failed(db: Db, config: Config, queue_id, error: str):
+    await db.mark_embedding_failed(queue_id, error, max(1, config.embedding_max_attempts), config.embedding_retry_sec)
+
+
+async def _embed_batch(db: Db, session: aiohttp.ClientSession, config: Config, cache: EmbeddingCache, batch) -> tuple:
+    keys = [cache.key(row["text"]) for row in batch]
+    vectors = await cache.lookup(keys)
+    # identical texts within the batch are embedded once
+    pending = {key: row["text"] for key, row in zip(keys, batch) if key not in vectors}
+    log.debug(
+        f"embedding request {sanitize({'rows': len(batch), 'cached': len(batch) - len(pending), 'chars': sum(len(text) for text in pending.values()), 'backend': config.llm_backend})}"
+    )
+    owned, waiting = cache.claim(pending)
+    fresh = {}
+    error = None
+    try:
+        if owned:
+            embeddings, sources = await embed_texts_with_sources(session, config, list(owned.values()))
+            fresh = {key: embedding for key, embedding in zip(owned, embeddings) if embedding}
+            # fallback vectors are used for this batch but not cached under the primary source
+            await cache.store(
+                {key: fresh[key] for key, source in zip(owned, sources) if key in fresh and source == cache.source}
+            )
+    except Exception as exc:
+        log.error(f"embedding exception {sanitize({'rows': len(owned), 'error': str(exc)})}")
+        error = str(exc)
+    finally:
+        cache.release(owned, fresh)
+    vectors.update(fresh)
+    for key, future in waiting.items():
+        embedding = await future
+        if embedding:
+            vectors[key] = embedding
+
+    ready = []
+    failed = 0
+    for row, key in zip(batch, keys):
+        embedding = vectors.get(key)
+        if embedding:
+            ready.append((row["id"], row["entity_type"], row["entity_id"], embedding, row.get("metadata")))
+            continue
+        if error is None:
+            log.error("embedding backend returned empty embedding")
+        await _mark_failed(db, config, row["id"], error or "empty embedding")
+        failed += 1
+
+    try:
+        await db.store_embeddings(ready)
+        log.debug(f"embedding ok {sanitize({'rows': len(ready)})}")
+        return len(ready), failed
+    except Exception as exc:
+        log.warning(f"embedding bulk store failed, storing rows one by one {sanitize({'rows': len(ready), 'error': str(exc)})}")
+
+    done = 0
+    for item in ready:
+        try:
+            await db.store_embedding(*item)
+            done += 1
+        except Exception as exc:
+            log.error(f"embedding exception {sanitize({'error': str(exc)})}")
+            await _mark_failed(db, config, item[0], str(exc))
+            failed += 1
+    return done, failed
+
+
 async def run_embedding_worker(db: Db, config: Config):
+    """Drains ``embedding_queue`` with up to ``embedding_concurrency`` batches in flight.
+
+    Each batch of ``embedding_batch_size`` rows is one backend request for the
+    texts not found in the embedding cache; all of them share one session, so
+    connections are reused between batches. Rows are leased for
+    ``embedding_lease_sec``; leases left behind by a dead worker are reclaimed
+    every quarter of that.
+    """
+    concurrency = max(1, config.embedding_concurrency)
+    batch_size = max(1, config.embedding_batch_size)
+    lease_sec = max(1, config.embedding_lease_sec)
+    reclaim_every = max(5, lease_sec / 4)
+    last_reclaim = 0.0
     log.info(
-        f"embedding worker started {sanitize({'backend': config.llm_backend, 'llm_mcp_base_url': config.llm_mcp_base_url, 'ollama_base_url': config.ollama_base_url, 'model': config.ollama_embed_model})}"
+        f"embedding worker started {sanitize({'backend': config.llm_backend, 'llm_mcp_base_url': config.llm_mcp_base_url, 'ollama_base_url': config.ollama_base_url, 'model': config.ollama_embed_model, 'concurrency': concurrency, 'batch_size': batch_size, 'lease_sec': lease_sec})}"
     )
-    while True:
-        batch = await db.fetch_embedding_batch(limit=10)
-        if not batch:
-            await asyncio.sleep(2)
-            continue
+    cache = EmbeddingCache(db, config)
+    slots = asyncio.Semaphore(concurrency)
+    inflight: set = set()
+    totals = {"done": 0, "failed": 0}
+    started = None
+
+    async def process(batch):
+        try:
+            done, failed = await _embed_batch(db, session, config, cache, batch)
+            totals["done"] += done
+            totals["failed"] += failed
+        except Exception as exc:
+            log.error(f"embedding batch error {sanitize({'rows': len(batch), 'error': str(exc)})}")
+        finally:
+            slots.release()
 
-        async with aiohttp.ClientSession() as session:
-            for row in batch:
+    connector = aiohttp.TCPConnector(limit=concurrency * 2)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        try:
+            while True:
+                if time.monotonic() - last_reclaim >= reclaim_every:
+                    last_reclaim = time.monotonic()
+                    try:
+                        reclaimed = await db.reclaim_embedding_leases(max(1, config.embedding_max_attempts))
+                        if reclaimed:
+                            log.warning(f"embedding leases expired {sanitize(reclaimed)}")
+                    except Exception as exc:
+                        log.error(f"embedding lease reclaim error {sanitize({'error': str(exc)})}")
+                await slots.acquire()
                 try:
-                    log.debug(
-                        f"embedding request {sanitize({'entity_type': row['entity_type'], 'entity_id': row['entity_id'], 'chars': len(row['text']), 'backend': config.llm_backend})}"
-                    )
-                    embedding = await embed_text(session=session, config=config, text=row["text"])
-                    if not embedding:
-                        log.error("embedding backend returned empty embedding")
-                        await db.mark_embedding_failed(row["id"], "empty embedding")
+                    batch = await db.fetch_embedding_batch(limit=batch_size, lease_sec=lease_sec)
+                except BaseException:
+                    slots.release()
+                    raise
+                if not batch:
+                    slots.release()
+                    if inflight:
+                        await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
                         continue
-                    await db.store_embedding(
-                        row["id"],
-                        row["entity_type"],
-                        row["entity_id"],
-                        embedding,
-                        row.get("metadata"),
-                    )
-                    log.debug(
-                        f"embedding ok {sanitize({'queue_id': row['id'], 'size': len(embedding)})}"
-                    )
-                except Exception as exc:
-                    log.error(f"embedding exception {sanitize({'error': str(exc)})}")
-                    await db.mark_embedding_failed(row["id"], str(exc))
+                    if started is not None:
+                        elapsed = time.monotonic() - started
+                        log.info(
+                            f"embedding queue drained {sanitize({**totals, **cache.stats(), 'sec': round(elapsed, 1), 'rows_per_sec': round(totals['done'] / elapsed, 1) if elapsed else None})}"
+                        )
+                        totals.update(done=0, failed=0)
+                        started = None
+                    await asyncio.sleep(2)
+                    continue
+                if started is None:
+                    started = time.monotonic()
+                task = asyncio.create_task(process(batch))
+                inflight.add(task)
+                task.add_done_callback(inflight.discard)
+        finally:
+            for task in inflight:
+                task.cancel()
+            await asyncio.gather(*inflight, return_exceptions=True)
@@ -0,0 +1,168 @@
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .candles import SeriesKey, _ts
+from .config import Config
+from .db import Db, is_connection_error
+from .logger import get_logger, sanitize
+
+# scripts import each other by bare module name (run.py runs from their
+# directory), so the worker puts that directory on sys.path as well
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+import incremental  # noqa: E402
+
+log = get_logger("worker.features")
+
+
+def _num(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+class FeatureTracker:
+    """Keeps ``incremental.FeatureState`` per candle series up to date.
+
+    Candle updates are queued by the ingest pipeline; a bar is applied once a
+    newer bar of the same series shows up, i.e. when it is closed. The first
+    bar of a series loads the stored state and folds in the stored candles it
+    has not seen yet; when there is no usable state, or more than ``lookback``
+    bars are missing, the state is rebuilt from up to ``lookback`` stored
+    candles. Changed states are written to ``indicator_state`` every
+    ``features_flush_sec``.
+    """
+
+    def __init__(self, db: Db, config: Config):
+        self.db = db
+        self.lookback = config.features_lookback
+        self.flush_interval = max(1, config.features_flush_sec)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, config.ingest_queue_max))
+        self._open: Dict[SeriesKey, Dict[str, Any]] = {}
+        self._states: Dict[SeriesKey, incremental.FeatureState] = {}
+        self._dirty: set = set()
+        self.dropped = 0
+
+    def submit(self, data: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def run(self):
+        flusher = asyncio.create_task(self._flush_loop())
+        try:
+            while True:
+                data = await self.queue.get()
+                try:
+                    await self._on_candle(data)
+                except Exception as exc:
+                    if is_connection_error(exc):
+                        log.warning(f"features db unavailable {sanitize({'error': str(exc)})}")
+                    else:
+                        log.error(f"features error {sanitize({'error': str(exc)})}")
+        finally:
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+            await self.flush()
+
+    async def _on_candle(self, data: Dict[str, Any]):
+        key = (data.get("ticker"), data.get("classCode"), data.get("timeFrame"))
+        if data.get("close") is None or not data.get("dateTime") or None in key:
+            return
+        current = self._open.get(key)
+        if current is not None:
+            if _ts(data) < _ts(current):
+                return
+            if _ts(data) > _ts(current):
+                # raises before the open bar is replaced, so it is retried
+                await self._apply(key, current)
+        self._open[key] = data
+
+    async def _apply(self, key: SeriesKey, bar: Dict[str, Any]):
+        bar_ts = _ts(bar)
+        state = self._states.get(key)
+        if state is None:
+            state = await self._load(key, bar_ts)
+            self._states[key] = state
+        if state.last_ts and bar_ts <= datetime.fromisoformat(state.last_ts):
+            return
+        state.update(
+            bar_ts.isoformat(),
+            _num(bar.get("high")),
+            _num(bar.get("low")),
+            float(bar["close"]),
+            _num(bar.get("volume")),
+        )
+        self._dirty.add(key)
+
+    async def _load(self, key: SeriesKey, before: datetime) -> incremental.FeatureState:
+        stored = await self.db.get_indicator_state(*key)
+        state = incremental.FeatureState.restore(stored)
+        if state is not None and state.lookback != self.lookback:
+            state = None
+        rows = await self.db.get_candles_before(*key, before, self.lookback)
+        if state is not None and state.last_ts:
+            last_ts = datetime.fromisoformat(state.last_ts)
+            missed = [row for row in rows if row["ts"] > last_ts]
+            # the window reaches back to the state's last bar: only the bars
+            # stored while the worker was down (or backfilled) are missing
+            if len(missed) < len(rows) or not rows:
+                self._replay(state, missed)
+                if missed:
+                    log.info(
+                        f"features catch up {sanitize({'ticker': key[0], 'classCode': key[1], 'timeFrame': key[2], 'bars': len(missed)})}"
+                    )
+                return state
+        state = incremental.FeatureState(self.lookback)
+        self._replay(state, rows)
+        log.info(
+            f"features bootstrap {sanitize({'ticker': key[0], 'classCode': key[1], 'timeFrame': key[2], 'bars': len(rows)})}"
+        )
+        return state
+
+    @staticmethod
+    def _replay(state: incremental.FeatureState, rows):
+        for row in rows:
+            state.update(
+                row["ts"].isoformat(),
+                _num(row["high"]),
+                _num(row["low"]),
+                float(row["close"]),
+                _num(row["volume"]),
+            )
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        keys = list(self._dirty)
+        self._dirty.clear()
+        rows = []
+        for key in keys:
+            state = self._states[key]
+            rows.append(
+                (
+                    *key,
+                    state.lookback,
+                    state.bars,
+                    datetime.fromisoformat(state.last_ts),
+                    state.features(),
+                    state.dump(),
+                )
+            )
+        try:
+            await self.db.upsert_indicator_states(rows)
+        except Exception as exc:
+            self._dirty.update(keys)
+            log.error(f"indicator_state error {sanitize({'rows': len(rows), 'error': str(exc)})}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"series": len(self._states), "depth": self.queue.qsize(), "dropped": self.dropped}
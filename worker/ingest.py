@@ -0,0 +1,387 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+from .candles import CandleCoalescer, CandleSynthesizer
+from .config import Config
+from .db import Db, is_connection_error
+from .features import FeatureTracker
+from .logger import get_logger, sanitize
+from .spool import Spool
+
+log = get_logger("worker.ingest")
+
+# What the reader does with a message whose queue is full (``BCS_INGEST_OVERLOAD``):
+# * ``block``    — wait for the flusher (nothing is lost, the socket stalls);
+# * ``conflate`` — keep only the newest pending message per instrument;
+# * ``drop``     — discard the new message;
+# * ``spool``    — append it to the disk spool, replayed once the flusher keeps up
+#   (append-only tables only: the replay may reorder rows; ``block`` without a spool).
+OVERLOAD_POLICIES = ("block", "conflate", "drop", "spool")
+APPEND_ONLY = ("orderbook", "quotes", "last_trades")
+
+
+class IngestPipeline:
+    """Bounded per-type queues between the market stream and Postgres.
+
+    The websocket reader only enqueues messages; one background flusher per
+    data type drains its queue in batches of up to ``ingest_batch_size`` rows,
+    or whatever has accumulated after ``ingest_flush_ms``. Append-only tables
+    are written with COPY (see ``Db.copy_append``).
+
+    A queue that reaches ``ingest_queue_max`` is handled by the overload
+    policy of its type (``ingest_overload``). By default books and quotes are
+    conflated: until the flusher catches up, a newer message of an instrument
+    replaces its pending one, so the reader never waits on them. Trades go
+    to the disk spool (or block without one) and candles block, so neither
+    is lost. Replaced, dropped and waited-for messages are counted in
+    ``ingest.stats`` (``conflated``, ``dropped``, ``blocked_ms``).
+
+    Candle updates pass through a ``CandleCoalescer`` first, so an open bar is
+    upserted at most once per ``candle_flush_ms`` plus once when it closes.
+    Trades fed to ``synthesize`` build candles of the other timeframes
+    (``candle_synth_timeframes``) in a ``CandleSynthesizer``, written the
+    same way.
+
+    The newest quote, trade and book of every instrument are also kept in
+    memory and upserted into ``market_latest`` every ``latest_flush_ms``, so
+    snapshot reads do not have to scan history.
+
+    Candle updates are also handed to a ``FeatureTracker`` that keeps the
+    incremental indicator state of every series (``features_lookback`` > 0).
+
+    With ``spool_dir`` set, a batch of an append-only type that fails on a
+    connection error goes to the disk ``Spool`` instead of being lost, and so
+    does every later batch of that type until the replayer has loaded the
+    spool back, oldest first. Candle batches are never spooled: they fail
+    like without a spool, and the coalescer sends open bars again.
+    """
+
+    def __init__(self, db: Db, config: Config):
+        self.db = db
+        self.config = config
+        self.batch_size = max(1, config.ingest_batch_size)
+        self.flush_interval = max(1, config.ingest_flush_ms) / 1000
+        self.writers = {
+            "orderbook": db.insert_orderbook_batch,
+            "quotes": db.insert_quotes_batch,
+            "last_trades": db.insert_last_trades_batch,
+            "candles": db.upsert_candles_batch,
+        }
+        self.queues: Dict[str, asyncio.Queue] = {
+            kind: asyncio.Queue(maxsize=max(1, config.ingest_queue_max))
+            for kind in self.writers
+        }
+        self.policies = {kind: config.ingest_overload.get(kind, "block") for kind in self.writers}
+        for kind, policy in self.policies.items():
+            if policy not in OVERLOAD_POLICIES:
+                log.warning(f"unknown overload policy, using block {sanitize({'kind': kind, 'policy': policy})}")
+                self.policies[kind] = "block"
+        self.spool = None
+        if config.spool_dir:
+            directory = config.spool_dir
+            if config.market_processes > 1:
+                directory = os.path.join(directory, f"p{config.market_process_index}")
+            self.spool = Spool(
+                directory,
+                config.spool_segment_mb * 1024 * 1024,
+                config.spool_max_mb * 1024 * 1024,
+                config.spool_fsync_ms,
+            )
+        for kind, policy in self.policies.items():
+            if policy == "spool" and (self.spool is None or kind not in APPEND_ONLY):
+                self.policies[kind] = "block"
+        # newest pending message per conflation key, drained after the queue
+        self._conflated: Dict[str, Dict[tuple, Dict[str, Any]]] = {kind: {} for kind in self.writers}
+        self._ready = {kind: asyncio.Event() for kind in self.writers}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.candles = CandleCoalescer() if config.candle_flush_ms > 0 else None
+        synth_time_frames = set(config.candle_synth_timeframes)
+        if config.store_candles:
+            # the broker's own bars of this timeframe are stored as they come
+            synth_time_frames.discard(config.candle_time_frame)
+        self.synth = (
+            CandleSynthesizer(synth_time_frames, config.candle_utc_offset_min) if synth_time_frames else None
+        )
+        self._latest: Dict[str, Dict[tuple, Dict[str, Any]]] = {
+            "quotes": {},
+            "last_trades": {},
+            "orderbook": {},
+        }
+        self.features = FeatureTracker(db, config) if config.features_lookback > 0 else None
+        self.counters = {
+            kind: {
+                "enqueued": 0,
+                "written": 0,
+                "failed": 0,
+                "batches": 0,
+                "conflated": 0,
+                "dropped": 0,
+                "blocked_ms": 0,
+                "spooled": 0,
+                "replayed": 0,
+            }
+            for kind in self.writers
+        }
+
+    async def submit(self, kind: str, data: Dict[str, Any]):
+        if kind == "candles" and self.features is not None:
+            self.features.submit(data)
+        if kind == "candles" and self.candles is not None:
+            for bar in self.candles.update(data):
+                await self._enqueue(kind, bar)
+            return
+        latest = self._latest.get(kind)
+        if latest is not None and self.config.latest_flush_ms > 0:
+            latest[(data.get("ticker"), data.get("classCode"))] = data
+        await self._enqueue(kind, data)
+
+    async def synthesize(self, trade: Dict[str, Any]):
+        """Updates the synthesized candles with a trade; closed and new bars are queued at once."""
+        for bar in self.synth.update(trade):
+            # a partial bar would skew the indicators; they catch up from the stored bar
+            if self.features is not None and not bar.get("_partial"):
+                self.features.submit(bar)
+            await self._enqueue("candles", bar)
+
+    async def _enqueue(self, kind: str, data: Dict[str, Any]):
+        queue = self.queues[kind]
+        counters = self.counters[kind]
+        policy = self.policies[kind]
+        pending = self._conflated[kind]
+        # once conflating, keep at it until the flusher has drained the backlog,
+        # so an instrument's messages never overtake each other
+        if policy == "conflate" and (pending or queue.full()):
+            key = self._conflation_key(kind, data)
+            if key in pending:
+                counters["conflated"] += 1
+            pending[key] = data
+            counters["enqueued"] += 1
+            self._ready[kind].set()
+            return
+        if queue.full():
+            if policy == "drop":
+                counters["dropped"] += 1
+                return
+            if policy == "spool" and self._spool(kind, [data]):
+                counters["enqueued"] += 1
+                return
+            started = time.monotonic()
+            await queue.put(data)
+            counters["blocked_ms"] += round((time.monotonic() - started) * 1000)
+        else:
+            queue.put_nowait(data)
+        counters["enqueued"] += 1
+        if queue.qsize() >= self.batch_size:
+            self._ready[kind].set()
+
+    @staticmethod
+    def _conflation_key(kind: str, data: Dict[str, Any]) -> tuple:
+        if kind == "candles":
+            # every bar is its own row; only updates of the same bar may replace each other
+            return (*CandleCoalescer.series_key(data), data.get("dateTime"))
+        return (data.get("ticker"), data.get("classCode"))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        out = {
+            kind: {
+                "depth": queue.qsize(),
+                "max": queue.maxsize,
+                "policy": self.policies[kind],
+                "pending_conflated": len(self._conflated[kind]),
+                **self.counters[kind],
+            }
+            for kind, queue in self.queues.items()
+        }
+        if self.candles is not None:
+            out["candles"].update(self.candles.stats())
+        if self.synth is not None:
+            out["candles_synth"] = self.synth.stats()
+        if self.features is not None:
+            out["features"] = self.features.stats()
+        if self.spool is not None:
+            out["spool"] = self.spool.stats()
+        return out
+
+    async def run(self):
+        tasks = [asyncio.create_task(self._flush_loop(kind)) for kind in self.writers]
+        if self.config.candle_flush_ms > 0 and (self.candles is not None or self.synth is not None):
+            tasks.append(asyncio.create_task(self._candle_loop()))
+        if self.config.latest_flush_ms > 0:
+            tasks.append(asyncio.create_task(self._latest_loop()))
+        if self.features is not None:
+            tasks.append(asyncio.create_task(self.features.run()))
+        if self.config.ingest_stats_sec > 0:
+            tasks.append(asyncio.create_task(self._report_loop()))
+        if self.spool is not None:
+            tasks.append(asyncio.create_task(self.spool.run()))
+            tasks.append(asyncio.create_task(self._replay_loop()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+            await self._drain_all()
+            # written directly, not queued: with candles=block the queue may be full.
+            # After the drain, so the newest version of a bar is written last
+            for source in (self.candles, self.synth):
+                if source is not None:
+                    bars = source.take_dirty()
+                    for i in range(0, len(bars), self.batch_size):
+                        await self._write("candles", bars[i : i + self.batch_size])
+            await self._flush_latest()
+            if self.spool is not None:
+                self.spool.close()
+
+    async def _flush_loop(self, kind: str):
+        queue = self.queues[kind]
+        pending = self._conflated[kind]
+        ready = self._ready[kind]
+        while True:
+            batch: List[Dict[str, Any]] = []
+            if not pending:
+                # conflation only starts on a full queue, so an empty queue means nothing is pending
+                batch.append(await queue.get())
+                if queue.qsize() + 1 < self.batch_size:
+                    ready.clear()
+                    try:
+                        await asyncio.wait_for(ready.wait(), self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    except asyncio.CancelledError:
+                        # written by run() before the final drain, ahead of newer messages
+                        self._inflight[kind] = asyncio.ensure_future(self._write(kind, batch))
+                        raise
+            self._take(kind, batch)
+            # a cancelled flusher must not lose the batch it already dequeued
+            self._inflight[kind] = asyncio.ensure_future(self._write(kind, batch))
+            await asyncio.shield(self._inflight[kind])
+
+    def _take(self, kind: str, batch: List[Dict[str, Any]]):
+        queue = self.queues[kind]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        # conflated messages are newer than anything in the queue, so they go last
+        pending = self._conflated[kind]
+        while pending and len(batch) < self.batch_size and queue.empty():
+            batch.append(pending.pop(next(iter(pending))))
+
+    async def _write(self, kind: str, batch: List[Dict[str, Any]]):
+        started = time.monotonic()
+        counters = self.counters[kind]
+        # candles are upserts: a replay could put an older version of a bar over a newer one
+        spooled = self.spool is not None and kind in APPEND_ONLY
+        # while older rows wait in the spool, newer ones queue up behind them
+        if spooled and self.spool.pending(kind) and self._spool(kind, batch):
+            return
+        try:
+            failed = await self.writers[kind](batch) or 0
+        except Exception as exc:
+            if spooled and is_connection_error(exc) and self._spool(kind, batch):
+                log.warning(f"database unavailable, spooling {sanitize({'kind': kind, 'rows': len(batch), 'error': str(exc)})}")
+                return
+            counters["failed"] += len(batch)
+            log.error(f"flush error {sanitize({'kind': kind, 'rows': len(batch), 'error': str(exc)})}")
+            return
+        counters["written"] += len(batch) - failed
+        counters["failed"] += failed
+        counters["batches"] += 1
+        if log.isEnabledFor(10):
+            log.debug(
+                f"flush ok {sanitize({'kind': kind, 'rows': len(batch), 'ms': round((time.monotonic() - started) * 1000, 1)})}"
+            )
+
+    def _spool(self, kind: str, batch: List[Dict[str, Any]]) -> bool:
+        try:
+            stored = self.spool.append(kind, batch)
+        except OSError as exc:
+            log.error(f"spool write failed {sanitize({'kind': kind, 'rows': len(batch), 'error': str(exc)})}")
+            return False
+        if not stored:
+            log.error(f"spool full {sanitize({'kind': kind, 'rows': len(batch), 'max_mb': self.config.spool_max_mb})}")
+            return False
+        self.counters[kind]["spooled"] += len(batch)
+        return True
+
+    async def _replay_loop(self):
+        while True:
+            for kind in self.writers:
+                if not self.spool.pending(kind):
+                    continue
+                try:
+                    replayed = await self._replay(kind)
+                except Exception as exc:
+                    log.debug(f"spool replay paused {sanitize({'kind': kind, 'error': str(exc)})}")
+                    continue
+                log.info(f"spool replayed {sanitize({'kind': kind, 'rows': replayed})}")
+            await asyncio.sleep(self.config.spool_retry_sec)
+
+    async def _replay(self, kind: str) -> int:
+        """Loads the spool of ``kind`` back in order; raises while the database is down."""
+        counters = self.counters[kind]
+        replayed = 0
+        while True:
+            chunk = self.spool.read(kind, self.batch_size)
+            if chunk is None:
+                return replayed
+            rows, position = chunk
+            try:
+                failed = await self.writers[kind](rows) or 0
+            except Exception as exc:
+                if is_connection_error(exc):
+                    raise
+                # a batch the database rejects as a whole would block the spool forever
+                log.error(f"spool replay error, batch skipped {sanitize({'kind': kind, 'rows': len(rows), 'error': str(exc)})}")
+                failed = len(rows)
+            self.spool.commit(kind, position)
+            counters["replayed"] += len(rows) - failed
+            counters["written"] += len(rows) - failed
+            counters["failed"] += failed
+            counters["batches"] += 1
+            replayed += len(rows)
+
+    async def _drain_all(self):
+        for kind, queue in self.queues.items():
+            while not queue.empty() or self._conflated[kind]:
+                batch: List[Dict[str, Any]] = []
+                self._take(kind, batch)
+                await self._write(kind, batch)
+
+    async def _candle_loop(self):
+        interval = self.config.candle_flush_ms / 1000
+        while True:
+            await asyncio.sleep(interval)
+            for source in (self.candles, self.synth):
+                if source is not None:
+                    for bar in source.take_dirty():
+                        await self._enqueue("candles", bar)
+
+    async def _latest_loop(self):
+        interval = self.config.latest_flush_ms / 1000
+        while True:
+            await asyncio.sleep(interval)
+            await self._flush_latest()
+
+    async def _flush_latest(self):
+        quotes = list(self._latest["quotes"].values())
+        trades = list(self._latest["last_trades"].values())
+        books = list(self._latest["orderbook"].values())
+        if not (quotes or trades or books):
+            return
+        for latest in self._latest.values():
+            latest.clear()
+        try:
+            await self.db.upsert_latest(quotes, trades, books)
+        except Exception as exc:
+            log.error(f"market_latest error {sanitize({'error': str(exc)})}")
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.config.ingest_stats_sec)
+            log.info(f"ingest.stats {sanitize(self.stats())}")
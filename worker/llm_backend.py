@@ -8,6 +8,9 @@ from typing import Any
 import aiohttp
 
 from .config import Config
+from .logger import get_logger, sanitize
+
+log = get_logger("worker.llm_backend")
 
 
 def _normalize_backend(value: str | None) -> str:
@@ -34,97 +37,348 @@ async def _enqueue_job(session: aiohttp.ClientSession, base_url: str, payload: d
     return job_id
 
 
-async def _wait_job_result(
-    session: aiohttp.ClientSession,
-    base_url: str,
-    job_id: str,
-    timeout_sec: int,
-) -> dict[str, Any]:
-    url = f"{base_url.rstrip('/')}/v1/jobs/{job_id}"
-    started = time.monotonic()
-    timeout = max(3, timeout_sec)
+TERMINAL_FAILED = {"failed", "error", "cancelled", "canceled"}
+
+# Backoff between plain polls of one job when long-poll is not available
+POLL_MIN_SEC = 0.05
+POLL_MAX_SEC = 0.5
+# Non-terminal answers returned well before ``wait`` in a row before the
+# server is assumed to ignore the parameter
+SHORT_POLLS_LIMIT = 3
+
 
-    while True:
-        if time.monotonic() - started > timeout:
-            raise RuntimeError(f"llm_mcp job timeout id={job_id} timeout={timeout}s")
+class _Job:
+    __slots__ = ("session", "future", "timeout", "deadline", "next_at", "delay", "request")
+
+    def __init__(self, session: aiohttp.ClientSession, future: asyncio.Future, timeout: int):
+        self.session = session
+        self.future = future
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.next_at = 0.0
+        self.delay = 0.0
+        self.request: asyncio.Task | None = None
+
+
+class JobWaiter:
+    """Waits for many llm_mcp jobs from a single request loop.
+
+    Every pending job has at most one ``GET /v1/jobs/{id}?wait=N`` in flight;
+    llm_mcp holds a long-poll request until the job finishes or ``N`` seconds
+    pass, so a result arrives as soon as it is ready. If the server answers
+    non-terminal states early several times in a row it does not support
+    ``wait``, and the waiter switches to plain polls with per-job exponential
+    backoff (``POLL_MIN_SEC`` doubling up to ``POLL_MAX_SEC``).
+    """
+
+    def __init__(self, base_url: str, wait_sec: int):
+        self.base_url = base_url.rstrip("/")
+        self.wait_sec = max(0, wait_sec)
+        self.long_poll = self.wait_sec > 0
+        self.loop = asyncio.get_running_loop()
+        self._jobs: dict[str, _Job] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._short_polls = 0
+
+    async def wait(self, session: aiohttp.ClientSession, job_id: str, timeout_sec: int) -> dict[str, Any]:
+        timeout = max(3, timeout_sec)
+        job = _Job(session, self.loop.create_future(), timeout)
+        self._jobs[job_id] = job
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        try:
+            return await job.future
+        finally:
+            if self._jobs.get(job_id) is job:
+                del self._jobs[job_id]
+                if job.request is not None:
+                    job.request.cancel()
+                self._wakeup.set()
+
+    async def _run(self):
+        try:
+            await self._loop()
+        except BaseException as exc:
+            for job in self._jobs.values():
+                if not job.future.done():
+                    job.future.set_exception(RuntimeError(f"llm_mcp job waiter stopped: {exc!r}"))
+            raise
 
-        async with session.get(url) as resp:
+    async def _loop(self):
+        requests: dict[asyncio.Task, str] = {}
+        while self._jobs:
+            now = time.monotonic()
+            wake_at = None
+            for job_id, job in list(self._jobs.items()):
+                if job.future.done():
+                    continue
+                if now >= job.deadline:
+                    job.future.set_exception(
+                        RuntimeError(f"llm_mcp job timeout id={job_id} timeout={job.timeout}s")
+                    )
+                    continue
+                if job.request is None and job.next_at <= now:
+                    job.request = asyncio.create_task(self._fetch(job_id, job, job.deadline - now))
+                    requests[job.request] = job_id
+                pending_at = job.deadline if job.request is not None else min(job.next_at, job.deadline)
+                wake_at = pending_at if wake_at is None else min(wake_at, pending_at)
+
+            self._wakeup.clear()
+            wakeup = asyncio.create_task(self._wakeup.wait())
+            timeout = None if wake_at is None else max(0.0, wake_at - time.monotonic())
+            done, _ = await asyncio.wait(
+                [wakeup, *requests], timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            wakeup.cancel()
+            for task in done:
+                job_id = requests.pop(task, None)
+                if job_id is not None:
+                    self._handle(job_id, task)
+
+    async def _fetch(self, job_id: str, job: _Job, remaining: float) -> tuple[dict[str, Any], float, float]:
+        url = f"{self.base_url}/v1/jobs/{job_id}"
+        wait = min(self.wait_sec, int(remaining)) if self.long_poll else 0
+        params = {"wait": str(wait)} if wait > 0 else None
+        started = time.monotonic()
+        async with job.session.get(url, params=params) as resp:
             body = await resp.text()
             if resp.status != 200:
                 raise RuntimeError(f"llm_mcp job read failed status={resp.status} body={body[:280]}")
-
         try:
-            job = json.loads(body)
+            data = json.loads(body)
         except json.JSONDecodeError as exc:
             raise RuntimeError("llm_mcp job invalid json") from exc
+        if not isinstance(data, dict):
+            raise RuntimeError("llm_mcp job invalid json")
+        return data, wait, time.monotonic() - started
 
-        status = str(job.get("status") or "").lower()
+    def _handle(self, job_id: str, task: asyncio.Task):
+        job = self._jobs.get(job_id)
+        if job is None or job.request is not task or job.future.done():
+            return
+        job.request = None
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            job.future.set_exception(task.exception())
+            return
+        data, wait, elapsed = task.result()
+        status = str(data.get("status") or "").lower()
         if status == "done":
-            result = job.get("result")
+            result = data.get("result")
             if isinstance(result, dict):
-                return result
-            raise RuntimeError("llm_mcp job done without structured result")
-        if status in {"failed", "error", "cancelled", "canceled"}:
-            raise RuntimeError(f"llm_mcp job {status}: {job.get('error') or 'unknown'}")
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(RuntimeError("llm_mcp job done without structured result"))
+            return
+        if status in TERMINAL_FAILED:
+            job.future.set_exception(RuntimeError(f"llm_mcp job {status}: {data.get('error') or 'unknown'}"))
+            return
 
-        await asyncio.sleep(0.5)
+        if wait > 0:
+            if elapsed < wait / 2:
+                self._short_polls += 1
+                if self._short_polls >= SHORT_POLLS_LIMIT:
+                    self.long_poll = False
+                    log.info(f"llm_mcp long-poll unsupported, polling {sanitize({'base_url': self.base_url})}")
+            else:
+                self._short_polls = 0
+        if self.long_poll and wait > 0:
+            job.next_at = 0.0
+        else:
+            job.delay = min(POLL_MAX_SEC, job.delay * 2) if job.delay else POLL_MIN_SEC
+            job.next_at = time.monotonic() + job.delay
 
 
-async def embed_text(session: aiohttp.ClientSession, config: Config, text: str) -> list[float]:
-    backend = _normalize_backend(config.llm_backend)
+_waiters: dict[str, JobWaiter] = {}
+
+
+def job_waiter(base_url: str, wait_sec: int) -> JobWaiter:
+    """The shared waiter of ``base_url`` in the running event loop."""
+    waiter = _waiters.get(base_url)
+    if waiter is None or waiter.loop is not asyncio.get_running_loop():
+        waiter = JobWaiter(base_url, wait_sec)
+        _waiters[base_url] = waiter
+    return waiter
+
+
+async def _wait_job_result(
+    session: aiohttp.ClientSession,
+    base_url: str,
+    job_id: str,
+    timeout_sec: int,
+    wait_sec: int = 0,
+) -> dict[str, Any]:
+    return await job_waiter(base_url, wait_sec).wait(session, job_id, timeout_sec)
 
+
+def _float_list(values: Any) -> list[float]:
+    out: list[float] = []
+    if not isinstance(values, list):
+        return out
+    for item in values:
+        try:
+            out.append(float(item))
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+def _mcp_provider(config: Config) -> str:
+    provider = config.llm_mcp_provider
+    if provider not in {"auto", "ollama"}:
+        provider = "auto"
+    return provider
+
+
+def embedding_source(config: Config, backend: str | None = None) -> str:
+    """Who produces the vectors of ``backend`` (the configured one by default):
+    backend, llm_mcp provider and model. Vectors of different sources are not
+    interchangeable."""
+    backend = _normalize_backend(backend or config.llm_backend)
     if backend == "llm_mcp":
-        provider = config.llm_mcp_provider
-        if provider not in {"auto", "ollama"}:
-            provider = "auto"
-
-        payload: dict[str, Any] = {
-            "task": "embed",
-            "provider": provider,
-            "prompt": text,
-            "source": "bcs-mcp",
-            "priority": 2,
-            "max_attempts": 2,
-        }
-        if config.ollama_embed_model:
-            payload["model"] = config.ollama_embed_model
+        return f"llm_mcp/{_mcp_provider(config)}/{config.ollama_embed_model}"
+    return f"ollama/{config.ollama_embed_model}"
+
+
+def _mcp_embed_payload(config: Config, texts: list[str]) -> dict[str, Any]:
+    payload: dict[str, Any] = {
+        "task": "embed",
+        "provider": _mcp_provider(config),
+        "source": "bcs-mcp",
+        "priority": 2,
+        "max_attempts": 2,
+    }
+    if len(texts) == 1:
+        payload["prompt"] = texts[0]
+    else:
+        payload["prompts"] = texts
+    if config.ollama_embed_model:
+        payload["model"] = config.ollama_embed_model
+    return payload
 
+
+async def _mcp_embed_job(session: aiohttp.ClientSession, config: Config, texts: list[str]) -> list[list[float]]:
+    """One llm_mcp job for ``texts``; returns ``[]`` if the job ignored ``prompts``."""
+    job_id = await _enqueue_job(session, config.llm_mcp_base_url, _mcp_embed_payload(config, texts))
+    result = await _wait_job_result(
+        session=session,
+        base_url=config.llm_mcp_base_url,
+        job_id=job_id,
+        timeout_sec=config.llm_backend_timeout_sec,
+        wait_sec=config.llm_mcp_job_wait_sec,
+    )
+    data = result.get("data")
+    if not isinstance(data, dict):
+        raise RuntimeError("llm_mcp embed result missing data")
+    if len(texts) == 1:
+        embedding = _float_list(data.get("embedding"))
+        if not embedding:
+            raise RuntimeError("llm_mcp embed result missing embedding")
+        return [embedding]
+    embeddings = data.get("embeddings")
+    if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+        return []
+    return [_float_list(item) for item in embeddings]
+
+
+# Multi-prompt jobs stay off until this ``time.monotonic()`` value once llm_mcp
+# finishes one without an embeddings list, then are tried again in case
+# llm_mcp was upgraded
+MULTI_PROMPT_RETRY_SEC = 600
+_mcp_multi_prompt_off_until = 0.0
+
+
+async def _mcp_embed(session: aiohttp.ClientSession, config: Config, texts: list[str]) -> list[list[float]]:
+    global _mcp_multi_prompt_off_until
+    if len(texts) > 1 and config.llm_mcp_batch_embed and time.monotonic() >= _mcp_multi_prompt_off_until:
         try:
-            job_id = await _enqueue_job(session, config.llm_mcp_base_url, payload)
-            result = await _wait_job_result(
-                session=session,
-                base_url=config.llm_mcp_base_url,
-                job_id=job_id,
-                timeout_sec=config.llm_backend_timeout_sec,
-            )
-            data = result.get("data")
-            if not isinstance(data, dict):
-                raise RuntimeError("llm_mcp embed result missing data")
-            embedding = data.get("embedding")
-            if not isinstance(embedding, list):
-                raise RuntimeError("llm_mcp embed result missing embedding")
-            out: list[float] = []
-            for item in embedding:
-                try:
-                    out.append(float(item))
-                except (TypeError, ValueError):
-                    continue
+            out = await _mcp_embed_job(session, config, texts)
             if out:
                 return out
-            raise RuntimeError("llm_mcp embed result empty")
+            _mcp_multi_prompt_off_until = time.monotonic() + MULTI_PROMPT_RETRY_SEC
+            log.info(
+                f"llm_mcp multi-prompt embed unsupported, using single prompts {sanitize({'retry_sec': MULTI_PROMPT_RETRY_SEC})}"
+            )
+        except Exception as exc:
+            # a failed job says nothing about prompts support: only this batch goes one by one
+            log.warning(f"llm_mcp multi-prompt embed failed {sanitize({'texts': len(texts), 'error': str(exc)})}")
+    results = await asyncio.gather(
+        *(_mcp_embed_job(session, config, [text]) for text in texts),
+        return_exceptions=True,
+    )
+    if all(isinstance(item, BaseException) for item in results):
+        raise results[0]
+    return [[] if isinstance(item, BaseException) else item[0] for item in results]
+
+
+# cleared when the Ollama server predates /api/embed (404)
+_ollama_batch_endpoint = True
+
+
+async def _ollama_embed(session: aiohttp.ClientSession, config: Config, texts: list[str]) -> list[list[float]]:
+    global _ollama_batch_endpoint
+    base_url = config.ollama_base_url.rstrip("/")
+    if _ollama_batch_endpoint:
+        payload = {"model": config.ollama_embed_model, "input": texts}
+        async with session.post(base_url + "/api/embed", json=payload) as resp:
+            if resp.status != 404:
+                resp.raise_for_status()
+                data = await resp.json()
+                embeddings = data.get("embeddings")
+                if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+                    raise RuntimeError("ollama embed returned a wrong number of embeddings")
+                return [_float_list(item) for item in embeddings]
+        _ollama_batch_endpoint = False
+
+    out: list[list[float]] = []
+    for text in texts:
+        payload = {"model": config.ollama_embed_model, "prompt": text}
+        async with session.post(base_url + "/api/embeddings", json=payload) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+            out.append(_float_list(data.get("embedding")))
+    return out
+
+
+async def embed_texts_with_sources(
+    session: aiohttp.ClientSession, config: Config, texts: list[str]
+) -> tuple[list[list[float]], list[str]]:
+    """Embeddings for ``texts`` in order, with the ``embedding_source`` of each.
+
+    An empty embedding marks a text the backend skipped. llm_mcp gets one
+    multi-prompt job (one job per text if it does not support that), Ollama
+    gets one ``/api/embed`` request with an array input. Texts llm_mcp could
+    not embed go to Ollama when ``LLM_BACKEND_FALLBACK_OLLAMA`` is set, and
+    are tagged with the Ollama source.
+    """
+    if not texts:
+        return [], []
+    if _normalize_backend(config.llm_backend) == "llm_mcp":
+        try:
+            out = await _mcp_embed(session, config, texts)
+            sources = [embedding_source(config)] * len(out)
+            if all(out) or not config.llm_backend_fallback_ollama:
+                return out, sources
+            missing = [i for i, item in enumerate(out) if not item]
+            retried = await _ollama_embed(session, config, [texts[i] for i in missing])
+            for i, item in zip(missing, retried):
+                out[i] = item
+                sources[i] = embedding_source(config, "ollama")
+            return out, sources
         except Exception:
             if not config.llm_backend_fallback_ollama:
                 raise
+    out = await _ollama_embed(session, config, texts)
+    return out, [embedding_source(config, "ollama")] * len(out)
 
-    url = config.ollama_base_url.rstrip("/") + "/api/embeddings"
-    payload = {
-        "model": config.ollama_embed_model,
-        "prompt": text,
-    }
-    async with session.post(url, json=payload) as resp:
-        resp.raise_for_status()
-        data = await resp.json()
-        embedding = data.get("embedding")
-        if isinstance(embedding, list):
-            return [float(item) for item in embedding]
-        return []
+
+async def embed_texts(session: aiohttp.ClientSession, config: Config, texts: list[str]) -> list[list[float]]:
+    """Embeddings for ``texts`` in order; see ``embed_texts_with_sources``."""
+    return (await embed_texts_with_sources(session, config, texts))[0]
+
+
+async def embed_text(session: aiohttp.ClientSession, config: Config, text: str) -> list[float]:
+    return (await embed_texts(session, config, [text]))[0]
@@ -12,7 +12,12 @@ from .streams import (
     MarginalStream,
 )
 from .embeddings import run_embedding_worker
+from .ingest import IngestPipeline
+from .partitions import run_partition_maintenance
+from .rollups import run_rollup_maintenance
+from .vector_index import run_vector_index_maintenance
 from .logger import setup_logging, get_logger, sanitize
+from .ws import WsSupervisor
 
 
 async def main():
@@ -46,22 +51,41 @@ async def main():
             log.warning("no instruments in DB; fallback to env list")
     log.debug(f"config {sanitize(config.__dict__)}")
 
-    auth = AuthClient(config.refresh_token, config.client_id)
+    auth = AuthClient(config.refresh_token, config.client_id, config.token_refresh_margin_sec)
+    ws = WsSupervisor(auth, config)
+
+    # extra processes started for BCS_MARKET_PROCESSES carry market shards only
+    market_only = config.market_process_index > 0
+    if market_only:
+        log.info(
+            f"market shard process {sanitize({'index': config.market_process_index, 'processes': config.market_processes})}"
+        )
 
     tasks = []
     if has_token and config.stream_market:
-        tasks.append(asyncio.create_task(MarketStream(auth, db, config).run()))
-    if has_token and config.stream_portfolio:
-        tasks.append(asyncio.create_task(PortfolioStream(auth, db).run()))
-    if has_token and config.stream_orders:
-        tasks.append(asyncio.create_task(OrdersStream(auth, db).run()))
-    if has_token and config.stream_limits:
-        tasks.append(asyncio.create_task(LimitsStream(auth, db).run()))
-    if has_token and config.stream_marginal:
-        tasks.append(asyncio.create_task(MarginalStream(auth, db).run()))
-
-    # Embeddings worker is always on
-    tasks.append(asyncio.create_task(run_embedding_worker(db, config)))
+        ingest = IngestPipeline(db, config)
+        tasks.append(asyncio.create_task(ingest.run()))
+        tasks.append(asyncio.create_task(MarketStream(ws, db, config, ingest).run()))
+    if has_token and config.stream_portfolio and not market_only:
+        tasks.append(asyncio.create_task(PortfolioStream(ws, db).run()))
+    if has_token and config.stream_orders and not market_only:
+        tasks.append(asyncio.create_task(OrdersStream(ws, db).run()))
+    if has_token and config.stream_limits and not market_only:
+        tasks.append(asyncio.create_task(LimitsStream(ws, db).run()))
+    if has_token and config.stream_marginal and not market_only:
+        tasks.append(asyncio.create_task(MarginalStream(ws, db).run()))
+    if tasks:
+        tasks.append(asyncio.create_task(ws.run()))
+
+    if not market_only:
+        # Embeddings worker is always on
+        tasks.append(asyncio.create_task(run_embedding_worker(db, config)))
+        if config.partition_check_sec > 0:
+            tasks.append(asyncio.create_task(run_partition_maintenance(db, config)))
+        if config.vector_index_check_sec > 0:
+            tasks.append(asyncio.create_task(run_vector_index_maintenance(db, config)))
+        if config.rollup_refresh_sec > 0:
+            tasks.append(asyncio.create_task(run_rollup_maintenance(db, config)))
 
     if not tasks:
         log.warning("no tasks configured; sleeping")
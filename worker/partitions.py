@@ -0,0 +1,208 @@
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+
+from .config import Config
+from .db import Db
+from .logger import get_logger, sanitize
+
+log = get_logger("worker.partitions")
+
+# table -> (database, period). High-rate tick tables are split by day,
+# everything else by month. All of them are RANGE-partitioned on ts.
+PARTITIONED_TABLES: Dict[str, Tuple[str, str]] = {
+    "quotes": ("market", "day"),
+    "last_trades": ("market", "day"),
+    "order_book_snapshots": ("market", "day"),
+    "candles": ("market", "month"),
+    "ohlcv_rollups": ("market", "month"),
+    "trading_status_snapshots": ("market", "month"),
+    "trading_schedule_snapshots": ("market", "month"),
+    "instrument_discounts": ("market", "month"),
+    "wallet_operations": ("private", "month"),
+    "holdings_snapshots": ("private", "month"),
+    "order_events": ("private", "month"),
+    "limits_snapshots": ("private", "month"),
+    "marginal_indicators_snapshots": ("private", "month"),
+    "trades": ("private", "month"),
+    "pnl_events": ("private", "month"),
+}
+
+# Stray rows are moved out of a default partition into at most this many
+# partitions per table and pass, so a large backlog does not hold locks for long.
+MAX_MOVES_PER_PASS = 31
+
+# Suffix of partitions detached by retention, which frees the partition name
+# for a later backfill of the same range
+ARCHIVED_SUFFIX = "_archived"
+
+
+def period_start(ts: datetime, period: str) -> datetime:
+    ts = ts.astimezone(timezone.utc)
+    if period == "day":
+        return datetime(ts.year, ts.month, ts.day, tzinfo=timezone.utc)
+    return datetime(ts.year, ts.month, 1, tzinfo=timezone.utc)
+
+
+def next_period(start: datetime, period: str) -> datetime:
+    if period == "day":
+        return start + timedelta(days=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(table: str, start: datetime, period: str) -> str:
+    suffix = start.strftime("%Y%m%d" if period == "day" else "%Y%m")
+    return f"{table}_p{suffix}"
+
+
+def _parse_partition_start(table: str, name: str, period: str) -> Optional[datetime]:
+    pattern = r"\d{8}" if period == "day" else r"\d{6}"
+    match = re.fullmatch(rf"{re.escape(table)}_p({pattern})", name)
+    if not match:
+        return None
+    fmt = "%Y%m%d" if period == "day" else "%Y%m"
+    return datetime.strptime(match.group(1), fmt).replace(tzinfo=timezone.utc)
+
+
+async def _partitions(conn: asyncpg.Connection, table: str) -> List[str]:
+    rows = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = $1
+        """,
+        table,
+    )
+    return [r["relname"] for r in rows]
+
+
+async def ensure_default_ts_index(conn: asyncpg.Connection, table: str):
+    """Index on ``ts`` of ``<table>_default`` alone, for the stray-row probes.
+
+    Only rows outside every partition land in the default partition, so the
+    index costs the regular write path nothing.
+    """
+    index = f"{table}_default_ts_idx"
+    if not await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", index):
+        await conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table}_default (ts)")
+
+
+async def ensure_partition(
+    conn: asyncpg.Connection, table: str, start: datetime, period: str
+) -> Optional[int]:
+    """Create the range partition starting at ``start`` if it is missing.
+
+    Rows of that range already sitting in ``<table>_default`` are moved into
+    the new partition in the same transaction. Returns the number of rows
+    moved, or None if the partition already existed.
+    """
+    name = partition_name(table, start, period)
+    end = next_period(start, period)
+    exists = await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", name)
+    if exists:
+        return None
+    default = f"{table}_default"
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    # probed before any lock; a row arriving after the probe makes the plain
+    # CREATE fail its default-partition check, and the next pass moves it
+    stray = await conn.fetchval(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE ts >= $1 AND ts < $2)", start, end
+    )
+    moved = 0
+    async with conn.transaction():
+        if not stray:
+            await conn.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}")
+        else:
+            # blocks inserts into the default partition until the range is attached
+            await conn.execute(f"LOCK TABLE {default} IN SHARE ROW EXCLUSIVE MODE")
+            await conn.execute(
+                f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+            status = await conn.execute(
+                f"""
+                WITH moved AS (
+                  DELETE FROM {default} WHERE ts >= $1 AND ts < $2 RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+                """,
+                start,
+                end,
+            )
+            moved = int(status.split()[-1])
+            await conn.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {bounds}")
+    log.info(f"partition created {sanitize({'table': table, 'partition': name, 'moved': moved})}")
+    return moved
+
+
+async def archive_partition(conn: asyncpg.Connection, table: str, name: str) -> str:
+    """Detaches ``name`` and renames it with ``ARCHIVED_SUFFIX``; returns the new name."""
+    archived = f"{name}{ARCHIVED_SUFFIX}"
+    n = 1
+    while await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", archived):
+        # the same range expired before, after a backfill had re-created it
+        n += 1
+        archived = f"{name}{ARCHIVED_SUFFIX}{n}"
+    async with conn.transaction():
+        await conn.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        await conn.execute(f"ALTER TABLE {name} RENAME TO {archived}")
+    return archived
+
+
+async def maintain_table(conn: asyncpg.Connection, table: str, period: str, config: Config):
+    now = datetime.now(timezone.utc)
+
+    # pre-create the current period and a few ahead
+    start = period_start(now, period)
+    for _ in range(max(0, config.partition_premake) + 1):
+        await ensure_partition(conn, table, start, period)
+        start = next_period(start, period)
+
+    # move stray rows (backfills, clock skew) out of the default partition,
+    # jumping from one stray row to the next instead of walking empty periods
+    await ensure_default_ts_index(conn, table)
+    stray = await conn.fetchval(f"SELECT min(ts) FROM {table}_default")
+    next_stray = f"SELECT min(ts) FROM {table}_default WHERE ts >= $1"
+    moves = 0
+    while stray is not None and moves < MAX_MOVES_PER_PASS:
+        start = period_start(stray, period)
+        if await ensure_partition(conn, table, start, period):
+            moves += 1
+        stray = await conn.fetchval(next_stray, next_period(start, period))
+
+    retention_days = config.partition_retention.get(table, 0)
+    if retention_days <= 0:
+        return
+    cutoff = now - timedelta(days=retention_days)
+    for name in await _partitions(conn, table):
+        part_start = _parse_partition_start(table, name, period)
+        if part_start is None or next_period(part_start, period) > cutoff:
+            continue
+        details = {"table": table, "partition": name, "mode": config.partition_retention_mode}
+        if config.partition_retention_mode == "drop":
+            await conn.execute(f"DROP TABLE {name}")
+        else:
+            # kept for archiving under another name, never touched again
+            details["archived_as"] = await archive_partition(conn, table, name)
+        log.info(f"partition expired {sanitize(details)}")
+
+
+async def run_partition_maintenance(db: Db, config: Config):
+    log.info(
+        f"partition maintenance started {sanitize({'premake': config.partition_premake, 'retention': config.partition_retention, 'mode': config.partition_retention_mode})}"
+    )
+    pools = {"market": db.market, "private": db.private}
+    while True:
+        for table, (database, period) in PARTITIONED_TABLES.items():
+            try:
+                async with pools[database].acquire() as conn:
+                    await maintain_table(conn, table, period, config)
+            except Exception as exc:
+                log.error(f"partition maintenance error {sanitize({'table': table, 'error': str(exc)})}")
+        await asyncio.sleep(config.partition_check_sec)
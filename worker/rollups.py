@@ -0,0 +1,161 @@
+"""Incremental OHLCV rollups of ``last_trades`` and ``quotes``.
+
+Every pass folds the rows with ``(xid, id)`` above the source's watermark into
+``ohlcv_rollups`` for all ``BUCKETS`` at once and moves the watermark in the
+same transaction, so each row is counted exactly once. Rows are merged by
+their own ``ts``: open/close keep the earliest/latest price, high/low and the
+sums combine, so late rows (e.g. a replayed spool) land in the right bucket.
+
+``xid`` is the transaction that wrote the row. Ids are drawn before the row
+commits, so an id watermark could pass a row that commits later; a pass
+instead only takes rows whose ``xid`` is below the oldest transaction still
+in progress (``pg_snapshot_xmin``). Those writers have all finished, however
+long they took, and every row written later sorts above the watermark.
+``market.aggregate`` adds the rows above the watermark from the source table
+itself, so answers stay current.
+"""
+
+import asyncio
+from typing import Dict, Optional, Tuple
+
+import asyncpg
+
+from .config import Config
+from .db import Db
+from .logger import get_logger, sanitize
+
+log = get_logger("worker.rollups")
+
+BUCKETS = (1, 60, 300, 3600)
+
+# source table -> (price column, quantity column)
+SOURCES: Dict[str, Tuple[str, Optional[str]]] = {
+    "last_trades": ("price", "quantity"),
+    "quotes": ("last", None),
+}
+
+
+def rollup_sql(source: str) -> str:
+    price, quantity = SOURCES[source]
+    quantity = quantity or "NULL::numeric"
+    # rows are aggregated to the finest bucket once; coarser buckets combine those
+    # partial bars, which keep the ts of their first and last price for ordering
+    return f"""
+    WITH src AS (
+      SELECT id, ticker, class_code, ts, {price} AS price, {quantity} AS quantity
+      FROM {source}
+      WHERE (xid, id) > ($1, $2) AND (xid, id) <= ($3, $4)
+    ),
+    base AS MATERIALIZED (
+      SELECT ticker, class_code,
+             to_timestamp(floor(extract(epoch FROM ts) / {BUCKETS[0]}) * {BUCKETS[0]}) AS ts,
+             (array_agg(price ORDER BY ts, id) FILTER (WHERE price IS NOT NULL))[1] AS open,
+             max(price) AS high,
+             min(price) AS low,
+             (array_agg(price ORDER BY ts DESC, id DESC) FILTER (WHERE price IS NOT NULL))[1] AS close,
+             min(ts) FILTER (WHERE price IS NOT NULL) AS open_ts,
+             max(ts) FILTER (WHERE price IS NOT NULL) AS close_ts,
+             count(*) AS count,
+             count(price) AS value_count,
+             COALESCE(sum(price), 0) AS value_sum,
+             COALESCE(sum(quantity), 0) AS volume,
+             COALESCE(sum(price * quantity), 0) AS turnover
+      FROM src
+      GROUP BY 1, 2, 3
+    ),
+    merged AS (
+      INSERT INTO ohlcv_rollups AS r
+        (source, ticker, class_code, bucket_sec, ts, open, high, low, close, open_ts, close_ts,
+         count, value_count, value_sum, volume, turnover, updated_at)
+      SELECT '{source}', ticker, class_code, b.sec,
+             to_timestamp(floor(extract(epoch FROM ts) / b.sec) * b.sec) AS bucket,
+             (array_agg(open ORDER BY open_ts) FILTER (WHERE open_ts IS NOT NULL))[1],
+             max(high),
+             min(low),
+             (array_agg(close ORDER BY close_ts DESC) FILTER (WHERE close_ts IS NOT NULL))[1],
+             min(open_ts),
+             max(close_ts),
+             sum(count),
+             sum(value_count),
+             sum(value_sum),
+             sum(volume),
+             sum(turnover),
+             now()
+      FROM base CROSS JOIN unnest($5::int[]) AS b(sec)
+      GROUP BY ticker, class_code, b.sec, bucket
+      ON CONFLICT (source, ticker, class_code, bucket_sec, ts) DO UPDATE SET
+        open = CASE WHEN r.open_ts IS NULL OR EXCLUDED.open_ts < r.open_ts THEN EXCLUDED.open ELSE r.open END,
+        open_ts = LEAST(r.open_ts, EXCLUDED.open_ts),
+        close = CASE WHEN r.close_ts IS NULL OR EXCLUDED.close_ts >= r.close_ts THEN EXCLUDED.close ELSE r.close END,
+        close_ts = GREATEST(r.close_ts, EXCLUDED.close_ts),
+        high = GREATEST(r.high, EXCLUDED.high),
+        low = LEAST(r.low, EXCLUDED.low),
+        count = r.count + EXCLUDED.count,
+        value_count = r.value_count + EXCLUDED.value_count,
+        value_sum = r.value_sum + EXCLUDED.value_sum,
+        volume = r.volume + EXCLUDED.volume,
+        turnover = r.turnover + EXCLUDED.turnover,
+        updated_at = now()
+    )
+    -- rows folded, for the log
+    SELECT count(*) FROM src
+    """
+
+
+async def refresh_source(conn: asyncpg.Connection, source: str, chunk: int) -> int:
+    """Folds the settled rows above the watermark into the rollups; returns rows folded."""
+    folded = 0
+    while True:
+        async with conn.transaction():
+            mark = await conn.fetchrow(
+                "SELECT last_xid AS xid, last_id AS id FROM rollup_watermarks WHERE source = $1 FOR UPDATE",
+                source,
+            )
+            after = (mark["xid"], mark["id"]) if mark else (0, 0)
+            # writers below the oldest one still running have all committed or aborted
+            horizon = await conn.fetchval("SELECT pg_snapshot_xmin(pg_current_snapshot())")
+            bound = await conn.fetchrow(
+                f"""
+                SELECT xid, id FROM {source}
+                WHERE (xid, id) > ($1, $2) AND xid < $3
+                ORDER BY xid, id OFFSET $4 - 1 LIMIT 1
+                """,
+                *after,
+                horizon,
+                chunk,
+            )
+            if not bound and horizon <= after[0]:
+                # a writer older than the watermark is still running
+                return folded
+            # the chunk-th settled row, or everything below the horizon
+            upto = (bound["xid"], bound["id"]) if bound else (horizon, 0)
+            count = await conn.fetchval(rollup_sql(source), *after, *upto, list(BUCKETS))
+            await conn.execute(
+                """
+                INSERT INTO rollup_watermarks (source, last_xid, last_id, updated_at)
+                VALUES ($1, $2, $3, now())
+                ON CONFLICT (source) DO UPDATE
+                  SET last_xid = EXCLUDED.last_xid, last_id = EXCLUDED.last_id, updated_at = now()
+                """,
+                source,
+                *upto,
+            )
+        folded += count
+        if not bound:
+            return folded
+
+
+async def run_rollup_maintenance(db: Db, config: Config):
+    log.info(
+        f"rollup maintenance started {sanitize({'sources': list(SOURCES), 'buckets': list(BUCKETS), 'refresh_sec': config.rollup_refresh_sec})}"
+    )
+    while True:
+        for source in SOURCES:
+            try:
+                async with db.market.acquire() as conn:
+                    folded = await refresh_source(conn, source, max(1, config.rollup_chunk_rows))
+                    if folded:
+                        log.debug(f"rollup refreshed {sanitize({'source': source, 'rows': folded})}")
+            except Exception as exc:
+                log.error(f"rollup error {sanitize({'source': source, 'error': str(exc)})}")
+        await asyncio.sleep(config.rollup_refresh_sec)
@@ -0,0 +1,264 @@
+"""Append-only disk spool for market batches Postgres could not take.
+
+Every data type has its own directory of numbered segment files. A batch is
+one frame: ``length``, ``crc32`` and codec (``>IIB``) followed by the rows,
+packed with msgpack (``msgspec``) or, without it, as JSON. Appends go
+straight to the file descriptor and are fsynced in groups every
+``spool_fsync_ms`` (0 — after each append).
+
+Frames are read back in append order. The read position of a type is kept
+in its ``cursor`` file, so a restart resumes where the replay stopped; a
+batch replayed just before a crash may be written twice. Fully replayed
+segments are deleted. After a restart appends always start a new segment,
+so a torn tail of the previous run is never followed by good frames.
+"""
+
+import asyncio
+import json
+import os
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from .db import RawJson
+from .logger import get_logger, sanitize
+
+try:
+    import msgspec
+except ImportError:  # optional: frames are written as JSON
+    msgspec = None
+
+log = get_logger("worker.spool")
+
+FRAME = struct.Struct(">IIB")
+CODEC_MSGPACK = 1
+CODEC_JSON = 2
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor"
+
+# (segment number, byte offset)
+Position = Tuple[int, int]
+
+
+def _segment_name(number: int) -> str:
+    return f"{number:012d}{SEGMENT_SUFFIX}"
+
+
+class _Lane:
+    """Segments, head and read cursor of one data type."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.segments = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[: -len(SEGMENT_SUFFIX)].isdigit()
+        )
+        self.sizes = {number: os.path.getsize(self.path(number)) for number in self.segments}
+        self.cursor: Position = self._load_cursor()
+        self.fd: Optional[int] = None
+        self.dirty = False
+
+    def path(self, number: int) -> str:
+        return os.path.join(self.directory, _segment_name(number))
+
+    def _load_cursor(self) -> Position:
+        first = self.segments[0] if self.segments else 1
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                number, offset = (int(part) for part in f.read().split())
+        except (OSError, ValueError):
+            return first, 0
+        if number not in self.sizes:
+            return first, 0
+        return number, min(offset, self.sizes[number])
+
+    def save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{self.cursor[0]} {self.cursor[1]}")
+        os.replace(path + ".tmp", path)
+
+    @property
+    def head(self) -> Optional[int]:
+        return self.segments[-1] if self.segments else None
+
+    def pending(self) -> bool:
+        if not self.segments:
+            return False
+        number, offset = self.cursor
+        return number != self.head or offset < self.sizes[number]
+
+    def bytes(self) -> int:
+        return sum(self.sizes.values())
+
+
+class Spool:
+    def __init__(self, directory: str, segment_bytes: int, max_bytes: int, fsync_ms: int):
+        self.directory = directory
+        self.segment_bytes = max(1, segment_bytes)
+        self.max_bytes = max_bytes
+        self.fsync_ms = fsync_ms
+        self._lanes: Dict[str, _Lane] = {}
+        self._encoder = msgspec.msgpack.Encoder(enc_hook=str) if msgspec is not None else None
+        self.counters = {"frames": 0, "fsyncs": 0, "corrupt": 0, "rejected": 0}
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if os.path.isdir(os.path.join(directory, name)):
+                lane = self._lane(name)
+                if lane.pending():
+                    log.warning(
+                        f"spool has unreplayed data {sanitize({'kind': name, 'segments': len(lane.segments), 'bytes': lane.bytes()})}"
+                    )
+
+    def _lane(self, kind: str) -> _Lane:
+        lane = self._lanes.get(kind)
+        if lane is None:
+            lane = self._lanes[kind] = _Lane(os.path.join(self.directory, kind))
+        return lane
+
+    def pending(self, kind: str) -> bool:
+        lane = self._lanes.get(kind)
+        return lane is not None and lane.pending()
+
+    def bytes(self) -> int:
+        return sum(lane.bytes() for lane in self._lanes.values())
+
+    # --- writing -------------------------------------------------------------
+
+    def _encode(self, rows: List[Dict[str, Any]]) -> Tuple[int, bytes]:
+        if self._encoder is not None:
+            return CODEC_MSGPACK, self._encoder.encode(rows)
+        return CODEC_JSON, json.dumps(rows).encode("utf-8")
+
+    def append(self, kind: str, rows: List[Dict[str, Any]]) -> bool:
+        """Appends one batch; False when the spool is over ``max_bytes``."""
+        codec, payload = self._encode(rows)
+        frame = FRAME.pack(len(payload), zlib.crc32(payload), codec) + payload
+        if self.max_bytes > 0 and self.bytes() + len(frame) > self.max_bytes:
+            self.counters["rejected"] += 1
+            return False
+        lane = self._lane(kind)
+        if lane.fd is None or lane.sizes[lane.head] >= self.segment_bytes:
+            self._roll(lane)
+        os.write(lane.fd, frame)
+        lane.sizes[lane.head] += len(frame)
+        lane.dirty = True
+        self.counters["frames"] += 1
+        if self.fsync_ms <= 0:
+            self._sync(lane)
+        return True
+
+    def _roll(self, lane: _Lane):
+        if lane.fd is not None:
+            self._sync(lane)
+            os.close(lane.fd)
+        number = (lane.head or 0) + 1
+        lane.fd = os.open(lane.path(number), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        lane.segments.append(number)
+        lane.sizes[number] = 0
+        if len(lane.segments) == 1:
+            lane.cursor = (number, 0)
+
+    def _sync(self, lane: _Lane):
+        if lane.fd is not None and lane.dirty:
+            os.fsync(lane.fd)
+            lane.dirty = False
+            self.counters["fsyncs"] += 1
+
+    def sync(self):
+        for lane in self._lanes.values():
+            self._sync(lane)
+
+    async def run(self):
+        """Group fsync of everything appended since the last one."""
+        if self.fsync_ms <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.fsync_ms / 1000)
+            self.sync()
+
+    def close(self):
+        for lane in self._lanes.values():
+            if lane.fd is not None:
+                self._sync(lane)
+                os.close(lane.fd)
+                lane.fd = None
+
+    # --- replay --------------------------------------------------------------
+
+    def read(self, kind: str, limit: int) -> Optional[Tuple[List[Dict[str, Any]], Position]]:
+        """Up to ``limit`` rows (whole frames) from the cursor on, plus the position
+        to ``commit`` once they are stored; None when the spool has nothing left."""
+        lane = self._lanes.get(kind)
+        if lane is None:
+            return None
+        while lane.pending():
+            number, offset = lane.cursor
+            rows, end = self._read_frames(lane, number, offset, limit)
+            if rows:
+                return rows, (number, end)
+            if number == lane.head:
+                # nothing readable up to the head size: a corrupt frame, skipped
+                self.commit(kind, (number, lane.sizes[number]))
+                return None
+            self.commit(kind, (number, lane.sizes[number]))
+        return None
+
+    def _read_frames(self, lane: _Lane, number: int, offset: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        rows: List[Dict[str, Any]] = []
+        size = lane.sizes[number]
+        with open(lane.path(number), "rb") as f:
+            f.seek(offset)
+            while offset < size and len(rows) < limit:
+                header = f.read(FRAME.size)
+                if len(header) < FRAME.size:
+                    break
+                length, crc, codec = FRAME.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                rows.extend(self._decode(codec, payload))
+                offset += FRAME.size + length
+        if not rows and offset < size:
+            self.counters["corrupt"] += 1
+            log.error(
+                f"spool frame corrupt, rest of segment skipped {sanitize({'segment': lane.path(number), 'offset': offset, 'bytes': size - offset})}"
+            )
+        return rows, offset
+
+    @staticmethod
+    def _decode(codec: int, payload: bytes) -> List[Dict[str, Any]]:
+        rows = msgspec.msgpack.decode(payload) if codec == CODEC_MSGPACK else json.loads(payload)
+        for row in rows:
+            if row.get("_raw") is not None:
+                row["_raw"] = RawJson(row["_raw"])
+        return rows
+
+    def commit(self, kind: str, position: Position):
+        """Marks everything before ``position`` as stored; drops finished segments."""
+        lane = self._lanes[kind]
+        number, offset = position
+        lane.cursor = position
+        for old in [n for n in lane.segments if n < number]:
+            self._remove(lane, old)
+        if number != lane.head and offset >= lane.sizes[number]:
+            self._remove(lane, number)
+            lane.cursor = (lane.segments[0], 0)
+        lane.save_cursor()
+
+    def _remove(self, lane: _Lane, number: int):
+        lane.segments.remove(number)
+        del lane.sizes[number]
+        try:
+            os.remove(lane.path(number))
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "bytes": self.bytes(),
+            "segments": {kind: len(lane.segments) for kind, lane in self._lanes.items() if lane.segments},
+        }
@@ -1,12 +1,14 @@
 import asyncio
+import functools
 import json
-from typing import Any, Dict, List
-import websockets
+from typing import Any, Dict, List, Tuple
 
-from .auth import AuthClient
 from .db import Db
 from .config import Config
+from .decode import MarketDecoder
+from .ingest import IngestPipeline
 from .logger import get_logger, sanitize
+from .ws import WsSupervisor
 
 MARKET_WS_URL = "wss://ws.broker.ru/trade-api-market-data-connector/api/v1/market-data/ws"
 PORTFOLIO_WS_URL = "wss://ws.broker.ru/trade-api-bff-portfolio/api/v1/portfolio/ws"
@@ -16,41 +18,62 @@ ORDERS_TRANSACTION_WS_URL = "wss://ws.broker.ru/trade-api-bff-operations/api/v1/
 MARGINAL_WS_URL = "wss://ws.broker.ru/trade-api-bff-marginal-indicators/api/v1/marginal-indicators/ws"
 
 
+def shard_instruments(
+    instruments: List[Dict[str, Any]],
+    per_connection: int,
+    process_index: int = 0,
+    process_count: int = 1,
+) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    """Splits ``instruments`` into chunks of ``per_connection`` (0 — one chunk)
+    and returns ``(shard number, chunk)`` pairs owned by this process; shards
+    are dealt to processes round-robin."""
+    size = per_connection if per_connection > 0 else max(1, len(instruments))
+    shards = [instruments[i : i + size] for i in range(0, len(instruments), size)]
+    return [(n, shard) for n, shard in enumerate(shards) if n % process_count == process_index]
+
+
 class MarketStream:
-    def __init__(self, auth: AuthClient, db: Db, config: Config):
-        self.auth = auth
+    def __init__(self, ws: WsSupervisor, db: Db, config: Config, ingest: IngestPipeline):
+        self.ws = ws
         self.db = db
         self.config = config
+        self.ingest = ingest
+        self.decoder = MarketDecoder(config.json_decoder, config.store_raw)
         self.log = get_logger("worker.market")
 
     async def run(self):
         if not self.config.subscribe_instruments:
             self.log.warning("no instruments configured; skipping market stream")
             return
-
-        while True:
-            try:
-                token = await self.auth.get_access_token()
-                headers = {"Authorization": f"Bearer {token}"}
-                async with websockets.connect(
+        shards = shard_instruments(
+            self.config.subscribe_instruments,
+            self.config.market_instruments_per_conn,
+            self.config.market_process_index,
+            self.config.market_processes,
+        )
+        if not shards:
+            self.log.warning(
+                f"no market shards for this process {sanitize({'process': self.config.market_process_index, 'processes': self.config.market_processes})}"
+            )
+            return
+        self.log.info(
+            f"market shards {sanitize({'process': self.config.market_process_index, 'shards': {n: len(shard) for n, shard in shards}, 'decoder': self.decoder.backend})}"
+        )
+        single = len(shards) == 1 and self.config.market_processes == 1
+        await asyncio.gather(
+            *(
+                self.ws.run_connection(
+                    "market" if single else f"market.{n}",
                     MARKET_WS_URL,
-                    extra_headers=headers,
-                    ping_interval=20,
-                    ping_timeout=20,
-                ) as ws:
-                    self.log.info(f"connected {sanitize({'url': MARKET_WS_URL})}")
-                    await self._subscribe(ws)
-                    async for message in ws:
-                        await self._handle_message(message)
-            except Exception as exc:
-                self.log.error(f"ws error: {exc}; reconnect in 3s")
-                await asyncio.sleep(3)
+                    self._handle_message,
+                    on_open=functools.partial(self._subscribe, instruments=shard),
+                )
+                for n, shard in shards
+            )
+        )
 
-    async def _subscribe(self, ws):
-        instruments = [
-            {"ticker": i["ticker"], "classCode": i["class_code"]}
-            for i in self.config.subscribe_instruments
-        ]
+    async def _subscribe(self, ws, instruments: List[Dict[str, Any]]):
+        instruments = [{"ticker": i["ticker"], "classCode": i["class_code"]} for i in instruments]
         self.log.debug(f"subscribe {sanitize({'instruments': instruments})}")
         if self.config.store_orderbook:
             await ws.send(
@@ -74,7 +97,7 @@ class MarketStream:
                     }
                 )
             )
-        if self.config.store_last_trades:
+        if self.config.store_last_trades or self.ingest.synth is not None:
             await ws.send(
                 json.dumps(
                     {"subscribeType": 0, "dataType": 2, "instruments": instruments}
@@ -88,52 +111,40 @@ class MarketStream:
             )
 
     async def _handle_message(self, message: str):
-        try:
-            data = json.loads(message)
-        except Exception:
+        decoded = self.decoder.decode(message)
+        if decoded is None:
+            # success or error messages
             return
 
-        response_type = data.get("responseType")
+        response_type, data = decoded
         if self.log.isEnabledFor(10):
             self.log.debug(
                 f"message {sanitize({'type': response_type, 'ticker': data.get('ticker'), 'classCode': data.get('classCode')})}"
             )
         if response_type == "OrderBook" and self.config.store_orderbook:
-            await self.db.insert_orderbook(data)
+            await self.ingest.submit("orderbook", data)
         elif response_type == "Quotes" and self.config.store_quotes:
-            await self.db.insert_quotes(data)
-        elif response_type == "LastTrades" and self.config.store_last_trades:
-            await self.db.insert_last_trade(data)
+            await self.ingest.submit("quotes", data)
+        elif response_type == "LastTrades":
+            if self.ingest.synth is not None:
+                await self.ingest.synthesize(data)
+            if self.config.store_last_trades:
+                await self.ingest.submit("last_trades", data)
         elif response_type == "CandleStick" and self.config.store_candles:
-            await self.db.upsert_candle(data)
+            await self.ingest.submit("candles", data)
         else:
-            # ignore success or error messages
+            # data type not stored
             return
 
 
 class PortfolioStream:
-    def __init__(self, auth: AuthClient, db: Db):
-        self.auth = auth
+    def __init__(self, ws: WsSupervisor, db: Db):
+        self.ws = ws
         self.db = db
         self.log = get_logger("worker.portfolio")
 
     async def run(self):
-        while True:
-            try:
-                token = await self.auth.get_access_token()
-                headers = {"Authorization": f"Bearer {token}"}
-                async with websockets.connect(
-                    PORTFOLIO_WS_URL,
-                    extra_headers=headers,
-                    ping_interval=20,
-                    ping_timeout=20,
-                ) as ws:
-                    self.log.info(f"connected {sanitize({'url': PORTFOLIO_WS_URL})}")
-                    async for message in ws:
-                        await self._handle_message(message)
-            except Exception as exc:
-                self.log.error(f"ws error: {exc}; reconnect in 3s")
-                await asyncio.sleep(3)
+        await self.ws.run_connection("portfolio", PORTFOLIO_WS_URL, self._handle_message)
 
     async def _handle_message(self, message: str):
         try:
@@ -148,35 +159,17 @@ class PortfolioStream:
 
 
 class OrdersStream:
-    def __init__(self, auth: AuthClient, db: Db):
-        self.auth = auth
+    def __init__(self, ws: WsSupervisor, db: Db):
+        self.ws = ws
         self.db = db
         self.log = get_logger("worker.orders")
 
     async def run(self):
         await asyncio.gather(
-            self._run_one(ORDERS_EXECUTION_WS_URL, "execution"),
-            self._run_one(ORDERS_TRANSACTION_WS_URL, "transaction"),
+            self.ws.run_connection("orders.execution", ORDERS_EXECUTION_WS_URL, self._handle_message),
+            self.ws.run_connection("orders.transaction", ORDERS_TRANSACTION_WS_URL, self._handle_message),
         )
 
-    async def _run_one(self, url: str, label: str):
-        while True:
-            try:
-                token = await self.auth.get_access_token()
-                headers = {"Authorization": f"Bearer {token}"}
-                async with websockets.connect(
-                    url,
-                    extra_headers=headers,
-                    ping_interval=20,
-                    ping_timeout=20,
-                ) as ws:
-                    self.log.info(f"connected {sanitize({'url': url, 'stream': label})}")
-                    async for message in ws:
-                        await self._handle_message(message)
-            except Exception as exc:
-                self.log.error(f"ws error ({label}): {exc}; reconnect in 3s")
-                await asyncio.sleep(3)
-
     async def _handle_message(self, message: str):
         try:
             data = json.loads(message)
@@ -191,28 +184,13 @@ class OrdersStream:
 
 
 class LimitsStream:
-    def __init__(self, auth: AuthClient, db: Db):
-        self.auth = auth
+    def __init__(self, ws: WsSupervisor, db: Db):
+        self.ws = ws
         self.db = db
         self.log = get_logger("worker.limits")
 
     async def run(self):
-        while True:
-            try:
-                token = await self.auth.get_access_token()
-                headers = {"Authorization": f"Bearer {token}"}
-                async with websockets.connect(
-                    LIMITS_WS_URL,
-                    extra_headers=headers,
-                    ping_interval=20,
-                    ping_timeout=20,
-                ) as ws:
-                    self.log.info(f"connected {sanitize({'url': LIMITS_WS_URL})}")
-                    async for message in ws:
-                        await self._handle_message(message)
-            except Exception as exc:
-                self.log.error(f"ws error: {exc}; reconnect in 3s")
-                await asyncio.sleep(3)
+        await self.ws.run_connection("limits", LIMITS_WS_URL, self._handle_message)
 
     async def _handle_message(self, message: str):
         try:
@@ -226,28 +204,13 @@ class LimitsStream:
 
 
 class MarginalStream:
-    def __init__(self, auth: AuthClient, db: Db):
-        self.auth = auth
+    def __init__(self, ws: WsSupervisor, db: Db):
+        self.ws = ws
         self.db = db
         self.log = get_logger("worker.marginal")
 
     async def run(self):
-        while True:
-            try:
-                token = await self.auth.get_access_token()
-                headers = {"Authorization": f"Bearer {token}"}
-                async with websockets.connect(
-                    MARGINAL_WS_URL,
-                    extra_headers=headers,
-                    ping_interval=20,
-                    ping_timeout=20,
-                ) as ws:
-                    self.log.info(f"connected {sanitize({'url': MARGINAL_WS_URL})}")
-                    async for message in ws:
-                        await self._handle_message(message)
-            except Exception as exc:
-                self.log.error(f"ws error: {exc}; reconnect in 3s")
-                await asyncio.sleep(3)
+        await self.ws.run_connection("marginal", MARGINAL_WS_URL, self._handle_message)
 
     async def _handle_message(self, message: str):
         try:
@@ -0,0 +1,266 @@
+"""ANN index lifecycle for ``bcs_private.embeddings``.
+
+Below ``BCS_VECTOR_INDEX_MIN_ROWS`` a sequential scan is cheap and exact, so
+no index is built. Past the threshold the worker builds the configured index
+with ``CREATE INDEX CONCURRENTLY`` (writes keep going):
+
+* ``hnsw`` is built once and maintained by Postgres on insert;
+* ``ivfflat`` clusters are fixed at build time, so the index is rebuilt
+  whenever the table size moves ``lists`` a factor of two away from the
+  pgvector guideline (rows / 1000 up to 1M rows, sqrt(rows) beyond).
+
+A replacement index is always built before the old one is dropped.
+
+``python -m worker.vector_index`` runs a recall/latency benchmark on
+synthetic data in a temporary table; see ``--help``.
+"""
+
+import argparse
+import asyncio
+import math
+import struct
+import time
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import asyncpg
+import numpy as np
+
+from .config import Config, load_config
+from .db import Db
+from .logger import get_logger, sanitize
+
+log = get_logger("worker.vector_index")
+
+TABLE = "embeddings"
+COLUMN = "embedding"
+# embedding.search orders by cosine distance (<=>)
+OPCLASS = "vector_cosine_ops"
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+
+
+def ivfflat_lists(rows: int) -> int:
+    if rows <= 1_000_000:
+        return max(10, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def index_name(table: str, method: str, lists: int = 0) -> str:
+    if method == "ivfflat":
+        return f"{table}_{COLUMN}_ivfflat{lists}_idx"
+    return f"{table}_{COLUMN}_hnsw_idx"
+
+
+def index_sql(table: str, method: str, lists: int = 0, concurrently: bool = True) -> str:
+    name = index_name(table, method, lists)
+    options = f"lists = {lists}" if method == "ivfflat" else f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}{name} ON {table} "
+        f"USING {method} ({COLUMN} {OPCLASS}) WITH ({options})"
+    )
+
+
+async def _vector_indexes(conn: asyncpg.Connection, table: str) -> List[Dict]:
+    rows = await conn.fetch(
+        """
+        SELECT c.relname AS name, am.amname AS method, i.indisvalid AS valid, c.reloptions
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE i.indrelid = $1::regclass AND am.amname IN ('hnsw', 'ivfflat')
+        """,
+        table,
+    )
+    out = []
+    for row in rows:
+        options = dict(opt.split("=", 1) for opt in row["reloptions"] or [])
+        out.append(
+            {
+                "name": row["name"],
+                "method": row["method"],
+                "valid": row["valid"],
+                "lists": int(options.get("lists", 100)) if row["method"] == "ivfflat" else 0,
+            }
+        )
+    return out
+
+
+async def _row_estimate(conn: asyncpg.Connection, table: str) -> int:
+    estimate = await conn.fetchval("SELECT reltuples::bigint FROM pg_class WHERE oid = $1::regclass", table)
+    if estimate is None or estimate < 0:
+        # never vacuumed/analyzed yet
+        return await conn.fetchval(f"SELECT count(*) FROM {table}")
+    return estimate
+
+
+async def maintain_index(conn: asyncpg.Connection, config: Config, table: str = TABLE) -> Optional[str]:
+    """Brings the vector index of ``table`` in line with its size.
+
+    Returns the name of a newly built index, if any.
+    """
+    indexes = await _vector_indexes(conn, table)
+    for index in [i for i in indexes if not i["valid"]]:
+        # leftover of an interrupted concurrent build
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index['name']}")
+        log.warning(f"vector index invalid, dropped {sanitize({'index': index['name']})}")
+    indexes = [i for i in indexes if i["valid"]]
+
+    method = config.vector_index
+    if method not in {"hnsw", "ivfflat"}:
+        return None
+    rows = await _row_estimate(conn, table)
+    if rows < config.vector_index_min_rows:
+        return None
+
+    lists = ivfflat_lists(rows) if method == "ivfflat" else 0
+    current = [i for i in indexes if i["method"] == method]
+    if method == "hnsw" and current:
+        return None
+    if method == "ivfflat" and any(lists / 2 < i["lists"] < lists * 2 for i in current):
+        return None
+
+    name = index_name(table, method, lists)
+    started = time.monotonic()
+    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    await conn.execute(index_sql(table, method, lists))
+    log.info(
+        f"vector index built {sanitize({'index': name, 'rows': rows, 'lists': lists or None, 'sec': round(time.monotonic() - started, 1)})}"
+    )
+    for index in indexes:
+        if index["name"] != name:
+            await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index['name']}")
+            log.info(f"vector index replaced {sanitize({'index': index['name'], 'by': name})}")
+    return name
+
+
+async def run_vector_index_maintenance(db: Db, config: Config):
+    log.info(
+        f"vector index maintenance started {sanitize({'method': config.vector_index, 'min_rows': config.vector_index_min_rows})}"
+    )
+    while True:
+        try:
+            async with db.private.acquire() as conn:
+                # index builds are long; a statement timeout set for the role must not abort them
+                await conn.execute("SET statement_timeout = 0")
+                await maintain_index(conn, config)
+        except Exception as exc:
+            log.error(f"vector index maintenance error {sanitize({'error': str(exc)})}")
+        await asyncio.sleep(config.vector_index_check_sec)
+
+
+# --- benchmark -------------------------------------------------------------
+
+BENCH_TABLE = "vector_index_bench"
+
+
+def _synthetic(rows: int, dim: int, clusters: int, seed: int):
+    """Unit vectors around ``clusters`` random centers, like topic-grouped texts."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    data = centers[rng.integers(0, clusters, rows)] + 2.0 * rng.standard_normal((rows, dim))
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data.astype(">f4")
+
+
+async def _copy_vectors(conn: asyncpg.Connection, table: str, data, first_id: int = 0):
+    """Binary COPY of ``(id, embedding)`` rows straight from a float32 matrix."""
+    rows, dim = data.shape
+    tuple_type = np.dtype(
+        [("fields", ">i2"), ("id_len", ">i4"), ("id", ">i8"), ("vec_len", ">i4"),
+         ("vec_dim", ">i2"), ("vec_unused", ">i2"), ("vec", ">f4", (dim,))]
+    )
+    tuples = np.empty(rows, dtype=tuple_type)
+    tuples["fields"] = 2
+    tuples["id_len"] = 8
+    tuples["id"] = np.arange(first_id, first_id + rows)
+    tuples["vec_len"] = 4 + 4 * dim
+    tuples["vec_dim"] = dim
+    tuples["vec_unused"] = 0
+    tuples["vec"] = data
+    stream = BytesIO(
+        b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0) + tuples.tobytes() + struct.pack(">h", -1)
+    )
+    await conn.copy_to_table(table, source=stream, columns=["id", COLUMN], format="binary")
+
+
+async def _timed_search(conn: asyncpg.Connection, queries: List[str], k: int) -> tuple:
+    results, latencies = [], []
+    sql = f"SELECT id FROM {BENCH_TABLE} ORDER BY {COLUMN} <=> $1::vector LIMIT $2"
+    for query in queries:
+        started = time.perf_counter()
+        rows = await conn.fetch(sql, query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({row["id"] for row in rows})
+    return results, latencies
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def benchmark(conn: asyncpg.Connection, sizes: List[int], dim: int, k: int, queries: int, seed: int):
+    print(f"{'rows':>8} {'index':>14} {'knob':>14} {'recall@' + str(k):>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for size in sizes:
+        await conn.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        await conn.execute(f"CREATE TEMP TABLE {BENCH_TABLE} (id bigint, {COLUMN} vector({dim}))")
+        data = _synthetic(size + queries, dim, clusters=max(8, size // 1000), seed=seed)
+        await _copy_vectors(conn, BENCH_TABLE, data[:size])
+        await conn.execute(f"ANALYZE {BENCH_TABLE}")
+        probes = ["[" + ",".join(map(repr, row.astype(np.float64).tolist())) + "]" for row in data[size:]]
+
+        exact, latencies = await _timed_search(conn, probes, k)
+        print(f"{size:>8} {'none (exact)':>14} {'-':>14} {1.0:>9.3f} {_percentile(latencies, 50):>8.2f} {_percentile(latencies, 99):>8.2f}")
+
+        lists = ivfflat_lists(size)
+        # small tables would otherwise be seq-scanned, which says nothing about the index
+        await conn.execute("SET enable_seqscan = off")
+        for method, knob, values in (
+            ("hnsw", "hnsw.ef_search", [10, 40, 100, 200]),
+            ("ivfflat", "ivfflat.probes", sorted({1, max(1, lists // 10), max(1, lists // 4), max(1, lists // 2)})),
+        ):
+            started = time.monotonic()
+            await conn.execute(index_sql(BENCH_TABLE, method, lists, concurrently=False))
+            print(f"{size:>8} {method:>14} {'build':>14} {time.monotonic() - started:>8.1f} s")
+            for value in values:
+                await conn.execute(f"SET {knob} = {value}")
+                found, latencies = await _timed_search(conn, probes, k)
+                recall = sum(len(f & e) for f, e in zip(found, exact)) / (k * len(exact))
+                label = f"{method}" + (f" l={lists}" if method == "ivfflat" else "")
+                print(
+                    f"{size:>8} {label:>14} {knob.split('.')[1] + '=' + str(value):>14} {recall:>9.3f} "
+                    f"{_percentile(latencies, 50):>8.2f} {_percentile(latencies, 99):>8.2f}"
+                )
+            await conn.execute(f"RESET {knob}")
+            await conn.execute(f"DROP INDEX {index_name(BENCH_TABLE, method, lists)}")
+        await conn.execute("RESET enable_seqscan")
+    await conn.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+
+
+async def _bench_main():
+    parser = argparse.ArgumentParser(description="Recall and latency of pgvector indexes on synthetic data")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma separated table sizes")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    config = load_config()
+    conn = await asyncpg.connect(
+        host=config.db_host,
+        port=config.db_port,
+        user=config.db_user,
+        password=config.db_password,
+        database=config.db_private,
+    )
+    try:
+        await conn.execute("SET maintenance_work_mem = '512MB'")
+        await benchmark(conn, [int(s) for s in args.sizes.split(",")], args.dim, args.k, args.queries, args.seed)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_bench_main())
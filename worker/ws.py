@@ -0,0 +1,151 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import websockets
+
+from .auth import AuthClient
+from .config import Config
+from .logger import get_logger, sanitize
+
+log = get_logger("worker.ws")
+
+MessageHandler = Callable[[Any], Awaitable[None]]
+OpenHandler = Callable[[Any], Awaitable[None]]
+
+
+@dataclass
+class ConnectionHealth:
+    name: str
+    url: str
+    connected: bool = False
+    connects: int = 0
+    disconnects: int = 0
+    messages: int = 0
+    connected_at: float = 0.0
+    last_message_at: float = 0.0
+    # from the last message before a drop to the first one after reconnect
+    last_gap_sec: Optional[float] = None
+    last_error: Optional[str] = None
+    reported_messages: int = 0
+
+    def snapshot(self, now: float, interval: float) -> Dict[str, Any]:
+        rate = (self.messages - self.reported_messages) / interval if interval > 0 else None
+        self.reported_messages = self.messages
+        return {
+            "up": self.connected,
+            "uptime_sec": round(now - self.connected_at) if self.connected else 0,
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "messages": self.messages,
+            "msg_per_sec": round(rate, 1) if rate is not None else None,
+            "idle_sec": round(now - self.last_message_at, 1) if self.last_message_at else None,
+            "last_gap_sec": self.last_gap_sec,
+            "last_error": self.last_error,
+        }
+
+
+class WsSupervisor:
+    """Owns the connect/reconnect loop of every broker websocket.
+
+    A dropped connection is retried after a full-jitter exponential backoff
+    (``uniform(0, min(cap, base * 2^failures))``); a connection that stayed up
+    for ``ws_stable_sec`` starts again from the first, sub-second step, so a
+    routine drop costs well under a second of ticks. The access token comes
+    from ``AuthClient``, which refreshes it ahead of expiry, so reconnects do
+    not wait on the token endpoint. Health of each connection is logged as
+    ``ws.stats`` every ``ws_stats_sec``.
+    """
+
+    def __init__(self, auth: AuthClient, config: Config):
+        self.auth = auth
+        self.config = config
+        self.connections: Dict[str, ConnectionHealth] = {}
+        self._reported_at = time.monotonic()
+
+    def backoff(self, failures: int) -> float:
+        ceiling = min(self.config.ws_backoff_max_ms, self.config.ws_backoff_base_ms * 2**failures)
+        return random.uniform(0, ceiling) / 1000
+
+    async def run_connection(
+        self,
+        name: str,
+        url: str,
+        on_message: MessageHandler,
+        on_open: Optional[OpenHandler] = None,
+    ):
+        """Keeps ``url`` connected forever; ``on_open`` (re)subscribes after each connect."""
+        health = self.connections.setdefault(name, ConnectionHealth(name, url))
+        failures = 0
+        dropped_at_message = None
+        while True:
+            connected_at = None
+            error = "closed by server"
+            try:
+                token = await self.auth.get_access_token()
+                async with websockets.connect(
+                    url,
+                    extra_headers={"Authorization": f"Bearer {token}"},
+                    ping_interval=20,
+                    ping_timeout=20,
+                    open_timeout=self.config.ws_open_timeout_sec,
+                ) as ws:
+                    connected_at = time.monotonic()
+                    health.connected = True
+                    health.connected_at = connected_at
+                    health.connects += 1
+                    log.info(f"connected {sanitize({'stream': name, 'url': url, 'attempt': failures + 1})}")
+                    if on_open is not None:
+                        await on_open(ws)
+                    async for message in ws:
+                        now = time.monotonic()
+                        if dropped_at_message is not None:
+                            health.last_gap_sec = round(now - dropped_at_message, 3)
+                            dropped_at_message = None
+                        health.messages += 1
+                        health.last_message_at = now
+                        await on_message(message)
+            except asyncio.CancelledError:
+                health.connected = False
+                raise
+            except Exception as exc:
+                error = str(exc) or type(exc).__name__
+            now = time.monotonic()
+            if health.connected:
+                health.connected = False
+                health.disconnects += 1
+                if health.last_message_at and dropped_at_message is None:
+                    dropped_at_message = health.last_message_at
+            health.last_error = error
+            if connected_at is not None and now - connected_at >= self.config.ws_stable_sec:
+                failures = 0
+            delay = self.backoff(failures)
+            failures += 1
+            log.error(f"ws error {sanitize({'stream': name, 'error': error, 'reconnect_in': round(delay, 2)})}")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        interval = now - self._reported_at
+        self._reported_at = now
+        return {name: health.snapshot(now, interval) for name, health in self.connections.items()}
+
+    async def run(self):
+        """Proactive token refresh plus the periodic ``ws.stats`` report."""
+        tasks = [asyncio.create_task(self.auth.run_refresh())]
+        if self.config.ws_stats_sec > 0:
+            tasks.append(asyncio.create_task(self._report_loop()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.config.ws_stats_sec)
+            if self.connections:
+                log.info(f"ws.stats {sanitize(self.stats())}")